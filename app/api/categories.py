@@ -0,0 +1,60 @@
+"""
+Categories API Router
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
+from app.crud import category as crud_category
+
+# Crea router per categories
+router = APIRouter()
+
+
+@router.get("/categories", response_model=list[CategoryResponse])
+def list_categories(active_only: bool = True, db: Session = Depends(get_db)):
+    """
+    Lista categorie con il numero di prodotti attivi
+    
+    - Servita dallo snapshot in memoria (app.category_cache), nessun COUNT per richiesta
+    - active_only: se True, restituisce solo categorie attive
+    """
+    return crud_category.get_categories_cached(db, active_only)
+
+
+@router.get("/categories/{category_id}", response_model=CategoryResponse)
+def get_category(category_id: int, db: Session = Depends(get_db)):
+    """Dettaglio categoria"""
+    category = crud_category.get_category(db, category_id)
+    if not category:
+        raise HTTPException(404, "Categoria non trovata")
+    return category
+
+
+@router.post("/categories", response_model=CategoryResponse, status_code=201)
+def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
+    """Crea categoria"""
+    if crud_category.get_category_by_name(db, category.name):
+        raise HTTPException(400, "Categoria già esistente")
+    return crud_category.create_category(db, category)
+
+
+@router.put("/categories/{category_id}", response_model=CategoryResponse)
+def update_category(category_id: int, category_update: CategoryUpdate, db: Session = Depends(get_db)):
+    """Aggiorna categoria"""
+    if category_update.name is not None:
+        existing = crud_category.get_category_by_name(db, category_update.name)
+        if existing and existing.id != category_id:
+            raise HTTPException(400, "Categoria già esistente")
+    category = crud_category.update_category(db, category_id, category_update)
+    if not category:
+        raise HTTPException(404, "Categoria non trovata")
+    return category
+
+
+@router.delete("/categories/{category_id}", status_code=204)
+def delete_category(category_id: int, db: Session = Depends(get_db)):
+    """Elimina categoria (soft delete, i prodotti restano collegati)"""
+    if not crud_category.delete_category(db, category_id):
+        raise HTTPException(404, "Categoria non trovata")
@@ -1,18 +1,40 @@
 """
 Clients API Router
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from app.auth import (
+    REFRESH,
+    InvalidToken,
+    TokenClaims,
+    decode_token,
+    get_token_claims,
+    issue_tokens,
+    revoke_all_tokens,
+    revoke_token
+)
+from app.conditional import is_not_modified, make_etag, not_modified, set_validators
 from app.database import get_db
+from app.pagination import decode_id_cursor, encode_cursor, set_next_cursor
+from app.password_hasher import PasswordHasherBusy, password_hasher
+from app.rate_limit import login_rate_limiter
 from app.schemas.client import (
     ClientCreate, 
     ClientUpdate, 
     ClientResponse, 
     ClientLogin,
-    ClientChangePassword
+    ClientChangePassword,
+    ClientLoginResponse,
+    ClientLogout,
+    TokenRefresh,
+    TokenResponse
 )
 from app.crud import client as crud_client
+from app.crud import token as crud_token
 
 # Crea router per clients
 router = APIRouter()
@@ -20,67 +42,190 @@ router = APIRouter()
 
 # ==================== REGISTRAZIONE & LOGIN ====================
 
+# Secondi suggeriti al client quando il pool bcrypt è saturo
+HASHER_RETRY_AFTER = 1
+
+
+async def _hash_password(password: str) -> str:
+    """Hash nel pool bcrypt dedicato; 503 se la coda è piena"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+
+async def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifica nel pool bcrypt dedicato; 503 se la coda è piena"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servizio momentaneamente sovraccarico, riprovare",
+        headers={"Retry-After": str(HASHER_RETRY_AFTER)}
+    )
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+def _check_rate_limit(retry_after: float) -> None:
+    """429 con Retry-After se il limitatore dei tentativi ha respinto la richiesta"""
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Troppi tentativi di accesso, riprovare più tardi",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+
 @router.post("/clients/register", response_model=ClientResponse, status_code=status.HTTP_201_CREATED)
-def register_client(client: ClientCreate, db: Session = Depends(get_db)):
+async def register_client(client: ClientCreate, db: Session = Depends(get_db)):
     """
     Registra un nuovo cliente
     
-    - Verifica che l'email non sia già registrata
-    - Hash della password
-    - Crea il nuovo cliente
+    - Hash della password (pool bcrypt dedicato, 503 se saturo)
+    - Un solo INSERT ... ON CONFLICT (lower(email)) DO NOTHING RETURNING:
+      400 se l'email è già registrata, anche da una richiesta concorrente
     """
-    # Verifica se email già esiste
-    existing_client = crud_client.get_client_by_email(db, client.email)
-    if existing_client:
+    password_hash = await _hash_password(client.password)
+    db_client = await run_in_threadpool(crud_client.create_client, db, client, password_hash)
+    if not db_client:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email già registrata"
         )
-    
-    return crud_client.create_client(db, client)
+    return db_client
 
 
-@router.post("/clients/login", response_model=ClientResponse)
-def login_client(credentials: ClientLogin, db: Session = Depends(get_db)):
+@router.post("/clients/login", response_model=ClientLoginResponse)
+async def login_client(credentials: ClientLogin, request: Request, db: Session = Depends(get_db)):
     """
     Login cliente
     
-    - Verifica email e password
-    - Restituisce i dati del cliente (in produzione restituirebbe un JWT token)
+    - Tentativi limitati per email e per IP (429 prima di query e bcrypt, vedi app.rate_limit)
+    - Verifica email e password (pool bcrypt dedicato, 503 se saturo)
+    - Restituisce i dati del cliente con access token e refresh token
+      (header "Authorization: Bearer <access_token>" nelle richieste autenticate)
     """
-    client = crud_client.authenticate_client(db, credentials.email, credentials.password)
-    if not client:
+    _check_rate_limit(login_rate_limiter.check(credentials.email, _client_ip(request)))
+    
+    client = await run_in_threadpool(crud_client.get_client_by_email, db, credentials.email)
+    if (
+        not client
+        or not await _verify_password(credentials.password, client.password_hash)
+        or not client.active
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o password non corretti"
         )
     
-    return client
+    return ClientLoginResponse(**ClientResponse.model_validate(client).model_dump(), **issue_tokens(client.id))
+
+
+@router.post("/clients/token/refresh", response_model=TokenResponse)
+def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
+    """
+    Nuova coppia di token in cambio di un refresh token
+    
+    - Il refresh token usato viene revocato (vale una sola volta)
+    - 401 se non valido, scaduto, revocato o già usato
+    """
+    try:
+        claims = decode_token(token_data.refresh_token, REFRESH)
+    except InvalidToken:
+        claims = None
+    if (
+        claims is None
+        or crud_token.is_revoked(db, claims.client_id, claims.jti, claims.issued_at)
+        or not revoke_token(db, claims)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token non valido o scaduto"
+        )
+    return issue_tokens(claims.client_id)
+
+
+@router.post("/clients/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout_client(
+    logout: Optional[ClientLogout] = None,
+    claims: TokenClaims = Depends(get_token_claims),
+    db: Session = Depends(get_db)
+):
+    """
+    Logout cliente
+    
+    - Revoca l'access token dell'header Authorization
+    - Revoca anche il refresh token, se indicato nel body
+    """
+    revoke_token(db, claims)
+    if logout and logout.refresh_token:
+        try:
+            refresh_claims = decode_token(logout.refresh_token, REFRESH)
+        except InvalidToken:
+            return None
+        if refresh_claims.client_id == claims.client_id:
+            revoke_token(db, refresh_claims)
+    return None
 
 
 # ==================== CRUD CLIENTS ====================
 
 @router.get("/clients", response_model=list[ClientResponse])
-def list_clients(skip: int = 0, limit: int = 20, active_only: bool = True, db: Session = Depends(get_db)):
+def list_clients(
+    response: Response,
+    skip: int = 0,
+    limit: int = 20,
+    active_only: bool = True,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
     """
     Lista clienti
     
     - skip: numero di record da saltare (per paginazione)
     - limit: numero massimo di record da restituire
     - active_only: se True, restituisce solo clienti attivi
+    - cursor: paginazione keyset (header X-Next-Cursor della pagina precedente), ignora skip
     """
-    return crud_client.get_clients(db, skip, limit, active_only)
+    after_id = decode_id_cursor(cursor) if cursor else None
+    clients = crud_client.get_clients(db, skip, limit, active_only, after_id)
+    if limit > 0 and len(clients) == limit:
+        set_next_cursor(response, encode_cursor(clients[-1].id))
+    return clients
 
 
 @router.get("/clients/{client_id}", response_model=ClientResponse)
-def get_client(client_id: int, db: Session = Depends(get_db)):
-    """Dettaglio cliente"""
+def get_client(client_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Dettaglio cliente
+    
+    - Verifica prima solo updated_at: 304 se la copia del client è aggiornata
+    """
+    updated_at = crud_client.get_client_updated_at(db, client_id)
+    if updated_at is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cliente non trovato"
+        )
+    etag = make_etag("client", client_id, updated_at)
+    if is_not_modified(request, etag, updated_at):
+        return not_modified(etag, updated_at)
+    
     client = crud_client.get_client(db, client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cliente non trovato"
         )
+    set_validators(response, make_etag("client", client.id, client.updated_at), client.updated_at)
     return client
 
 
@@ -114,24 +259,33 @@ def update_client(client_id: int, client_update: ClientUpdate, db: Session = Dep
 
 
 @router.post("/clients/{client_id}/change-password", response_model=ClientResponse)
-def change_password(client_id: int, password_data: ClientChangePassword, db: Session = Depends(get_db)):
+async def change_password(
+    client_id: int,
+    password_data: ClientChangePassword,
+    request: Request,
+    db: Session = Depends(get_db)
+):
     """
     Cambia password del cliente
     
+    - Tentativi limitati per cliente e per IP come il login (429 con Retry-After)
     - Verifica la vecchia password
-    - Imposta la nuova password
+    - Imposta la nuova password (bcrypt nel pool dedicato, 503 se saturo)
+    - Revoca tutti i token già emessi per il cliente
     """
-    client = crud_client.change_password(
-        db, 
-        client_id, 
-        password_data.old_password, 
-        password_data.new_password
-    )
+    _check_rate_limit(login_rate_limiter.check_client(client_id, _client_ip(request)))
+    client = await run_in_threadpool(crud_client.get_client, db, client_id)
+    if client and await _verify_password(password_data.old_password, client.password_hash):
+        password_hash = await _hash_password(password_data.new_password)
+        client = await run_in_threadpool(crud_client.set_password_hash, db, client_id, password_hash)
+    else:
+        client = None
     if not client:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cliente non trovato o password non corretta"
         )
+    await run_in_threadpool(revoke_all_tokens, db, client_id)
     return client
 
 
@@ -141,9 +295,11 @@ def delete_client(client_id: int, db: Session = Depends(get_db)):
     Elimina cliente (soft delete)
     
     - Imposta active=False invece di eliminare il record
+    - Revoca tutti i token già emessi per il cliente
     """
     if not crud_client.delete_client(db, client_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cliente non trovato"
-        )
\ No newline at end of file
+        )
+    revoke_all_tokens(db, client_id)
\ No newline at end of file
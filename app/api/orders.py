@@ -1,22 +1,34 @@
 """
 Orders router - Gestione ordini
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session, joinedload
-from typing import List
-from datetime import datetime, timezone
-from decimal import Decimal
+from typing import List, Optional
+from datetime import datetime
 
+from app.auth import get_current_client_id, require_admin_key
+from app.conditional import is_not_modified, make_etag, not_modified, set_validators
 from app.database import get_db
-from app.models.client import Client
-from app.models.product import Product
+from app.export import EXPORT_FORMATS, stream_orders
+from app.order_number import order_number_generator
+from app.pagination import decode_cursor, encode_cursor, set_next_cursor
+from app.serializers import JSONBytesResponse, order_response, serialize_order
+from app.crud import order as crud_order
+from app.crud import idempotency as crud_idempotency
 from app.models.order import Order, OrderDetail
 from app.schemas.order import (
     OrderCreate,
     OrderResponse,
     OrderListResponse,
-    OrderItemResponse,
-    OrderStatusUpdate
+    OrderStatusUpdate,
+    OrderBulkStatusUpdate,
+    OrderBulkStatusResponse,
+    BulkOrderResult,
+    BulkOrderResponse
 )
 
 router = APIRouter(
@@ -24,37 +36,79 @@ router = APIRouter(
     # tags=["orders"]
 )
 
-# Client ID fisso per testing
-TEMP_CLIENT_ID = 1
+# Ordini per transazione nell'import in blocco
+BULK_CHUNK_SIZE = 500
 
+# Header presente sulle risposte rigiocate da una Idempotency-Key già usata
+IDEMPOTENT_REPLAY_HEADER = "Idempotent-Replayed"
 
-def generate_order_number() -> str:
-    """Genera un numero ordine univoco"""
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-    return f"ORD-{timestamp}"
+
+def generate_order_number(db: Session) -> str:
+    """Genera un numero ordine univoco (vedi app.order_number)"""
+    return order_number_generator.next(db)
+
+
+def _decode_order_cursor(cursor: str) -> tuple[datetime, int]:
+    """Cursore ordini: (created_at, id) dell'ultimo ordine della pagina"""
+    values = decode_cursor(cursor)
+    try:
+        created_at, order_id = values
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _replay_response(stored: tuple, request_hash: str) -> JSONBytesResponse:
+    """Risposta memorizzata per una Idempotency-Key (422 se il payload è diverso)"""
+    stored_hash, status_code, body = stored
+    if stored_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key already used with a different request body"
+        )
+    if status_code is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+    return JSONBytesResponse(content=body, status_code=status_code, headers={IDEMPOTENT_REPLAY_HEADER: "true"})
 
 
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 def create_order(
     order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    client_id: int = Depends(get_current_client_id),
     db: Session = Depends(get_db)
 ):
     """
-    Crea un nuovo ordine per il cliente con ID=1
+    Crea un nuovo ordine per il cliente autenticato (access token)
     
     - Verifica disponibilità prodotti
     - Calcola prezzi
     - Crea ordine e dettagli
     - Aggiorna quantità disponibili
+    - Idempotency-Key (opzionale): i retry con la stessa chiave ricevono la
+      risposta originale senza creare un nuovo ordine
     """
     
-    # Verifica che il cliente esista
-    client = db.query(Client).filter(Client.id == TEMP_CLIENT_ID).first()
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Client with id {TEMP_CLIENT_ID} not found"
-        )
+    # 0. Idempotency-Key: risposta già memorizzata (in memoria, poi nel database)
+    request_hash = None
+    if idempotency_key:
+        request_hash = crud_idempotency.hash_request(order_data.model_dump_json().encode("utf-8"))
+        cached = crud_idempotency.get_cached_response(client_id, idempotency_key)
+        if cached:
+            return _replay_response(cached, request_hash)
+        # Le richieste duplicate in volo attendono qui il commit della prima
+        if not crud_idempotency.claim_key(db, client_id, idempotency_key, request_hash):
+            stored = crud_idempotency.get_stored_response(db, client_id, idempotency_key)
+            db.rollback()
+            if stored[1] is not None and stored[0] == request_hash:
+                crud_idempotency.cache_response(client_id, idempotency_key, *stored)
+            return _replay_response(stored, request_hash)
     
     # 1. Verifica che ci siano prodotti
     if not order_data.items:
@@ -63,171 +117,209 @@ def create_order(
             detail="Order must contain at least one item"
         )
     
-    # 2. Verifica disponibilità prodotti e calcola subtotale
-    subtotal = Decimal("0.00")
-    order_items = []
-    
-    for item in order_data.items:
-        # Recupera prodotto
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with id {item.product_id} not found"
-            )
-        
-        if not product.active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Product '{product.name}' is not available"
-            )
-        
-        if product.available_quantity < item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Not enough stock for product '{product.name}'. Available: {product.available_quantity}, Requested: {item.quantity}"
-            )
-        
-        # Calcola subtotale item
-        item_price = Decimal(str(product.price))
-        item_subtotal = item_price * item.quantity
-        subtotal += item_subtotal
-        
-        order_items.append({
-            "product": product,
-            "quantity": item.quantity,
-            "unit_price": item_price,
-            "subtotal": item_subtotal
-        })
-    
-    # 3. Calcola costi aggiuntivi
-    shipping_cost = Decimal("5.00") if subtotal < Decimal("50.00") else Decimal("0.00")
-    tax = Decimal("0.00")
-    discount = Decimal("0.00")
-    
-    total = subtotal + shipping_cost + tax - discount
-    
-    # 4. Crea ordine  
-    new_order = Order(                  
-        client_id=TEMP_CLIENT_ID,
-        order_number=generate_order_number(),
-        status="pending",
-        subtotal=subtotal,
-        shipping_cost=shipping_cost,
-        tax=tax,
-        discount=discount,
-        discount_code=order_data.discount_code,
-        total=total,
-        shipping_address=order_data.shipping_address,
-        shipping_city=order_data.shipping_city,
-        shipping_postal_code=order_data.shipping_postal_code,
-        shipping_state=order_data.shipping_state,
-        shipping_country=order_data.shipping_country,
-        notes=order_data.notes,
-        paid=False
-    ) # Crea oggetto in memoria
+    # 2. Prenota lo stock (una query con lock + un UPDATE)
+    try:
+        products = crud_order.reserve_stock(db, order_data.items)
+    except crud_order.StockReservationError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND if e.not_found else status.HTTP_400_BAD_REQUEST,
+            detail=e.detail
+        )
     
-    db.add(new_order)   # Aggiungi alla sessione
-    db.flush()          # Invia al DB per generare l'ID
+    # 3. Calcola prezzi e costi aggiuntivi
+    subtotal, order_items = crud_order.price_items(order_data.items, products)
     
-
-    # 5. Crea dettagli ordine e aggiorna quantità
-    for item_data in order_items:
-        order_detail = OrderDetail(
-            order_id=new_order.id,
-            product_id=item_data["product"].id,
+    # 4. Crea ordine e dettagli (le quantità sono già state scalate)
+    new_order = Order(
+        **crud_order.build_order_values(order_data, client_id, generate_order_number(db), subtotal, hold=True)
+    ) # Crea oggetto in memoria
+    new_order.order_details = [
+        OrderDetail(
+            product=item_data["product"],
             quantity=item_data["quantity"],
             unit_price=item_data["unit_price"],
             subtotal=item_data["subtotal"]
         )
-        db.add(order_detail)
+        for item_data in order_items
+    ]
+    
+    db.add(new_order)
+    
+    if not idempotency_key:
+        db.commit()         # INSERT ... RETURNING id per ordine e dettagli, poi commit
         
-        # Aggiorna quantità disponibile prodotto
-        item_data["product"].available_quantity -= item_data["quantity"]
+        # 5. Costruisci risposta dagli oggetti in memoria (expire_on_commit=False: nessuna re-query)
+        return order_response(new_order, status_code=status.HTTP_201_CREATED)
     
-    db.commit()                 # Salva tutto definitivamente
-    db.refresh(new_order)       # Ricarica
+    # 5. Con Idempotency-Key la risposta viene salvata nella stessa transazione dell'ordine
+    db.flush()
+    body = serialize_order(new_order)
+    crud_idempotency.store_response(db, client_id, idempotency_key, status.HTTP_201_CREATED, body)
+    db.commit()
+    crud_idempotency.cache_response(client_id, idempotency_key, request_hash, status.HTTP_201_CREATED, body)
     
-    # 6. Carica relazioni per la risposta , carica i dettagli dell'ordine e i prodotti
-    order_with_details = db.query(Order).options(
-        joinedload(Order.order_details).joinedload(OrderDetail.product)
-    ).filter(Order.id == new_order.id).first()
-    
-    # 7. Costruisci risposta
-    response_items = [
-        OrderItemResponse(
-            id=detail.id,
-            product_id=detail.product_id,
-            product_name=detail.product.name,
-            quantity=detail.quantity,
-            unit_price=detail.unit_price,
-            subtotal=detail.subtotal
-        )
-        for detail in order_with_details.order_details
-    ]
+    return JSONBytesResponse(content=body, status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/bulk", response_model=BulkOrderResponse)
+async def create_orders_bulk(
+    request: Request,
+    client_id: int = Depends(get_current_client_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Importa ordini in blocco (marketplace, POS) per il cliente autenticato
+    
+    - Body JSON: lista di ordini nel formato di POST /orders
+    - Body NDJSON (Content-Type: application/x-ndjson): un ordine per riga, letto in streaming
+    - Ordini validati uno a uno e salvati in transazioni da BULK_CHUNK_SIZE
+    - Restituisce l'esito di ogni ordine (indice nel payload o riga NDJSON)
+    """
+    results: list[BulkOrderResult] = []
+    chunk: list[tuple[int, OrderCreate]] = []
+    
+    async def flush():
+        if chunk:
+            results.extend(await run_in_threadpool(crud_order.create_orders_bulk, db, client_id, list(chunk)))
+            chunk.clear()
+    
+    async for index, raw in _iter_bulk_payload(request):
+        try:
+            order_data = OrderCreate.model_validate_json(raw) if isinstance(raw, (bytes, str)) else OrderCreate.model_validate(raw)
+        except ValidationError as e:
+            results.append(BulkOrderResult(index=index, success=False, error=_format_validation_error(e)))
+            continue
+        chunk.append((index, order_data))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    await flush()
+    
+    results.sort(key=lambda result: result.index)
+    created = sum(1 for result in results if result.success)
+    return BulkOrderResponse(created=created, failed=len(results) - created, results=results)
+
+
+async def _iter_bulk_payload(request: Request):
+    """Restituisce (indice, ordine grezzo) da un body JSON o NDJSON"""
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index = 0
+        buffer = b""
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
     
-    return OrderResponse(
-        id=order_with_details.id,
-        order_number=order_with_details.order_number,
-        client_id=order_with_details.client_id,
-        status=order_with_details.status,
-        total=order_with_details.total,
-        subtotal=order_with_details.subtotal,
-        shipping_cost=order_with_details.shipping_cost,
-        tax=order_with_details.tax,
-        discount=order_with_details.discount,
-        discount_code=order_with_details.discount_code,
-        shipping_address=order_with_details.shipping_address,
-        shipping_city=order_with_details.shipping_city,
-        shipping_postal_code=order_with_details.shipping_postal_code,
-        shipping_state=order_with_details.shipping_state,
-        shipping_country=order_with_details.shipping_country,
-        notes=order_with_details.notes,
-        paid=order_with_details.paid,
-        paid_at=order_with_details.paid_at,
-        shipped_at=order_with_details.shipped_at,
-        delivered_at=order_with_details.delivered_at,
-        created_at=order_with_details.created_at,
-        updated_at=order_with_details.updated_at,
-        items=response_items
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON body"
+        )
+    if not isinstance(payload, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a list of orders"
+        )
+    for index, raw in enumerate(payload):
+        yield index, raw
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Errori di validazione in una riga leggibile"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'body'}: {err['msg']}"
+        for err in error.errors()
     )
 
 
 @router.get("/", response_model=List[OrderListResponse])
-def get_all_orders(db: Session = Depends(get_db)):
+def get_all_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    client_id: int = Depends(get_current_client_id),
+    db: Session = Depends(get_db)
+):
     """
-    Recupera tutti gli ordini del cliente ID=1
+    Recupera gli ordini del cliente autenticato, dal più recente
+    
+    - limit: numero massimo di ordini per pagina
+    - cursor: cursore restituito nell'header X-Next-Cursor della pagina precedente
     """
-    orders = db.query(Order).filter(
-        Order.client_id == TEMP_CLIENT_ID
-    ).order_by(Order.created_at.desc()).all()
-    
-    response = []
-    for order in orders:
-        items_count = db.query(OrderDetail).filter(OrderDetail.order_id == order.id).count()
-        response.append(
-            OrderListResponse(
-                id=order.id,
-                order_number=order.order_number,
-                status=order.status,
-                total=order.total,
-                created_at=order.created_at,
-                items_count=items_count
-            )
-        )
+    after = None
+    if cursor:
+        after = _decode_order_cursor(cursor)
     
-    return response
+    orders = crud_order.get_orders(db, client_id, limit, after)
+    
+    if len(orders) == limit:
+        last = orders[-1]
+        set_next_cursor(response, encode_cursor(last.created_at, last.id))
+    
+    return orders
+
+
+@router.get("/export", dependencies=[Depends(require_admin_key)])
+def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(
+        None,
+        alias="status",
+        pattern="^(pending|paid|processing|shipped|delivered|cancelled|refunded)$"
+    )
+):
+    """
+    Export ordini per la contabilità, una riga per dettaglio ordine
+    
+    - Solo back-office: header X-Admin-Key (ADMIN_API_KEY), ordini di tutti i clienti
+    - format: ndjson oppure csv
+    - date_from / date_to: intervallo su created_at (date_to escluso)
+    - status: filtra per stato ordine
+    - Streaming con cursore lato server: memoria costante qualunque sia il numero di righe
+    """
+    return StreamingResponse(
+        stream_orders(format, date_from, date_to, status_filter),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
-def get_order_detail(order_id: int, db: Session = Depends(get_db)):
+def get_order_detail(
+    order_id: int,
+    request: Request,
+    client_id: int = Depends(get_current_client_id),
+    db: Session = Depends(get_db)
+):
     """
-    Recupera dettagli di un ordine specifico
+    Recupera dettagli di un ordine del cliente autenticato
+    
+    - Verifica prima solo le date di aggiornamento: 304 se la copia del client è aggiornata
+    - Altrimenti carica ordine, dettagli e prodotti
     """
+    version = crud_order.get_order_version(db, order_id, client_id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found"
+        )
+    etag, last_modified = _order_validators(order_id, *version)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    
     order = db.query(Order).options(
         joinedload(Order.order_details).joinedload(OrderDetail.product)
-    ).filter(Order.id == order_id).first()
+    ).filter(Order.id == order_id, Order.client_id == client_id).first()
     
     if not order:
         raise HTTPException(
@@ -235,43 +327,17 @@ def get_order_detail(order_id: int, db: Session = Depends(get_db)):
             detail="Order not found"
         )
     
-    response_items = [
-        OrderItemResponse(
-            id=detail.id,
-            product_id=detail.product_id,
-            product_name=detail.product.name,
-            quantity=detail.quantity,
-            unit_price=detail.unit_price,
-            subtotal=detail.subtotal
-        )
-        for detail in order.order_details
-    ]
-    
-    return OrderResponse(
-        id=order.id,
-        order_number=order.order_number,
-        client_id=order.client_id,
-        status=order.status,
-        total=order.total,
-        subtotal=order.subtotal,
-        shipping_cost=order.shipping_cost,
-        tax=order.tax,
-        discount=order.discount,
-        discount_code=order.discount_code,
-        shipping_address=order.shipping_address,
-        shipping_city=order.shipping_city,
-        shipping_postal_code=order.shipping_postal_code,
-        shipping_state=order.shipping_state,
-        shipping_country=order.shipping_country,
-        notes=order.notes,
-        paid=order.paid,
-        paid_at=order.paid_at,
-        shipped_at=order.shipped_at,
-        delivered_at=order.delivered_at,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        items=response_items
-    )
+    response = order_response(order)
+    products_updated_at = max((detail.product.updated_at for detail in order.order_details), default=None)
+    set_validators(response, *_order_validators(order.id, order.updated_at, products_updated_at))
+    return response
+
+
+def _order_validators(order_id: int, updated_at: datetime, products_updated_at: Optional[datetime]) -> tuple[str, datetime]:
+    """ETag e Last-Modified di un ordine (la risposta include i nomi dei prodotti)"""
+    if products_updated_at is None:
+        return make_etag("order", order_id, updated_at), updated_at
+    return make_etag("order", order_id, updated_at, products_updated_at), max(updated_at, products_updated_at)
 
 
 @router.patch("/{order_id}/status", response_model=OrderResponse)
@@ -281,78 +347,63 @@ def update_order_status(
     db: Session = Depends(get_db)
 ):
     """
-    Aggiorna lo stato di un ordine
+    Aggiorna lo stato di un ordine secondo la macchina a stati
+    
+    - Un UPDATE condizionale (compare-and-set) ... RETURNING per stato e date
+    - Una query per i dettagli con i prodotti
+    - 409 se la transizione non è ammessa dallo stato corrente
     """
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = crud_order.update_status(db, order_id, status_update.status)
     
     if not order:
+        current_status = crud_order.get_order_status(db, order_id)
+        db.rollback()
+        if current_status is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Order not found"
+            )
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Cannot change order status from '{current_status}' to '{status_update.status}'"
         )
     
-    order.status = status_update.status
+    details = crud_order.get_order_details(db, order.id)
+    db.commit()
     
-    if status_update.status == "paid" and not order.paid:
-        order.paid = True
-        order.paid_at = datetime.now(timezone.utc)
-    elif status_update.status == "shipped":
-        order.shipped_at = datetime.now(timezone.utc)
-    elif status_update.status == "delivered":
-        order.delivered_at = datetime.now(timezone.utc)
+    return order_response(order, details)
+
+
+@router.patch("/status", response_model=OrderBulkStatusResponse)
+def update_orders_status(status_update: OrderBulkStatusUpdate, db: Session = Depends(get_db)):
+    """
+    Aggiorna lo stato di molti ordini con un solo UPDATE (es. un lotto spedito dal magazzino)
     
+    - Passano al nuovo stato solo gli ordini per cui la transizione è ammessa
+    - Gli altri vengono restituiti in skipped
+    """
+    updated = crud_order.update_status_bulk(db, status_update.order_ids, status_update.status)
     db.commit()
-    db.refresh(order)
-    
-    order_with_details = db.query(Order).options(
-        joinedload(Order.order_details).joinedload(OrderDetail.product)
-    ).filter(Order.id == order.id).first()
-    
-    response_items = [
-        OrderItemResponse(
-            id=detail.id,
-            product_id=detail.product_id,
-            product_name=detail.product.name,
-            quantity=detail.quantity,
-            unit_price=detail.unit_price,
-            subtotal=detail.subtotal
-        )
-        for detail in order_with_details.order_details
-    ]
     
-    return OrderResponse(
-        id=order_with_details.id,
-        order_number=order_with_details.order_number,
-        client_id=order_with_details.client_id,
-        status=order_with_details.status,
-        total=order_with_details.total,
-        subtotal=order_with_details.subtotal,
-        shipping_cost=order_with_details.shipping_cost,
-        tax=order_with_details.tax,
-        discount=order_with_details.discount,
-        discount_code=order_with_details.discount_code,
-        shipping_address=order_with_details.shipping_address,
-        shipping_city=order_with_details.shipping_city,
-        shipping_postal_code=order_with_details.shipping_postal_code,
-        shipping_state=order_with_details.shipping_state,
-        shipping_country=order_with_details.shipping_country,
-        notes=order_with_details.notes,
-        paid=order_with_details.paid,
-        paid_at=order_with_details.paid_at,
-        shipped_at=order_with_details.shipped_at,
-        delivered_at=order_with_details.delivered_at,
-        created_at=order_with_details.created_at,
-        updated_at=order_with_details.updated_at,
-        items=response_items
-    )
+    updated_ids = set(updated)
+    skipped = sorted(set(status_update.order_ids) - updated_ids)
+    return OrderBulkStatusResponse(status=status_update.status, updated=updated, skipped=skipped)
 
 
 @router.delete("/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
-def cancel_order(order_id: int, db: Session = Depends(get_db)):
+def cancel_order(
+    order_id: int,
+    client_id: int = Depends(get_current_client_id),
+    db: Session = Depends(get_db)
+):
     """
-    Cancella un ordine (solo se pending)
+    Cancella un ordine del cliente autenticato (solo se pending)
+    
+    - Blocca l'ordine (annullamenti concorrenti attendono)
+    - Restituisce lo stock con un unico UPDATE set-based
+    - Elimina l'ordine; i dettagli seguono via FK ON DELETE CASCADE
     """
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = crud_order.lock_order(db, order_id, client_id)
     
     if not order:
         raise HTTPException(
@@ -366,14 +417,8 @@ def cancel_order(order_id: int, db: Session = Depends(get_db)):
             detail="Only pending orders can be cancelled"
         )
     
-    # Ripristina quantità prodotti
-    order_details = db.query(OrderDetail).filter(OrderDetail.order_id == order_id).all()
-    for detail in order_details:
-        product = db.query(Product).filter(Product.id == detail.product_id).first()
-        if product:
-            product.available_quantity += detail.quantity
-    
-    db.delete(order)
+    crud_order.restock_orders(db, [order.id])
+    crud_order.delete_order(db, order.id)
     db.commit()
     
-    return None
\ No newline at end of file
+    return None
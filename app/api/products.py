@@ -1,41 +1,214 @@
 """
 Products API Router
 """
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import Optional
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from app.conditional import is_not_modified, make_etag, make_list_etag, not_modified, set_validators
 from app.database import get_db
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from app.product_import import import_products
+from app.pagination import decode_cursor, decode_id_cursor, encode_cursor, set_next_cursor
+from app.schemas.product import (
+    ProductCreate,
+    ProductUpdate,
+    ProductResponse,
+    ProductFilter,
+    ProductBatchRequest,
+    ProductImportResponse
+)
 from app.crud import product as crud_product
+from app.crud import category as crud_category
 
 # Crea router per products
 router = APIRouter()
 
+# Header con gli ID richiesti ma inesistenti (lettura per ID multipli)
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
+# ID massimi in ?ids= (per liste più lunghe: POST /products/batch)
+MAX_QUERY_IDS = 200
+
+
+def _decode_product_cursor(cursor: str, sort_field: str) -> tuple[int, object]:
+    """Cursore lista prodotti: (id, valore del campo di ordinamento) dell'ultimo prodotto"""
+    if sort_field == "id":
+        return decode_id_cursor(cursor), None
+    values = decode_cursor(cursor)
+    try:
+        value, product_id = values
+        if sort_field == "created_at":
+            value = datetime.fromisoformat(value)
+        elif sort_field == "price":
+            value = float(value)
+        elif not isinstance(value, str):
+            raise ValueError(value)
+        return int(product_id), value
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _parse_ids(ids: str) -> list[int]:
+    """ids=1,5,9 -> [1, 5, 9]; 400 se non validi"""
+    try:
+        product_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(400, "ids non validi: usare numeri separati da virgola")
+    if not product_ids or len(product_ids) > MAX_QUERY_IDS:
+        raise HTTPException(400, f"ids deve contenere da 1 a {MAX_QUERY_IDS} ID (per liste più lunghe: POST /products/batch)")
+    return product_ids
+
+
+def _products_by_ids(db: Session, response: Response, product_ids: list[int]) -> list[ProductResponse]:
+    """Prodotti nell'ordine richiesto; gli ID inesistenti nell'header X-Missing-Ids"""
+    products, missing = crud_product.get_products_by_ids_cached(db, product_ids)
+    if missing:
+        response.headers[MISSING_IDS_HEADER] = ",".join(str(product_id) for product_id in missing)
+    return products
+
+
+def _check_category(db: Session, category_id: Optional[int]) -> None:
+    """400 se la categoria indicata non esiste"""
+    if category_id is not None and not crud_category.get_category(db, category_id):
+        raise HTTPException(400, "Categoria non trovata")
+
 
 @router.get("/products", response_model=list[ProductResponse])
-def list_products(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
-    """Lista prodotti"""
-    return crud_product.get_products(db, skip, limit)
+def list_products(
+    request: Request,
+    response: Response,
+    filters: ProductFilter = Depends(),
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    ids: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista prodotti
+    
+    - ids: solo i prodotti indicati (es. ids=1,5,9), nell'ordine richiesto;
+      ignora filtri e paginazione, ID inesistenti nell'header X-Missing-Ids
+    - skip: paginazione classica (compatibilità)
+    - cursor: paginazione keyset, valore dell'header X-Next-Cursor della pagina precedente
+    - min_price / max_price / featured / category_id / in_stock: filtri
+    - sort: id, price, name, created_at (prefisso '-' per l'ordine decrescente)
+    - Risposte dalla cache in memoria (app.product_cache)
+    - ETag della pagina: 304 se If-None-Match corrisponde
+    """
+    if ids is not None:
+        return _products_by_ids(db, response, _parse_ids(ids))
+    
+    if filters.min_price is not None and filters.max_price is not None and filters.min_price > filters.max_price:
+        raise HTTPException(400, "min_price non può essere maggiore di max_price")
+    sort_field = filters.sort.lstrip("-")
+    after_id, after_value = _decode_product_cursor(cursor, sort_field) if cursor else (None, None)
+    products = crud_product.get_products_cached(db, skip, limit, after_id, filters, after_value)
+    next_cursor = None
+    if limit > 0 and len(products) == limit:
+        last = products[-1]
+        if sort_field == "id":
+            next_cursor = encode_cursor(last.id)
+        else:
+            next_cursor = encode_cursor(getattr(last, sort_field), last.id)
+    
+    # Solo ETag: una pagina può cambiare (prodotto eliminato) senza che cresca il suo updated_at massimo
+    etag = make_list_etag("products", ((product.id, product.updated_at) for product in products))
+    if is_not_modified(request, etag):
+        cached_response = not_modified(etag)
+        set_next_cursor(cached_response, next_cursor)
+        return cached_response
+    set_next_cursor(response, next_cursor)
+    set_validators(response, etag)
+    return products
+
+
+@router.post("/products/batch", response_model=list[ProductResponse])
+def get_products_batch(batch: ProductBatchRequest, response: Response, db: Session = Depends(get_db)):
+    """
+    Prodotti per lista di ID (carrello, righe ordine) - come ?ids= ma per liste lunghe
+    
+    - Un'unica query IN per gli ID non presenti nella cache
+    - Ordine della richiesta, ID inesistenti nell'header X-Missing-Ids
+    """
+    return _products_by_ids(db, response, batch.ids)
+
+
+@router.get("/products/search", response_model=list[ProductResponse])
+def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Ricerca full-text sui prodotti attivi (nome e descrizione), per rilevanza
+    
+    - q: termini da cercare (tutti devono comparire, anche come prefisso)
+    - skip / limit: paginazione dei risultati
+    """
+    return crud_product.search_products(db, q, skip, limit)
 
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    """Dettaglio prodotto"""
-    product = crud_product.get_product(db, product_id)
+def get_product(product_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """Dettaglio prodotto (dalla cache in memoria), con ETag e Last-Modified"""
+    product = crud_product.get_product_cached(db, product_id)
     if not product:
         raise HTTPException(404, "Prodotto non trovato")
+    etag = make_etag("product", product.id, product.updated_at)
+    if is_not_modified(request, etag, product.updated_at):
+        return not_modified(etag, product.updated_at)
+    set_validators(response, etag, product.updated_at)
     return product
 
 
 @router.post("/products", response_model=ProductResponse, status_code=201)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
     """Crea prodotto"""
+    _check_category(db, product.category_id)
     return crud_product.create_product(db, product)
 
 
+@router.post("/products/import", response_model=ProductImportResponse)
+async def import_products_bulk(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Importa o aggiorna prodotti in blocco (catalogo fornitore)
+    
+    - Body CSV (intestazione con i campi di ProductCreate) o NDJSON
+      (format=ndjson o Content-Type: application/x-ndjson)
+    - Letto in streaming, upsert su sku in transazioni da 1000 righe
+    - Restituisce i conteggi e le righe scartate con il motivo
+    """
+    if format is None:
+        format = "ndjson" if request.headers.get("content-type", "").startswith("application/x-ndjson") else "csv"
+    stream = request.stream()
+    
+    def chunks():
+        # Il body viene letto dal thread dell'import, un blocco alla volta
+        while True:
+            try:
+                yield anyio.from_thread.run(stream.__anext__)
+            except StopAsyncIteration:
+                return
+    
+    return await run_in_threadpool(import_products, db, chunks(), format)
+
+
 @router.put("/products/{product_id}", response_model=ProductResponse)
 def update_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
     """Aggiorna prodotto"""
+    _check_category(db, product_update.category_id)
     product = crud_product.update_product(db, product_id, product_update)
     if not product:
         raise HTTPException(404, "Prodotto non trovato")
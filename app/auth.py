@@ -0,0 +1,209 @@
+"""
+Autenticazione - token di sessione firmati con HMAC
+
+Il login emette due token:
+- access (breve durata, AUTH_ACCESS_TOKEN_MINUTES): inviato come
+  "Authorization: Bearer <token>" a ogni richiesta autenticata
+- refresh (lunga durata, AUTH_REFRESH_TOKEN_DAYS): scambiato con una nuova
+  coppia su POST /api/clients/token/refresh (rotazione: ogni refresh token
+  vale una sola volta)
+
+Formato: tipo.client_id.emesso.scadenza.jti.firma (firma HMAC-SHA256 dei
+campi precedenti con AUTH_SECRET_KEY; emesso in millisecondi epoch, scadenza
+in secondi). La verifica non tocca il database né
+bcrypt: firma, scadenza e revoche in memoria (RevocationCache), pochi
+microsecondi per richiesta.
+
+Revoche (tabella revoked_tokens, vedi app.crud.token e app.token_cache):
+- di un singolo token (logout, refresh token già usato), tramite jti
+- di tutti i token di un cliente emessi prima di un istante
+  (cambio password, eliminazione)
+In memoria solo le revoche degli access token e quelle di tutti i token di un
+cliente; i refresh token usati (uno per refresh) restano nel database, dove
+vengono verificati a ogni refresh.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.orm import Session
+
+from app.crud import token as crud_token
+from app.database import SessionLocal
+from app.token_cache import revocation_cache
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL = int(os.getenv("AUTH_ACCESS_TOKEN_MINUTES", "15")) * 60
+REFRESH_TOKEN_TTL = int(os.getenv("AUTH_REFRESH_TOKEN_DAYS", "30")) * 86400
+
+ACCESS = "a"
+REFRESH = "r"
+
+_secret = os.getenv("AUTH_SECRET_KEY")
+if not _secret:
+    # Senza chiave condivisa i token valgono solo per questo processo
+    logger.warning("AUTH_SECRET_KEY non impostata: chiave casuale, i token non sopravvivono al riavvio")
+    _secret = secrets.token_urlsafe(32)
+SECRET_KEY = _secret.encode("utf-8")
+
+# Chiave del back-office (export ordini); non impostata: endpoint disabilitati
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+ADMIN_KEY_HEADER = "X-Admin-Key"
+
+
+class InvalidToken(Exception):
+    """Token malformato, con firma errata, scaduto o del tipo sbagliato"""
+
+
+class TokenClaims(NamedTuple):
+    """Campi di un token verificato"""
+    token_type: str
+    client_id: int
+    # Millisecondi epoch: le revoche per cliente non lasciano passare i token dello stesso secondo
+    issued_at: int
+    expires_at: int
+    jti: str
+
+
+# ==================== FIRMA ====================
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET_KEY, payload.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def create_token(client_id: int, token_type: str = ACCESS, now: Optional[float] = None) -> tuple[str, TokenClaims]:
+    """Nuovo token firmato (e i suoi campi, per eventuali revoche); now in secondi epoch"""
+    if now is None:
+        now = time.time()
+    ttl = ACCESS_TOKEN_TTL if token_type == ACCESS else REFRESH_TOKEN_TTL
+    claims = TokenClaims(token_type, client_id, int(now * 1000), int(now) + ttl, secrets.token_hex(8))
+    payload = f"{claims.token_type}.{claims.client_id}.{claims.issued_at}.{claims.expires_at}.{claims.jti}"
+    return f"{payload}.{_sign(payload)}", claims
+
+
+def decode_token(token: str, token_type: str = ACCESS) -> TokenClaims:
+    """Verifica firma, tipo e scadenza (non le revoche); InvalidToken se non valido"""
+    payload, _, signature = token.rpartition(".")
+    if not payload or not hmac.compare_digest(signature.encode("utf-8"), _sign(payload).encode("ascii")):
+        raise InvalidToken()
+    try:
+        kind, client_id, issued_at, expires_at, jti = payload.split(".")
+        claims = TokenClaims(kind, int(client_id), int(issued_at), int(expires_at), jti)
+    except ValueError:
+        raise InvalidToken()
+    if claims.token_type != token_type or claims.expires_at <= time.time():
+        raise InvalidToken()
+    return claims
+
+
+def issue_tokens(client_id: int) -> dict:
+    """Nuova coppia access + refresh token (login e refresh)"""
+    now = time.time()
+    access_token, _ = create_token(client_id, ACCESS, now)
+    refresh_token, _ = create_token(client_id, REFRESH, now)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL
+    }
+
+
+# ==================== REVOCHE ====================
+
+def _load_revocations() -> tuple[set[str], dict[int, int]]:
+    db = SessionLocal()
+    try:
+        return crud_token.load_revocations(db, ACCESS)
+    finally:
+        db.close()
+
+
+def is_token_revoked(claims: TokenClaims) -> bool:
+    """Revoca del token dalla copia in memoria (query solo se va ricaricata)"""
+    return revocation_cache.is_revoked(claims.client_id, claims.jti, claims.issued_at, _load_revocations)
+
+
+def revoke_token(db: Session, claims: TokenClaims) -> bool:
+    """
+    Revoca un singolo token (False se era già revocato). Solo le revoche
+    degli access token finiscono nella copia in memoria: i refresh token
+    sono verificati sul database e non la fanno ricaricare agli altri worker.
+    """
+    return crud_token.revoke_token(
+        db, claims.client_id, claims.jti, claims.token_type, claims.expires_at, cached=claims.token_type == ACCESS
+    )
+
+
+def revoke_all_tokens(db: Session, client_id: int) -> None:
+    """
+    Revoca tutti i token già emessi per il cliente (cambio password, eliminazione).
+    Al millisecondo, compreso quello corrente: nessun token emesso prima della
+    revoca resta valido (al più un login dello stesso millisecondo va ripetuto).
+    """
+    now = time.time()
+    crud_token.revoke_client_tokens(db, client_id, int(now * 1000) + 1, int(now) + REFRESH_TOKEN_TTL)
+
+
+# ==================== DIPENDENZE ====================
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def get_token_claims(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> TokenClaims:
+    """
+    Access token dell'header Authorization (401 se assente, non valido,
+    scaduto o revocato). Nessuna query se le revoche in memoria sono valide.
+    """
+    if credentials is None:
+        raise _unauthorized("Token mancante")
+    try:
+        claims = decode_token(credentials.credentials, ACCESS)
+    except InvalidToken:
+        raise _unauthorized("Token non valido o scaduto")
+    if is_token_revoked(claims):
+        raise _unauthorized("Token revocato")
+    return claims
+
+
+def get_current_client_id(claims: TokenClaims = Depends(get_token_claims)) -> int:
+    """ID del cliente autenticato (dal token, senza leggere clients)"""
+    return claims.client_id
+
+
+_admin_key = APIKeyHeader(name=ADMIN_KEY_HEADER, auto_error=False)
+
+
+def require_admin_key(api_key: Optional[str] = Depends(_admin_key)) -> None:
+    """
+    Endpoint del back-office (non dei clienti): header X-Admin-Key uguale a
+    ADMIN_API_KEY. 403 se ADMIN_API_KEY non è impostata, 401 se la chiave
+    manca o è errata.
+    """
+    if not ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Endpoint del back-office non abilitato"
+        )
+    if api_key is None or not hmac.compare_digest(api_key.encode("utf-8"), ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Chiave del back-office mancante o non valida"
+        )
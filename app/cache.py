@@ -0,0 +1,84 @@
+"""
+Cache in memoria - LRU limitata, thread-safe, con TTL e contatori hit/miss
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Cache LRU con dimensione massima e scadenza opzionale delle voci.
+
+    - maxsize: numero massimo di voci (le meno usate vengono eliminate)
+    - ttl: secondi di validità di una voce (None = nessuna scadenza)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Valore in cache (default se assente o scaduto)"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Inserisce o aggiorna una voce"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Invalida una voce"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_matching(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Invalida le voci per cui predicate(chiave, valore) è vero (e quelle scadute)"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                key for key, (value, expires_at) in self._data.items()
+                if (expires_at is not None and expires_at <= now) or predicate(key, value)
+            ]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        """Invalida tutte le voci"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Contatori della cache"""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,78 @@
+"""
+Snapshot categorie - lista categorie con conteggio prodotti servita dalla memoria
+
+La tabella categories è piccola e letta a ogni pagina del catalogo: ogni
+worker ne tiene una copia immutabile. I conteggi vengono aggiornati in
+memoria insieme al database (crud.category.adjust_product_counts); le altre
+modifiche, e quelle degli altri worker (NOTIFY, vedi app.product_cache),
+fanno ricaricare la copia alla lettura successiva.
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from app.schemas.category import CategoryResponse
+
+CATEGORY_SNAPSHOT_TTL = float(os.getenv("CATEGORY_SNAPSHOT_TTL", "300"))
+
+
+class CategorySnapshot:
+    """Copia in memoria di tutte le categorie, ordinate per nome"""
+
+    def __init__(self, ttl: Optional[float] = CATEGORY_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._categories: Optional[tuple[CategoryResponse, ...]] = None
+        self._loaded_at = 0.0
+        # Incrementato a ogni invalidazione: un caricamento iniziato prima non viene salvato
+        self._generation = 0
+
+    def _fresh(self) -> Optional[tuple[CategoryResponse, ...]]:
+        categories = self._categories
+        if categories is None:
+            return None
+        if self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl:
+            return None
+        return categories
+
+    def get(self, load: Callable[[], list]) -> tuple[CategoryResponse, ...]:
+        """Categorie dalla memoria; se la copia non è valida la ricarica con load() (un thread alla volta)"""
+        categories = self._fresh()
+        if categories is not None:
+            return categories
+        with self._reload_lock:
+            categories = self._fresh()
+            if categories is not None:
+                return categories
+            generation = self._generation
+            categories = tuple(CategoryResponse.model_validate(category) for category in load())
+            with self._lock:
+                if generation == self._generation:
+                    self._categories = categories
+                    self._loaded_at = time.monotonic()
+            return categories
+
+    def apply_counts(self, deltas: dict[int, int]) -> None:
+        """Aggiorna in memoria i conteggi prodotti già scritti nel database"""
+        with self._lock:
+            # Un caricamento in corso può aver letto i conteggi precedenti
+            self._generation += 1
+            if self._categories is None:
+                return
+            self._categories = tuple(
+                category.model_copy(update={"product_count": category.product_count + deltas[category.id]})
+                if category.id in deltas else category
+                for category in self._categories
+            )
+
+    def invalidate(self) -> None:
+        """La prossima lettura ricarica le categorie dal database"""
+        with self._lock:
+            self._generation += 1
+            self._categories = None
+
+
+# Snapshot del processo
+category_snapshot = CategorySnapshot()
@@ -0,0 +1,160 @@
+"""
+Import clienti in blocco (CSV / NDJSON) - migrazione da un altro sistema, da riga di comando
+
+Il file viene letto in streaming (stesso formato di app.product_import): ogni
+riga è validata con ClientImport e salvata in transazioni da
+IMPORT_BATCH_SIZE righe con INSERT ... ON CONFLICT (lower(email)) DO NOTHING.
+
+Le password in chiaro vengono hashate con bcrypt in parallelo su tutti i core
+(pool di processi): mentre un blocco viene inserito il pool prepara gli hash
+del blocco successivo. Le righe con password_hash (bcrypt del vecchio
+sistema) vengono importate senza ricalcolare nulla.
+
+    python -m app.client_import clienti.csv
+    python -m app.client_import clienti.ndjson --format ndjson --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from pydantic import ValidationError
+
+from app.crud import client as crud_client
+from app.database import SessionLocal
+from app.password_hasher import hash_password
+from app.product_import import IMPORT_FORMATS, MAX_REPORTED_ERRORS, iter_lines, iter_records
+from app.schemas.client import ClientImport, ClientImportError, ClientImportResponse
+
+# Righe per transazione (un INSERT ... ON CONFLICT multi-riga ciascuna)
+IMPORT_BATCH_SIZE = 1000
+
+
+def _validate(raw) -> ClientImport:
+    if isinstance(raw, str):
+        return ClientImport.model_validate_json(raw)
+    return ClientImport.model_validate(raw)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Errori di validazione in una riga leggibile (senza ripetere la password)"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'riga'}: {err['msg']}"
+        for err in error.errors(include_input=False)
+    )
+
+
+def import_clients(
+    db,
+    chunks: Iterable[bytes],
+    format: str = "csv",
+    batch_size: int = IMPORT_BATCH_SIZE,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int, int], None]] = None
+) -> ClientImportResponse:
+    """
+    Importa clienti letti a blocchi di byte.
+
+    - workers: processi per bcrypt (default: tutti i core)
+    - progress(righe lette, creati, scartati) viene chiamata dopo ogni transazione
+    """
+    workers = workers or os.cpu_count() or 1
+    created = failed = read = 0
+    errors: list[ClientImportError] = []
+    batch: list[tuple[int, ClientImport]] = []
+
+    def report(batch_errors: list[ClientImportError]):
+        nonlocal failed
+        failed += len(batch_errors)
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def start_hashing(rows: list[tuple[int, ClientImport]]):
+            # Executor.map invia subito tutti gli hash al pool
+            passwords = [client.password for _, client in rows if client.password_hash is None]
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return rows, executor.map(hash_password, passwords, chunksize=chunksize)
+
+        def insert(pending):
+            nonlocal created
+            rows, hashes = pending
+            hashes = iter(list(hashes))
+            values = [
+                (line, {
+                    **client.model_dump(exclude={"password", "password_hash"}),
+                    "password_hash": client.password_hash or next(hashes)
+                })
+                for line, client in rows
+            ]
+            batch_created, batch_errors = crud_client.insert_clients(db, values)
+            created += batch_created
+            report(batch_errors)
+            if progress:
+                progress(read, created, failed)
+
+        pending = None
+        for line, raw in iter_records(iter_lines(chunks), format):
+            read += 1
+            try:
+                batch.append((line, _validate(raw)))
+            except ValidationError as e:
+                email = raw.get("email") if isinstance(raw, dict) else None
+                report([ClientImportError(line=line, email=email, error=_format_validation_error(e))])
+                continue
+            if len(batch) >= batch_size:
+                # Hash del blocco nel pool mentre si inserisce il precedente
+                next_pending = start_hashing(batch)
+                batch = []
+                if pending:
+                    insert(pending)
+                pending = next_pending
+        if batch:
+            next_pending = start_hashing(batch)
+            if pending:
+                insert(pending)
+            pending = next_pending
+        if pending:
+            insert(pending)
+        elif progress:
+            progress(read, created, failed)
+
+    return ClientImportResponse(created=created, failed=failed, errors=errors)
+
+
+def main(argv=None):
+    """Entry point da riga di comando"""
+    parser = argparse.ArgumentParser(description="Importa clienti da CSV o NDJSON (email già registrate scartate)")
+    parser.add_argument("file", help="File da importare ('-' per stdin)")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: dall'estensione del file")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Righe per transazione")
+    parser.add_argument("--workers", type=int, help="Processi per bcrypt (default: tutti i core)")
+    args = parser.parse_args(argv)
+
+    format = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+
+    def progress(read, created, failed):
+        print(f"\rRighe {read:,}  creati {created:,}  scartati {failed:,}", end="", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        result = import_clients(
+            db, iter(lambda: source.read(1 << 20), b""), format, args.batch_size, args.workers, progress
+        )
+    finally:
+        db.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+
+    print(file=sys.stderr)
+    for error in result.errors:
+        print(json.dumps(error.model_dump(), ensure_ascii=False))
+    if result.failed > len(result.errors):
+        print(f"... altre {result.failed - len(result.errors)} righe scartate", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+GET condizionali - ETag, Last-Modified e 304 Not Modified
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Le colonne DateTime sono salvate in UTC senza fuso orario
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _version(updated_at: datetime) -> str:
+    return f"{_as_utc(updated_at).timestamp():.6f}"
+
+
+def make_etag(kind: str, row_id: int, *versions: datetime) -> str:
+    """
+    ETag forte di una singola risorsa, da id e updated_at
+    (più updated_at aggiuntivi se la risposta include dati di altre righe)
+    """
+    return f'"{kind}-{row_id}-{"-".join(_version(updated_at) for updated_at in versions)}"'
+
+
+def make_list_etag(kind: str, rows: Iterable[tuple[int, datetime]]) -> str:
+    """ETag forte di una pagina, da (id, updated_at) di ogni riga"""
+    digest = hashlib.sha256()
+    for row_id, updated_at in rows:
+        digest.update(f"{row_id}:{_version(updated_at)};".encode("ascii"))
+    return f'"{kind}-{digest.hexdigest()[:32]}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    True se la copia del client è ancora valida.
+
+    If-None-Match ha la precedenza; If-Modified-Since viene usato solo se
+    If-None-Match è assente (RFC 9110).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Confronto debole: W/"x" corrisponde a "x"
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # Last-Modified ha la precisione del secondo
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None) -> None:
+    """Aggiunge ETag e Last-Modified alla risposta"""
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """Risposta 304 senza body, con gli stessi validatori"""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
@@ -1,9 +1,13 @@
 """
 CRUD Operations
 """
+from app.crud import category
 from app.crud import product
 from app.crud import client 
+from app.crud import order
+from app.crud import idempotency
+from app.crud import token
 
 # Espone il modulo per importarlo facilmente
-__all__ = ["product", "client"] 
+__all__ = ["category", "product", "client", "order", "idempotency", "token"] 
 
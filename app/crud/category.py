@@ -0,0 +1,134 @@
+"""
+CRUD operations per Category
+"""
+from typing import Optional
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.category_cache import category_snapshot
+from app.models.category import Category
+from app.models.product import Product
+from app.product_cache import notify_categories_changed
+from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
+
+
+# ==================== LEGGI ====================
+
+def get_category(db: Session, category_id: int) -> Optional[Category]:
+    """Ottieni una categoria per ID"""
+    return db.query(Category).filter(Category.id == category_id).first()
+
+
+def get_category_by_name(db: Session, name: str) -> Optional[Category]:
+    """Ottieni una categoria per nome"""
+    return db.query(Category).filter(Category.name == name).first()
+
+
+def get_categories(db: Session) -> list[Category]:
+    """Tutte le categorie ordinate per nome (la tabella è piccola)"""
+    return db.query(Category).order_by(Category.name).all()
+
+
+def get_categories_cached(db: Session, active_only: bool = True) -> list[CategoryResponse]:
+    """Categorie dallo snapshot in memoria (nessuna query se è valido)"""
+    categories = category_snapshot.get(lambda: get_categories(db))
+    return [category for category in categories if category.active or not active_only]
+
+
+# ==================== CONTEGGIO PRODOTTI ====================
+
+def product_count_deltas(
+    old_category_id: Optional[int],
+    old_active: bool,
+    new_category_id: Optional[int],
+    new_active: bool
+) -> dict[int, int]:
+    """Variazioni di product_count per categoria dovute alla modifica di un prodotto"""
+    deltas: dict[int, int] = {}
+    if old_active and old_category_id is not None:
+        deltas[old_category_id] = deltas.get(old_category_id, 0) - 1
+    if new_active and new_category_id is not None:
+        deltas[new_category_id] = deltas.get(new_category_id, 0) + 1
+    return {category_id: delta for category_id, delta in deltas.items() if delta}
+
+
+def adjust_product_counts(db: Session, deltas: dict[int, int]) -> None:
+    """
+    Applica le variazioni di product_count con un solo UPDATE nella
+    transazione corrente (dopo il commit: category_snapshot.apply_counts)
+    """
+    if not deltas:
+        return
+    db.execute(
+        update(Category)
+        .where(Category.id.in_(sorted(deltas)))
+        .values(product_count=Category.product_count + case(deltas, value=Category.id))
+        .execution_options(synchronize_session=False)
+    )
+    notify_categories_changed(db)
+
+
+def recount_products(db: Session) -> None:
+    """Ricalcola da zero product_count di tutte le categorie (riparazione)"""
+    active_products = (
+        select(func.count(Product.id))
+        .where(Product.category_id == Category.id, Product.active == True)
+        .correlate(Category)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Category)
+        .values(product_count=active_products)
+        .execution_options(synchronize_session=False)
+    )
+    notify_categories_changed(db)
+    db.commit()
+    category_snapshot.invalidate()
+
+
+# ==================== CREA ====================
+
+def create_category(db: Session, category: CategoryCreate) -> Category:
+    """Crea nuova categoria"""
+    db_category = Category(**category.model_dump(), product_count=0)
+    db.add(db_category)
+    notify_categories_changed(db)
+    db.commit()
+    db.refresh(db_category)
+    category_snapshot.invalidate()
+    return db_category
+
+
+# ==================== AGGIORNA ====================
+
+def update_category(db: Session, category_id: int, category_update: CategoryUpdate) -> Optional[Category]:
+    """Aggiorna categoria"""
+    db_category = get_category(db, category_id)
+    if not db_category:
+        return None
+    
+    # Aggiorna solo i campi forniti
+    update_data = category_update.model_dump(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(db_category, field, value)
+    
+    notify_categories_changed(db)
+    db.commit()
+    db.refresh(db_category)
+    category_snapshot.invalidate()
+    return db_category
+
+
+# ==================== ELIMINA ====================
+
+def delete_category(db: Session, category_id: int) -> bool:
+    """Elimina categoria (soft delete - imposta active=False)"""
+    db_category = get_category(db, category_id)
+    if not db_category:
+        return False
+    
+    db_category.active = False
+    notify_categories_changed(db)
+    db.commit()
+    category_snapshot.invalidate()
+    return True
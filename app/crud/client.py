@@ -1,29 +1,15 @@
 """
 CRUD operations per Client
 """
+from datetime import datetime
 from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-import bcrypt
 
+from app.database import insert_on_conflict
 from app.models.client import Client
-from app.schemas.client import ClientCreate, ClientUpdate
-
-
-# ==================== UTILITY ====================
-
-def hash_password(password: str) -> str:
-    """Hash della password usando bcrypt direttamente"""
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica password usando bcrypt direttamente"""
-    password_bytes = plain_password.encode('utf-8')
-    hashed_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+from app.schemas.client import ClientCreate, ClientUpdate, ClientImportError, normalize_email
 
 
 # ==================== LEGGI ====================
@@ -33,36 +19,106 @@ def get_client(db: Session, client_id: int) -> Optional[Client]:
     return db.query(Client).filter(Client.id == client_id).first()
 
 
-def get_client_by_email(db: Session, email: str) -> Optional[Client]:
-    """Ottieni un cliente per email"""
-    return db.query(Client).filter(Client.email == email).first()
+def get_client_updated_at(db: Session, client_id: int) -> Optional[datetime]:
+    """Data ultimo aggiornamento di un cliente (per l'ETag), senza caricarlo"""
+    return db.execute(select(Client.updated_at).where(Client.id == client_id)).scalar_one_or_none()
+
 
+def client_by_email_query(db: Session, email: str):
+    """Query del cliente con email, senza distinzione tra maiuscole e minuscole (indice idx_clients_email_lower)"""
+    return db.query(Client).filter(func.lower(Client.email) == normalize_email(email))
 
-def get_clients(db: Session, skip: int = 0, limit: int = 100, active_only: bool = True) -> list[Client]:
-    """Ottieni lista clienti"""
+
+def get_client_by_email(db: Session, email: str) -> Optional[Client]:
+    """Ottieni un cliente per email (maiuscole e spazi ignorati)"""
+    return client_by_email_query(db, email).first()
+
+
+def get_clients(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    active_only: bool = True,
+    after_id: Optional[int] = None
+) -> list[Client]:
+    """
+    Ottieni lista clienti ordinata per ID
+    
+    - after_id: paginazione keyset (id > after_id), ignora skip
+    """
     query = db.query(Client)
     if active_only:
         query = query.filter(Client.active == True)
-    return query.offset(skip).limit(limit).all()
+    if after_id is not None:
+        return query.filter(Client.id > after_id).order_by(Client.id).limit(limit).all()
+    return query.order_by(Client.id).offset(skip).limit(limit).all()
 
 
 # ==================== CREA ====================
 
-def create_client(db: Session, client: ClientCreate) -> Client:
-    """Registra nuovo cliente"""
-    # Hash password
-    hashed_password = hash_password(client.password)
+def create_client(db: Session, client: ClientCreate, password_hash: str) -> Optional[Client]:
+    """
+    Registra nuovo cliente con un solo INSERT ... ON CONFLICT (lower(email)) DO NOTHING RETURNING
     
+    - password_hash: hash già calcolato (API: app.password_hasher, mai bcrypt nel threadpool)
+    - Restituisce None se l'email è già registrata (anche da una registrazione concorrente)
+    """
     # Crea client senza il campo password
     client_data = client.model_dump(exclude={'password'})
-    db_client = Client(**client_data, password_hash=hashed_password)
-    
-    db.add(db_client)
+    stmt = (
+        insert_on_conflict(db, Client)
+        .values(**client_data, password_hash=password_hash)
+        .on_conflict_do_nothing(index_elements=[func.lower(Client.email)])
+        .returning(Client)
+    )
+    db_client = db.scalars(stmt).first()
     db.commit()
-    db.refresh(db_client)
     return db_client
 
 
+def insert_clients(db: Session, rows: list[tuple[int, dict]]) -> tuple[int, list[ClientImportError]]:
+    """
+    Inserisce un blocco di clienti in un'unica transazione (import in blocco)
+    
+    - Un INSERT ... ON CONFLICT (lower(email)) DO NOTHING multi-riga ... RETURNING
+    - Email già registrata o ripetuta nel blocco: la riga viene scartata
+    
+    rows: coppie (riga del file, valori della tabella clients con password_hash)
+    Restituisce (creati, errori).
+    """
+    errors: list[ClientImportError] = []
+    
+    # Prima riga per email (ON CONFLICT non ammette la stessa email due volte nello stesso INSERT)
+    unique_rows: dict[str, tuple[int, dict]] = {}
+    for line, values in rows:
+        if values["email"] in unique_rows:
+            errors.append(ClientImportError(line=line, email=values["email"], error="Email ripetuta nel file"))
+        else:
+            unique_rows[values["email"]] = (line, values)
+    
+    stmt = (
+        insert_on_conflict(db, Client)
+        .on_conflict_do_nothing(index_elements=[func.lower(Client.email)])
+        .returning(Client.email, sort_by_parameter_order=True)
+    )
+    try:
+        inserted = set(db.scalars(stmt, [values for _, values in unique_rows.values()]).all())
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        return 0, errors + [
+            ClientImportError(line=line, email=email, error="Errore del database durante l'import")
+            for email, (line, _) in unique_rows.items()
+        ]
+    
+    errors.extend(
+        ClientImportError(line=line, email=email, error="Email già registrata")
+        for email, (line, _) in unique_rows.items()
+        if email not in inserted
+    )
+    return len(inserted), errors
+
+
 # ==================== AGGIORNA ====================
 
 def update_client(db: Session, client_id: int, client_update: ClientUpdate) -> Optional[Client]:
@@ -81,18 +137,13 @@ def update_client(db: Session, client_id: int, client_update: ClientUpdate) -> O
     return db_client
 
 
-def change_password(db: Session, client_id: int, old_password: str, new_password: str) -> Optional[Client]:
-    """Cambia password del cliente"""
+def set_password_hash(db: Session, client_id: int, password_hash: str) -> Optional[Client]:
+    """Imposta un hash di password già calcolato (API: app.password_hasher)"""
     db_client = get_client(db, client_id)
     if not db_client:
         return None
     
-    # Verifica vecchia password
-    if not verify_password(old_password, db_client.password_hash):
-        return None
-    
-    # Aggiorna con nuova password
-    db_client.password_hash = hash_password(new_password)
+    db_client.password_hash = password_hash
     db.commit()
     db.refresh(db_client)
     return db_client
@@ -110,16 +161,3 @@ def delete_client(db: Session, client_id: int) -> bool:
     db.commit()
     return True
 
-
-# ==================== AUTENTICAZIONE ====================
-
-def authenticate_client(db: Session, email: str, password: str) -> Optional[Client]:
-    """Autentica cliente con email e password"""
-    client = get_client_by_email(db, email)
-    if not client:
-        return None
-    if not verify_password(password, client.password_hash):
-        return None
-    if not client.active:
-        return None
-    return client
\ No newline at end of file
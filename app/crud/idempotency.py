@@ -0,0 +1,93 @@
+"""
+CRUD operations per IdempotencyKey
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.database import insert_on_conflict
+from app.models.idempotency import IdempotencyKey
+
+# Per quanto tempo una chiave resta valida
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24")))
+
+# Risposte recenti in memoria: (client_id, key) -> (request_hash, status_code, body)
+response_cache = LRUCache(
+    maxsize=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")),
+    ttl=IDEMPOTENCY_KEY_TTL.total_seconds()
+)
+
+
+def hash_request(body: bytes) -> str:
+    """Hash del body della richiesta (per riconoscere chiavi riusate con payload diversi)"""
+    return hashlib.sha256(body).hexdigest()
+
+
+def get_cached_response(client_id: int, key: str) -> Optional[tuple[str, int, bytes]]:
+    """Risposta memorizzata in memoria, senza accedere al database"""
+    return response_cache.get((client_id, key))
+
+
+# ==================== CREA ====================
+
+def claim_key(db: Session, client_id: int, key: str, request_hash: str) -> bool:
+    """
+    Registra la chiave nella transazione corrente con
+    INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Se un'altra transazione ha già inserito la stessa chiave e non ha ancora
+    fatto commit, PostgreSQL attende la sua conclusione: le richieste duplicate
+    in volo aspettano la prima invece di eseguirla in parallelo.
+
+    Restituisce True se la chiave è stata presa da questa richiesta.
+    """
+    stmt = (
+        insert_on_conflict(db, IdempotencyKey)
+        .values(client_id=client_id, key=key, request_hash=request_hash)
+        .on_conflict_do_nothing(index_elements=["client_id", "key"])
+        .returning(IdempotencyKey.key)
+    )
+    return db.execute(stmt).scalar_one_or_none() is not None
+
+
+def get_stored_response(db: Session, client_id: int, key: str) -> Optional[tuple[str, Optional[int], Optional[bytes]]]:
+    """(request_hash, status_code, body) memorizzati per una chiave già usata"""
+    row = db.execute(
+        select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+        .where(IdempotencyKey.client_id == client_id, IdempotencyKey.key == key)
+    ).first()
+    return tuple(row) if row else None
+
+
+# ==================== AGGIORNA ====================
+
+def store_response(db: Session, client_id: int, key: str, status_code: int, body: bytes) -> None:
+    """Salva la risposta nella stessa transazione dell'ordine"""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.client_id == client_id, IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=body)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def cache_response(client_id: int, key: str, request_hash: str, status_code: int, body: bytes) -> None:
+    """Memorizza in memoria una risposta già salvata (dopo il commit)"""
+    response_cache.set((client_id, key), (request_hash, status_code, body))
+
+
+# ==================== ELIMINA ====================
+
+def purge_expired_keys(db: Session) -> int:
+    """Elimina le chiavi più vecchie di IDEMPOTENCY_KEY_TTL"""
+    expired_before = datetime.now(timezone.utc) - IDEMPOTENCY_KEY_TTL
+    result = db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.created_at < expired_before)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,608 @@
+"""
+CRUD operations per Order
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import case, delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.flash_sale import flash_sale_stock
+from app.models.order import Order, OrderDetail
+from app.models.product import Product
+from app.order_number import order_number_generator
+from app.schemas.order import BulkOrderResult, OrderCreate, OrderItemCreate
+
+
+# Durata della prenotazione stock di un ordine pending non pagato
+ORDER_HOLD_TTL = timedelta(minutes=int(os.getenv("ORDER_HOLD_MINUTES", "30")))
+
+
+class StockReservationError(Exception):
+    """Prenotazione stock fallita (prodotto inesistente, non attivo o esaurito)"""
+
+    def __init__(self, detail: str, not_found: bool = False):
+        super().__init__(detail)
+        self.detail = detail
+        self.not_found = not_found
+
+
+# ==================== PRENOTAZIONE STOCK ====================
+
+def aggregate_quantities(items: list[OrderItemCreate]) -> dict[int, int]:
+    """Somma le quantità richieste per prodotto (righe duplicate nel carrello)"""
+    requested: dict[int, int] = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    return requested
+
+
+def lock_products(db: Session, product_ids) -> dict[int, Product]:
+    """
+    Carica e blocca i prodotti con una sola query IN (...) FOR UPDATE.
+
+    Le righe vengono bloccate in ordine di id: checkout concorrenti acquisiscono
+    i lock sempre nello stesso ordine e non possono andare in deadlock.
+    """
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    products = (
+        db.query(Product)
+        .filter(Product.id.in_(ids))
+        .order_by(Product.id)
+        .with_for_update()
+        .all()
+    )
+    return {product.id: product for product in products}
+
+
+def decrement_stock(db: Session, products: dict[int, Product], requested: dict[int, int]) -> None:
+    """
+    Scala tutte le quantità con un unico UPDATE set-based.
+
+    La condizione available_quantity >= richiesta è valutata dal database:
+    se anche una sola riga non viene aggiornata l'intera prenotazione fallisce.
+    """
+    if not requested:
+        return
+    requested_quantity = case(requested, value=Product.id)
+
+    stmt = (
+        update(Product)
+        .where(
+            Product.id.in_(list(requested)),
+            Product.available_quantity >= requested_quantity,
+        )
+        .values(available_quantity=Product.available_quantity - requested_quantity)
+        .returning(Product.id, Product.available_quantity)
+        .execution_options(synchronize_session=False)
+    )
+    updated = dict(db.execute(stmt).tuples().all())
+
+    if len(updated) != len(requested):
+        product_id = min(set(requested) - set(updated))
+        product = products[product_id]
+        raise StockReservationError(
+            f"Not enough stock for product '{product.name}'. Requested: {requested[product_id]}"
+        )
+
+    # Allinea gli oggetti in sessione senza marcarli come modificati
+    for product_id, available_quantity in updated.items():
+        set_committed_value(products[product_id], "available_quantity", available_quantity)
+
+
+def reserve_stock(db: Session, items: list[OrderItemCreate]) -> dict[int, Product]:
+    """
+    Prenota lo stock per tutte le righe del carrello.
+
+    - Una query per caricare e bloccare i prodotti
+    - Verifica esistenza, stato attivo e disponibilità
+    - Un UPDATE set-based per scalare le quantità
+    - I prodotti in flash sale non vengono bloccati: lo stock è scalato in
+      memoria (app.flash_sale) e restituito se la transazione non va a buon fine
+
+    Restituisce i prodotti per id; solleva StockReservationError se qualcosa non va.
+    """
+    requested = aggregate_quantities(items)
+    flash_requested, regular_requested = flash_sale_stock.split(requested)
+
+    # Flash sale prima dei lock: un eventuale prelievo di stock dal database
+    # avviene in una transazione separata, senza lock già acquisiti
+    products = {}
+    if flash_requested:
+        products = {
+            product.id: product
+            for product in db.query(Product).filter(Product.id.in_(sorted(flash_requested))).all()
+        }
+        _check_products(products, flash_requested)
+        sold_out = flash_sale_stock.reserve(flash_requested)
+        if sold_out is not None:
+            raise StockReservationError(
+                f"Not enough stock for product '{products[sold_out].name}'. Requested: {flash_requested[sold_out]}"
+            )
+        flash_sale_stock.bind_to_transaction(db, flash_requested)
+
+    regular_products = lock_products(db, regular_requested.keys())
+    _check_products(regular_products, regular_requested)
+    for product_id, quantity in regular_requested.items():
+        product = regular_products[product_id]
+        if product.available_quantity < quantity:
+            raise StockReservationError(
+                f"Not enough stock for product '{product.name}'. Available: {product.available_quantity}, Requested: {quantity}"
+            )
+
+    decrement_stock(db, regular_products, regular_requested)
+    products.update(regular_products)
+    return products
+
+
+def _check_products(products: dict[int, Product], requested: dict[int, int]) -> None:
+    """Verifica che i prodotti richiesti esistano e siano attivi"""
+    for product_id in requested:
+        product = products.get(product_id)
+        if not product:
+            raise StockReservationError(
+                f"Product with id {product_id} not found",
+                not_found=True
+            )
+        if not product.active:
+            raise StockReservationError(f"Product '{product.name}' is not available")
+
+
+# ==================== PREZZI ====================
+
+# Stessa precisione delle colonne Numeric(10, 2)
+CENTS = Decimal("0.01")
+
+
+def price_items(items: list[OrderItemCreate], products: dict[int, Product]) -> tuple[Decimal, list[dict]]:
+    """Calcola subtotale e righe ordine con i prezzi correnti dei prodotti"""
+    subtotal = Decimal("0.00")
+    order_items = []
+    
+    for item in items:
+        product = products[item.product_id]
+        
+        # Calcola subtotale item
+        item_price = Decimal(str(product.price)).quantize(CENTS)
+        item_subtotal = item_price * item.quantity
+        subtotal += item_subtotal
+        
+        order_items.append({
+            "product": product,
+            "quantity": item.quantity,
+            "unit_price": item_price,
+            "subtotal": item_subtotal
+        })
+    
+    return subtotal, order_items
+
+
+def build_order_values(
+    order_data: OrderCreate,
+    client_id: int,
+    order_number: str,
+    subtotal: Decimal,
+    hold: bool = False
+) -> dict:
+    """
+    Valori delle colonne di un nuovo ordine, costi aggiuntivi inclusi.
+
+    hold: prenotazione stock a scadenza (ORDER_HOLD_MINUTES), solo per i
+    checkout interattivi; gli ordini importati in blocco non scadono.
+    """
+    shipping_cost = Decimal("5.00") if subtotal < Decimal("50.00") else Decimal("0.00")
+    tax = Decimal("0.00")
+    discount = Decimal("0.00")
+    
+    total = subtotal + shipping_cost + tax - discount
+    
+    return {
+        "client_id": client_id,
+        "order_number": order_number,
+        "status": "pending",
+        "subtotal": subtotal,
+        "shipping_cost": shipping_cost,
+        "tax": tax,
+        "discount": discount,
+        "discount_code": order_data.discount_code,
+        "total": total,
+        "shipping_address": order_data.shipping_address,
+        "shipping_city": order_data.shipping_city,
+        "shipping_postal_code": order_data.shipping_postal_code,
+        "shipping_state": order_data.shipping_state,
+        "shipping_country": order_data.shipping_country,
+        "notes": order_data.notes,
+        "paid": False,
+        "hold_expires_at": datetime.now(timezone.utc) + ORDER_HOLD_TTL if hold else None
+    }
+
+
+def restock_orders(db: Session, order_ids: list[int]) -> None:
+    """
+    Restituisce a magazzino le quantità di uno o più ordini con un unico
+    UPDATE products ... FROM (SELECT product_id, sum(quantity) ... GROUP BY product_id).
+
+    Prima blocca i prodotti in ordine di id, come fa il checkout: annullamenti
+    e checkout concorrenti sugli stessi prodotti non vanno in deadlock.
+    """
+    if not order_ids:
+        return
+    product_ids = select(OrderDetail.product_id).where(OrderDetail.order_id.in_(order_ids))
+    db.execute(
+        select(Product.id)
+        .where(Product.id.in_(product_ids))
+        .order_by(Product.id)
+        .with_for_update()
+    )
+
+    quantities = (
+        select(OrderDetail.product_id, func.sum(OrderDetail.quantity).label("quantity"))
+        .where(OrderDetail.order_id.in_(order_ids))
+        .group_by(OrderDetail.product_id)
+        .subquery()
+    )
+    db.execute(
+        update(Product)
+        .where(Product.id == quantities.c.product_id)
+        .values(available_quantity=Product.available_quantity + quantities.c.quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_expired_holds(db: Session, limit: int = 500) -> int:
+    """
+    Annulla un blocco di ordini pending con prenotazione scaduta.
+
+    - Un SELECT sull'indice parziale idx_orders_hold_expires, FOR UPDATE SKIP LOCKED
+      (più sweeper in parallelo non si contendono gli stessi ordini)
+    - Restock di tutti gli ordini del blocco con un unico UPDATE
+    - Un UPDATE per segnare gli ordini come cancelled
+
+    Restituisce il numero di ordini rilasciati; il commit spetta al chiamante.
+    """
+    expired = (
+        select(Order.id)
+        .where(Order.status == "pending", Order.hold_expires_at < datetime.now(timezone.utc))
+        .order_by(Order.hold_expires_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    order_ids = db.execute(expired).scalars().all()
+    if not order_ids:
+        return 0
+
+    restock_orders(db, order_ids)
+    db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids))
+        .values(status="cancelled", hold_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return len(order_ids)
+
+
+# ==================== LEGGI ====================
+
+def get_orders(
+    db: Session,
+    client_id: int,
+    limit: int = 20,
+    after: Optional[tuple[datetime, int]] = None
+) -> list[Row]:
+    """
+    Lista ordini del cliente, dal più recente, con items_count in un'unica query.
+
+    - items_count è una subquery correlata su order_details (usa idx_order_details_order)
+    - paginazione keyset su (created_at, id): nessun OFFSET, costo costante per pagina
+    """
+    items_count = (
+        select(func.count(OrderDetail.id))
+        .where(OrderDetail.order_id == Order.id)
+        .correlate(Order)
+        .scalar_subquery()
+    )
+    query = (
+        select(
+            Order.id,
+            Order.order_number,
+            Order.status,
+            Order.total,
+            Order.created_at,
+            items_count.label("items_count"),
+        )
+        .where(Order.client_id == client_id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit)
+    )
+    if after:
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(*after))
+    return db.execute(query).all()
+
+
+def lock_order(db: Session, order_id: int, client_id: Optional[int] = None) -> Optional[Order]:
+    """Carica un ordine (del cliente, se indicato) bloccandolo (SELECT ... FOR UPDATE)"""
+    query = db.query(Order).filter(Order.id == order_id)
+    if client_id is not None:
+        query = query.filter(Order.client_id == client_id)
+    return query.with_for_update().first()
+
+
+def get_order_details(db: Session, order_id: int) -> list[OrderDetail]:
+    """Dettagli di un ordine con i prodotti (una query)"""
+    return (
+        db.query(OrderDetail)
+        .options(joinedload(OrderDetail.product))
+        .filter(OrderDetail.order_id == order_id)
+        .order_by(OrderDetail.id)
+        .all()
+    )
+
+
+def iter_order_lines(
+    db: Session,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    batch_size: int = 1000
+):
+    """
+    Righe ordine (orders JOIN order_details) per l'export, in streaming.
+
+    Usa un cursore lato server (stream_results + yield_per): in memoria
+    resta al massimo un batch di righe, qualunque sia la dimensione dell'export.
+    """
+    query = (
+        select(
+            Order.id.label("order_id"),
+            Order.order_number,
+            Order.client_id,
+            Order.status,
+            Order.created_at,
+            Order.paid_at,
+            Order.subtotal.label("order_subtotal"),
+            Order.shipping_cost,
+            Order.tax,
+            Order.discount,
+            Order.total,
+            OrderDetail.id.label("order_detail_id"),
+            OrderDetail.product_id,
+            OrderDetail.quantity,
+            OrderDetail.unit_price,
+            OrderDetail.subtotal.label("line_subtotal"),
+        )
+        .join(OrderDetail, OrderDetail.order_id == Order.id)
+        .order_by(Order.id, OrderDetail.id)
+    )
+    if date_from:
+        query = query.where(Order.created_at >= date_from)
+    if date_to:
+        query = query.where(Order.created_at < date_to)
+    if status:
+        query = query.where(Order.status == status)
+    
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    yield from result.mappings()
+
+
+# ==================== AGGIORNA ====================
+
+# Macchina a stati: stati raggiungibili da ogni stato
+ORDER_TRANSITIONS = {
+    "pending": {"paid", "cancelled"},
+    "paid": {"processing", "cancelled", "refunded"},
+    "processing": {"shipped", "cancelled", "refunded"},
+    "shipped": {"delivered"},
+    "delivered": {"refunded"},
+    "cancelled": set(),
+    "refunded": set(),
+}
+
+# Per ogni stato di destinazione, gli stati di partenza ammessi
+ALLOWED_FROM = {
+    target: sorted(source for source, targets in ORDER_TRANSITIONS.items() if target in targets)
+    for target in ORDER_TRANSITIONS
+}
+
+
+def _status_values(new_status: str) -> dict:
+    """
+    Colonne da aggiornare insieme allo stato
+
+    - paid: imposta paid=True e paid_at (solo se non era già pagato)
+    - shipped / delivered: imposta shipped_at / delivered_at
+    - la prenotazione a scadenza vale solo per gli ordini pending
+    """
+    now = datetime.now(timezone.utc)
+    values = {"status": new_status, "hold_expires_at": None}
+    if new_status == "paid":
+        values["paid"] = True
+        values["paid_at"] = case((Order.paid == True, Order.paid_at), else_=now)
+    elif new_status == "shipped":
+        values["shipped_at"] = now
+    elif new_status == "delivered":
+        values["delivered_at"] = now
+    return values
+
+
+def update_status(db: Session, order_id: int, new_status: str) -> Optional[Order]:
+    """
+    Transizione di stato compare-and-set, con un unico
+    UPDATE ... WHERE id = ? AND status IN (stati ammessi) RETURNING ...
+
+    Restituisce None se l'ordine non esiste o la transizione non è ammessa
+    (o un'altra richiesta ha cambiato lo stato nel frattempo).
+    Gli ordini annullati restituiscono lo stock.
+    """
+    stmt = (
+        update(Order)
+        .where(Order.id == order_id, Order.status.in_(ALLOWED_FROM[new_status]))
+        .values(**_status_values(new_status))
+        .returning(Order)
+        .execution_options(synchronize_session=False)
+    )
+    order = db.execute(stmt).scalar_one_or_none()
+    if order and new_status == "cancelled":
+        restock_orders(db, [order.id])
+    return order
+
+
+def update_status_bulk(db: Session, order_ids: list[int], new_status: str) -> list[int]:
+    """
+    Transizione di stato per molti ordini con un solo UPDATE ... RETURNING id
+
+    Restituisce gli id aggiornati; gli altri (inesistenti o in uno stato
+    da cui la transizione non è ammessa) restano invariati.
+    """
+    stmt = (
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.status.in_(ALLOWED_FROM[new_status]))
+        .values(**_status_values(new_status))
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = sorted(db.execute(stmt).scalars().all())
+    if updated and new_status == "cancelled":
+        restock_orders(db, updated)
+    return updated
+
+
+def get_order_version(
+    db: Session,
+    order_id: int,
+    client_id: Optional[int] = None
+) -> Optional[tuple[datetime, Optional[datetime]]]:
+    """
+    (updated_at dell'ordine, updated_at più recente dei suoi prodotti) per
+    l'ETag, senza caricare l'ordine; None se l'ordine non esiste (o non è
+    del cliente indicato). I prodotti contano perché la risposta include il loro nome.
+    """
+    products_updated_at = (
+        select(func.max(Product.updated_at))
+        .join(OrderDetail, OrderDetail.product_id == Product.id)
+        .where(OrderDetail.order_id == Order.id)
+        .correlate(Order)
+        .scalar_subquery()
+    )
+    query = select(Order.updated_at, products_updated_at).where(Order.id == order_id)
+    if client_id is not None:
+        query = query.where(Order.client_id == client_id)
+    row = db.execute(query).first()
+    return tuple(row) if row else None
+
+
+def get_order_status(db: Session, order_id: int) -> Optional[str]:
+    """Stato corrente di un ordine (None se non esiste)"""
+    return db.execute(select(Order.status).where(Order.id == order_id)).scalar_one_or_none()
+
+
+# ==================== ELIMINA ====================
+
+def delete_order(db: Session, order_id: int) -> None:
+    """
+    Elimina un ordine con un solo DELETE: i dettagli vengono rimossi dal
+    database tramite ON DELETE CASCADE, senza caricarli nella sessione.
+    """
+    db.execute(
+        delete(Order)
+        .where(Order.id == order_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ==================== IMPORT IN BLOCCO ====================
+
+def create_orders_bulk(db: Session, client_id: int, orders: list[tuple[int, OrderCreate]]) -> list[BulkOrderResult]:
+    """
+    Crea un blocco di ordini in un'unica transazione.
+
+    - Un SELECT ... FOR UPDATE per tutti i prodotti del blocco
+    - Disponibilità verificata in memoria, ordine per ordine (gli ordini non
+      evadibili vengono scartati, gli altri proseguono)
+    - Un UPDATE set-based per lo stock e INSERT multi-riga per ordini e dettagli
+
+    orders: coppie (indice nel payload, ordine validato)
+    """
+    requested_all: dict[int, int] = {}
+    for _, order_data in orders:
+        for product_id, quantity in aggregate_quantities(order_data.items).items():
+            requested_all[product_id] = requested_all.get(product_id, 0) + quantity
+
+    results: dict[int, BulkOrderResult] = {}
+    try:
+        products = lock_products(db, requested_all.keys())
+        remaining = {product_id: product.available_quantity for product_id, product in products.items()}
+
+        accepted = []
+        reserved: dict[int, int] = {}
+        for index, order_data in orders:
+            requested = aggregate_quantities(order_data.items)
+            error = _check_availability(products, remaining, requested)
+            if error:
+                results[index] = BulkOrderResult(index=index, success=False, error=error)
+                continue
+            for product_id, quantity in requested.items():
+                remaining[product_id] -= quantity
+                reserved[product_id] = reserved.get(product_id, 0) + quantity
+            accepted.append((index, order_data))
+
+        if accepted:
+            decrement_stock(db, products, reserved)
+
+            order_rows = []
+            order_lines = []
+            for index, order_data in accepted:
+                subtotal, order_items = price_items(order_data.items, products)
+                order_rows.append(
+                    build_order_values(order_data, client_id, order_number_generator.next(db), subtotal)
+                )
+                order_lines.append(order_items)
+
+            created = db.execute(
+                insert(Order).returning(Order.id, Order.order_number, sort_by_parameter_order=True),
+                order_rows
+            ).all()
+
+            detail_rows = [
+                {
+                    "order_id": order_id,
+                    "product_id": item["product"].id,
+                    "quantity": item["quantity"],
+                    "unit_price": item["unit_price"],
+                    "subtotal": item["subtotal"]
+                }
+                for (order_id, _), order_items in zip(created, order_lines)
+                for item in order_items
+            ]
+            db.execute(insert(OrderDetail), detail_rows)
+
+            for (index, _), (order_id, order_number) in zip(accepted, created):
+                results[index] = BulkOrderResult(
+                    index=index, success=True, order_id=order_id, order_number=order_number
+                )
+
+        db.commit()
+    except (SQLAlchemyError, StockReservationError) as e:
+        db.rollback()
+        detail = e.detail if isinstance(e, StockReservationError) else "Database error while importing orders"
+        return [BulkOrderResult(index=index, success=False, error=detail) for index, _ in orders]
+
+    return [results[index] for index, _ in orders]
+
+
+def _check_availability(products: dict[int, Product], remaining: dict[int, int], requested: dict[int, int]) -> Optional[str]:
+    """Verifica un ordine rispetto allo stock residuo del blocco; restituisce l'errore o None"""
+    for product_id, quantity in requested.items():
+        product = products.get(product_id)
+        if not product:
+            return f"Product with id {product_id} not found"
+        if not product.active:
+            return f"Product '{product.name}' is not available"
+        if remaining[product_id] < quantity:
+            return f"Not enough stock for product '{product.name}'. Available: {remaining[product_id]}, Requested: {quantity}"
+    return None
@@ -1,11 +1,26 @@
 """
 CRUD operations per Product
 """
+import re
 from typing import Optional
+from sqlalchemy import func, insert, select, text, tuple_
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from app.models.product import Product
-from app.schemas.product import ProductCreate, ProductUpdate
+from app.category_cache import category_snapshot
+from app.crud import category as crud_category
+from app.database import insert_on_conflict
+from app.models.category import Category
+from app.models.product import Product, product_search_vector
+from app.product_cache import notify_cleared, notify_invalidation, product_cache
+from app.search import product_search_index
+from app.schemas.product import (
+    ProductCreate,
+    ProductUpdate,
+    ProductResponse,
+    ProductFilter,
+    ProductImportError
+)
 
 
 # ==================== LEGGI ====================
@@ -15,9 +30,184 @@ def get_product(db: Session, product_id: int) -> Optional[Product]:
     return db.query(Product).filter(Product.id == product_id).first()
 
 
-def get_products(db: Session, skip: int = 0, limit: int = 100) -> list[Product]:
-    """Ottieni lista prodotti"""
-    return db.query(Product).filter(Product.active == True).offset(skip).limit(limit).all()
+def lock_product(db: Session, product_id: int) -> Optional[Product]:
+    """
+    Prodotto per ID con SELECT ... FOR UPDATE: categoria e stato letti per i
+    conteggi delle categorie non cambiano fino al commit
+    """
+    return db.query(Product).filter(Product.id == product_id).with_for_update().first()
+
+
+# Colonne ordinabili della lista prodotti (ProductFilter.sort)
+PRODUCT_SORT_COLUMNS = {
+    "id": Product.id,
+    "price": Product.price,
+    "name": Product.name,
+    "created_at": Product.created_at,
+}
+
+
+def products_query(
+    db: Session,
+    filters: Optional[ProductFilter] = None,
+    after_id: Optional[int] = None,
+    after_value=None
+):
+    """
+    Query dei prodotti attivi filtrata e ordinata (senza offset/limit)
+    
+    - Ogni combinazione di filtri usa uno degli indici parziali WHERE active di Product
+    - after_id / after_value: keyset dall'ultima riga della pagina precedente
+      (after_value è il valore del campo di ordinamento)
+    """
+    filters = filters or ProductFilter()
+    query = db.query(Product).filter(Product.active == True)
+    
+    if filters.min_price is not None:
+        query = query.filter(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(Product.price <= filters.max_price)
+    if filters.featured is not None:
+        query = query.filter(Product.featured == filters.featured)
+    if filters.category_id is not None:
+        query = query.filter(Product.category_id == filters.category_id)
+    if filters.in_stock is not None:
+        query = query.filter(Product.available_quantity > 0 if filters.in_stock else Product.available_quantity <= 0)
+    
+    # Ordinamento: a parità di valore decide l'ID, nella stessa direzione
+    descending = filters.sort.startswith("-")
+    column = PRODUCT_SORT_COLUMNS[filters.sort.lstrip("-")]
+    keys = (Product.id,) if column is Product.id else (column, Product.id)
+    query = query.order_by(*(key.desc() if descending else key for key in keys))
+    
+    if after_id is not None:
+        if column is Product.id:
+            after = Product.id < after_id if descending else Product.id > after_id
+        else:
+            row = tuple_(column, Product.id)
+            after = row < (after_value, after_id) if descending else row > (after_value, after_id)
+        query = query.filter(after)
+    return query
+
+
+def get_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    filters: Optional[ProductFilter] = None,
+    after_value=None
+) -> list[Product]:
+    """
+    Ottieni lista prodotti attivi, filtrata e ordinata (default: per ID)
+    
+    - filters: prezzo, evidenza, categoria, disponibilità e ordinamento
+    - after_id / after_value: paginazione keyset, ignora skip
+    """
+    query = products_query(db, filters, after_id, after_value)
+    if after_id is not None:
+        return query.limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def get_products_by_ids(db: Session, product_ids: list[int]) -> list[Product]:
+    """Prodotti con gli ID indicati, con una sola query IN (ordine non garantito)"""
+    if not product_ids:
+        return []
+    return db.query(Product).filter(Product.id.in_(product_ids)).all()
+
+
+def get_product_cached(db: Session, product_id: int) -> Optional[ProductResponse]:
+    """Dettaglio prodotto dalla cache in memoria (read-through)"""
+    return product_cache.get_product(product_id, lambda: get_product(db, product_id))
+
+
+def get_products_by_ids_cached(db: Session, product_ids: list[int]) -> tuple[list[ProductResponse], list[int]]:
+    """
+    Prodotti nell'ordine richiesto (ID ripetuti una volta sola) e ID inesistenti.
+    Quelli in cache non vengono letti dal database, gli altri con una sola query.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    found = product_cache.get_many(product_ids, lambda missing: get_products_by_ids(db, missing))
+    products = [found[product_id] for product_id in product_ids if product_id in found]
+    missing = [product_id for product_id in product_ids if product_id not in found]
+    return products, missing
+
+
+def get_products_cached(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    filters: Optional[ProductFilter] = None,
+    after_value=None
+) -> list[ProductResponse]:
+    """Lista prodotti dalla cache in memoria (read-through)"""
+    filters = filters or ProductFilter()
+    if after_id is not None:
+        skip = 0
+    return product_cache.get_products(
+        (skip, limit, after_id, after_value, filters),
+        lambda: get_products(db, skip, limit, after_id, filters, after_value),
+        limit=limit,
+        after_id=after_id,
+        id_ordered=filters.is_default
+    )
+
+
+# ==================== RICERCA ====================
+
+def search_products(db: Session, q: str, skip: int = 0, limit: int = 20) -> list[Product]:
+    """
+    Prodotti attivi che contengono tutti i termini di q, dal più rilevante
+    
+    - PostgreSQL: tsvector + indice GIN, ranking con ts_rank, ogni termine vale anche come prefisso
+    - Altri database: indice invertito in memoria (app.search), anche con errori di battitura
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, q, skip, limit)
+    return _search_memory(db, q, skip, limit)
+
+
+def _search_postgres(db: Session, q: str, skip: int, limit: int) -> list[Product]:
+    # Solo caratteri di parola: nessun operatore tsquery arriva dall'utente
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return []
+    ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+    rank = func.ts_rank(product_search_vector, ts_query)
+    return list(db.scalars(
+        select(Product)
+        .where(Product.active == True, product_search_vector.op("@@")(ts_query))
+        .order_by(rank.desc(), Product.id)
+        .offset(skip)
+        .limit(limit)
+    ))
+
+
+def _search_memory(db: Session, q: str, skip: int, limit: int) -> list[Product]:
+    if not product_search_index.loaded:
+        rows = db.execute(
+            select(Product.id, Product.name, Product.description)
+            .where(Product.active == True)
+            .execution_options(yield_per=10000)
+        )
+        product_search_index.rebuild(rows)
+    product_ids = product_search_index.search(q, skip, limit)
+    if not product_ids:
+        return []
+    products = {product.id: product for product in db.scalars(select(Product).where(Product.id.in_(product_ids)))}
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def _sync_search_index(db_product: Product) -> None:
+    """Aggiorna l'indice in memoria dopo una scrittura (se è già stato caricato)"""
+    if not product_search_index.loaded:
+        return
+    if db_product.active:
+        product_search_index.add(db_product.id, db_product.name, db_product.description)
+    else:
+        product_search_index.remove(db_product.id)
 
 
 # ==================== CREA ====================
@@ -26,37 +216,195 @@ def create_product(db: Session, product: ProductCreate) -> Product:
     """Crea nuovo prodotto"""
     db_product = Product(**product.model_dump())
     db.add(db_product)
+    db.flush()
+    deltas = crud_category.product_count_deltas(None, False, db_product.category_id, db_product.active)
+    crud_category.adjust_product_counts(db, deltas)
+    notify_invalidation(db, db_product.id, visibility_changed=True)
     db.commit()
     db.refresh(db_product)
+    product_cache.invalidate(db_product.id, visibility_changed=True)
+    category_snapshot.apply_counts(deltas)
+    _sync_search_index(db_product)
     return db_product
 
 
+# Primo argomento di pg_advisory_xact_lock per gli sku (il secondo è hashtext(sku))
+SKU_LOCK_NAMESPACE = 1001
+
+
+def _lock_skus(db: Session, skus: list[str]) -> None:
+    """
+    Lock advisory di transazione per sku, in ordine (PostgreSQL): gli sku
+    nuovi non hanno ancora una riga da bloccare, e due import concorrenti
+    dello stesso sku nuovo lo conterebbero entrambi come creato.
+    Su SQLite le scritture sono già serializzate.
+    """
+    if not skus or db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(:namespace, k) FROM ("
+            "SELECT DISTINCT hashtext(sku) AS k FROM unnest(CAST(:skus AS text[])) AS sku ORDER BY k"
+            ") AS keys"
+        ),
+        {"namespace": SKU_LOCK_NAMESPACE, "skus": skus}
+    )
+
+
+def upsert_products(db: Session, rows: list[tuple[int, ProductCreate]]) -> tuple[int, int, list[ProductImportError]]:
+    """
+    Inserisce o aggiorna (per sku) un blocco di prodotti in un'unica transazione.
+    
+    - Lock advisory per sku (PostgreSQL) e un SELECT ... FOR UPDATE dei
+      prodotti già presenti (per i conteggi categoria)
+    - Un INSERT ... ON CONFLICT (sku) DO UPDATE multi-riga ... RETURNING
+      (più un INSERT per i prodotti senza sku)
+    - Un UPDATE per product_count delle categorie interessate
+    - Sku ripetuto nel blocco: vale l'ultima riga (le precedenti contano come
+      aggiornate); prodotti senza sku sempre inseriti
+    
+    rows: coppie (riga del file, prodotto validato)
+    Restituisce (creati, aggiornati, errori).
+    """
+    errors: list[ProductImportError] = []
+    
+    # Ultima riga per sku (ON CONFLICT non può aggiornare due volte la stessa riga)
+    latest: dict[str, tuple[int, ProductCreate]] = {}
+    unique_rows = []
+    for line, product in rows:
+        if product.sku is None:
+            unique_rows.append((line, product))
+        else:
+            latest[product.sku] = (line, product)
+    unique_rows.extend(latest.values())
+    superseded = len(rows) - len(unique_rows)
+    
+    accepted = []
+    try:
+        # Categorie inesistenti: la riga viene scartata invece di far fallire il blocco
+        category_ids = {product.category_id for _, product in unique_rows if product.category_id is not None}
+        known_categories = set(db.scalars(select(Category.id).where(Category.id.in_(category_ids)))) if category_ids else set()
+        for line, product in unique_rows:
+            if product.category_id is not None and product.category_id not in known_categories:
+                errors.append(ProductImportError(line=line, sku=product.sku, error="Categoria non trovata"))
+            else:
+                accepted.append((line, product))
+        if not accepted:
+            db.rollback()
+            return 0, 0, errors
+        
+        skus = [product.sku for _, product in accepted if product.sku is not None]
+        _lock_skus(db, skus)
+        existing = {
+            row.sku: row
+            for row in db.execute(
+                select(Product.sku, Product.category_id, Product.active)
+                .where(Product.sku.in_(skus))
+                .order_by(Product.id)
+                .with_for_update()
+            )
+        } if skus else {}
+        
+        # RETURNING nell'ordine delle righe (sort_by_parameter_order) non è
+        # disponibile con ON CONFLICT su PostgreSQL: gli id dei prodotti con
+        # sku si associano per sku, quelli senza sku escono da un INSERT ordinato
+        ids_by_sku = {}
+        with_sku = [product.model_dump() for _, product in accepted if product.sku is not None]
+        if with_sku:
+            stmt = insert_on_conflict(db, Product)
+            fields = [name for name in ProductCreate.model_fields if name != "sku"]
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Product.sku],
+                set_={**{name: stmt.excluded[name] for name in fields}, "updated_at": stmt.excluded.updated_at}
+            ).returning(Product.sku, Product.id)
+            ids_by_sku = dict(db.execute(stmt, with_sku).all())
+        without_sku = [product.model_dump() for _, product in accepted if product.sku is None]
+        new_ids = iter(
+            db.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), without_sku).all()
+            if without_sku else ()
+        )
+        product_ids = [
+            ids_by_sku[product.sku] if product.sku is not None else next(new_ids)
+            for _, product in accepted
+        ]
+        
+        deltas: dict[int, int] = {}
+        for _, product in accepted:
+            old = existing.get(product.sku)
+            changes = crud_category.product_count_deltas(
+                old.category_id if old else None,
+                old.active if old else False,
+                product.category_id,
+                product.active
+            )
+            for category_id, delta in changes.items():
+                deltas[category_id] = deltas.get(category_id, 0) + delta
+        deltas = {category_id: delta for category_id, delta in deltas.items() if delta}
+        crud_category.adjust_product_counts(db, deltas)
+        notify_cleared(db)
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        return 0, 0, errors + [
+            ProductImportError(line=line, sku=product.sku, error="Errore del database durante l'import")
+            for line, product in accepted
+        ]
+    
+    # Blocco salvato: cache, snapshot categorie e indice di ricerca
+    product_cache.clear()
+    category_snapshot.apply_counts(deltas)
+    if product_search_index.loaded:
+        for product_id, (_, product) in zip(product_ids, accepted):
+            if product.active:
+                product_search_index.add(product_id, product.name, product.description)
+            else:
+                product_search_index.remove(product_id)
+    
+    updated = sum(1 for _, product in accepted if product.sku in existing)
+    return len(accepted) - updated, updated + superseded, errors
+
+
 # ==================== AGGIORNA ====================
 
 def update_product(db: Session, product_id: int, product_update: ProductUpdate) -> Optional[Product]:
-    """Aggiorna prodotto"""
-    db_product = get_product(db, product_id)
+    """Aggiorna prodotto (riga bloccata: due modifiche concorrenti non calcolano i conteggi dallo stesso stato)"""
+    db_product = lock_product(db, product_id)
     if not db_product:
         return None
     
     # Aggiorna solo i campi forniti
     update_data = product_update.model_dump(exclude_unset=True)
+    visibility_changed = "active" in update_data and update_data["active"] != db_product.active
+    old_category_id, old_active = db_product.category_id, db_product.active
     for field, value in update_data.items():
         setattr(db_product, field, value)
     
+    deltas = crud_category.product_count_deltas(old_category_id, old_active, db_product.category_id, db_product.active)
+    crud_category.adjust_product_counts(db, deltas)
+    notify_invalidation(db, product_id, visibility_changed)
     db.commit()
     db.refresh(db_product)
+    product_cache.invalidate(product_id, visibility_changed)
+    category_snapshot.apply_counts(deltas)
+    _sync_search_index(db_product)
     return db_product
 
 
 # ==================== ELIMINA ====================
 
 def delete_product(db: Session, product_id: int) -> bool:
-    """Elimina prodotto (soft delete - imposta active=False)"""
-    db_product = get_product(db, product_id)
+    """Elimina prodotto (soft delete - imposta active=False, riga bloccata come in update_product)"""
+    db_product = lock_product(db, product_id)
     if not db_product:
         return False
     
+    visibility_changed = db_product.active
     db_product.active = False
+    deltas = crud_category.product_count_deltas(db_product.category_id, visibility_changed, db_product.category_id, False)
+    crud_category.adjust_product_counts(db, deltas)
+    notify_invalidation(db, product_id, visibility_changed)
     db.commit()
+    product_cache.invalidate(product_id, visibility_changed)
+    category_snapshot.apply_counts(deltas)
+    _sync_search_index(db_product)
     return True
\ No newline at end of file
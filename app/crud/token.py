@@ -0,0 +1,103 @@
+"""
+CRUD operations per RevokedToken
+"""
+from datetime import datetime, timezone
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import insert_on_conflict
+from app.models.revoked_token import RevokedToken
+from app.product_cache import notify_tokens_revoked
+from app.token_cache import revocation_cache
+
+
+def _as_datetime(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+# ==================== LEGGI ====================
+
+def load_revocations(db: Session, token_type: str) -> tuple[set[str], dict[int, int]]:
+    """
+    Revoche non ancora scadute per app.token_cache:
+    (jti revocati dei token di tipo token_type, {client_id: istante prima del
+    quale i token sono revocati}). Le revoche degli altri tipi (refresh token,
+    verificati sul database) non vengono caricate.
+    """
+    rows = db.execute(
+        select(RevokedToken.client_id, RevokedToken.jti, RevokedToken.issued_before)
+        .where(
+            RevokedToken.expires_at > datetime.now(timezone.utc),
+            or_(RevokedToken.jti.is_(None), RevokedToken.token_type.is_(None), RevokedToken.token_type == token_type)
+        )
+    ).all()
+    jtis: set[str] = set()
+    cutoffs: dict[int, int] = {}
+    for client_id, jti, issued_before in rows:
+        if jti is not None:
+            jtis.add(jti)
+        if issued_before is not None:
+            cutoffs[client_id] = max(issued_before, cutoffs.get(client_id, 0))
+    return jtis, cutoffs
+
+
+def is_revoked(db: Session, client_id: int, jti: str, issued_at: int) -> bool:
+    """Verifica una revoca direttamente sul database (refresh token)"""
+    return db.execute(
+        select(RevokedToken.id)
+        .where(
+            RevokedToken.client_id == client_id,
+            (RevokedToken.jti == jti) | (RevokedToken.issued_before > issued_at)
+        )
+        .limit(1)
+    ).first() is not None
+
+
+# ==================== CREA ====================
+
+def revoke_token(db: Session, client_id: int, jti: str, token_type: str, expires_at: int, cached: bool) -> bool:
+    """
+    Revoca un token con INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    - cached: il tipo di token è verificato con la copia in memoria delle
+      revoche (app.token_cache): la revoca viene aggiunta e notificata agli
+      altri worker. Gli altri (refresh token) restano solo nel database.
+
+    Restituisce False se il token era già revocato: con i refresh token
+    due richieste concorrenti con lo stesso token non possono riuscire entrambe.
+    """
+    stmt = (
+        insert_on_conflict(db, RevokedToken)
+        .values(client_id=client_id, jti=jti, token_type=token_type, expires_at=_as_datetime(expires_at))
+        .on_conflict_do_nothing(index_elements=["jti"])
+        .returning(RevokedToken.id)
+    )
+    if db.execute(stmt).scalar_one_or_none() is None:
+        db.rollback()
+        return False
+    if cached:
+        notify_tokens_revoked(db)
+    db.commit()
+    if cached:
+        revocation_cache.add(jti=jti)
+    return True
+
+
+def revoke_client_tokens(db: Session, client_id: int, issued_before: int, expires_at: int) -> None:
+    """Revoca tutti i token del cliente emessi prima di issued_before (millisecondi epoch)"""
+    db.add(RevokedToken(client_id=client_id, issued_before=issued_before, expires_at=_as_datetime(expires_at)))
+    notify_tokens_revoked(db)
+    db.commit()
+    revocation_cache.add(client_id=client_id, issued_before=issued_before)
+
+
+# ==================== ELIMINA ====================
+
+def purge_expired_revocations(db: Session) -> int:
+    """Elimina le revoche dei token ormai scaduti comunque"""
+    result = db.execute(
+        delete(RevokedToken)
+        .where(RevokedToken.expires_at <= datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
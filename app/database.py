@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -14,7 +15,9 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 engine = create_engine(DATABASE_URL)
 
 # Crea SessionLocal per fare query
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: dopo il commit gli oggetti restano leggibili senza
+# ricaricarli dal database (niente refresh / re-query per costruire le risposte)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Base per creare i models
 Base = declarative_base()
@@ -25,4 +28,12 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# INSERT con ON CONFLICT (DO NOTHING / DO UPDATE) per il dialetto in uso
+def insert_on_conflict(db, model):
+    """Restituisce insert(model) di PostgreSQL o SQLite, che supportano ON CONFLICT"""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
@@ -0,0 +1,119 @@
+"""
+Export ordini in streaming (NDJSON / CSV) - usato dall'API e da riga di comando
+
+    python -m app.export --format csv --from 2025-01-01 --to 2025-02-01 --output ordini.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from app.crud import order as crud_order
+from app.database import SessionLocal
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = [
+    "order_id",
+    "order_number",
+    "client_id",
+    "status",
+    "created_at",
+    "paid_at",
+    "order_subtotal",
+    "shipping_cost",
+    "tax",
+    "discount",
+    "total",
+    "order_detail_id",
+    "product_id",
+    "quantity",
+    "unit_price",
+    "line_subtotal",
+]
+
+# Righe accumulate prima di emettere un blocco di output
+ROWS_PER_CHUNK = 1000
+
+
+def _json_default(value):
+    """Serializza Decimal e datetime per NDJSON"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipo non serializzabile: {type(value).__name__}")
+
+
+def stream_orders(
+    format: str = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None
+) -> Iterator[bytes]:
+    """
+    Genera l'export a blocchi di byte.
+
+    Apre una sessione dedicata che resta aperta per tutta la durata dello
+    streaming (la risposta HTTP viene inviata dopo la fine dell'endpoint).
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Formato export non supportato: {format}")
+
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if format == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+
+        rows = 0
+        for line in crud_order.iter_order_lines(db, date_from, date_to, status, batch_size=ROWS_PER_CHUNK):
+            if writer:
+                writer.writerow(
+                    line[column].isoformat() if isinstance(line[column], datetime) else line[column]
+                    for column in EXPORT_COLUMNS
+                )
+            else:
+                buffer.write(json.dumps({column: line[column] for column in EXPORT_COLUMNS}, default=_json_default))
+                buffer.write("\n")
+            rows += 1
+            if rows % ROWS_PER_CHUNK == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    """Entry point da riga di comando"""
+    parser = argparse.ArgumentParser(description="Export ordini (righe ordine) in NDJSON o CSV")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat, help="Data iniziale (inclusa)")
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat, help="Data finale (esclusa)")
+    parser.add_argument("--status", help="Filtra per stato ordine")
+    parser.add_argument("--output", help="File di destinazione (default: stdout)")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_orders(args.format, args.date_from, args.date_to, args.status):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
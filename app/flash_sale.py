@@ -0,0 +1,448 @@
+"""
+Flash sale - contatori di stock in memoria per i prodotti "caldi"
+
+Per i prodotti in FLASH_SALE_PRODUCT_IDS ogni worker preleva dal database
+porzioni di stock (FLASH_SALE_SLICE_SIZE unità alla volta) e le tiene in memoria,
+suddivise in shard con lock propri. I checkout scalano lo stock in memoria
+senza bloccare la riga products: il database viene toccato solo per
+prelevare una nuova porzione o per restituire quella inutilizzata.
+
+Invarianti:
+- products.available_quantity contiene solo lo stock non assegnato ad alcun worker
+- lo stock in memoria è già stato tolto dal database: nessun worker può
+  vendere più di quanto ha prelevato, quindi non si va mai in overselling
+- il flush periodico (write-behind) restituisce al database le eccedenze,
+  che diventano disponibili per gli altri worker (ribilanciamento): ogni shard
+  tiene al massimo quanto ha venduto nell'ultimo intervallo (una porzione al
+  massimo), uno shard inattivo restituisce tutto
+- prelievi e flush usano connessioni dedicate (FLASH_SALE_POOL_SIZE): non
+  attendono quelle del pool delle richieste, che durante un prelievo sono già occupate
+
+Registro (tabelle flash_sale_workers e flash_sale_leases, app.models.flash_sale):
+lo stock in memoria si perde se il processo muore senza drain (SIGKILL, OOM,
+--reload). Ogni prelievo, restituzione e vendita è scritto nel registro nella
+stessa transazione che modifica products o crea l'ordine, e il flush aggiorna
+l'heartbeat del worker. Lo stock dei worker senza heartbeat da più di
+FLASH_SALE_WORKER_TIMEOUT secondi torna in products (reclaim_dead_workers, a
+ogni flush e nello sweeper app.hold_sweeper). Un worker vivo ma fermo oltre il
+timeout scarta il suo stock al flush successivo: il timeout deve restare
+molto più lungo di FLASH_SALE_FLUSH_INTERVAL.
+"""
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, create_engine, delete, event, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import DATABASE_URL
+from app.models.flash_sale import FlashSaleLease, FlashSaleWorker
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+FLASH_SALE_FLUSH_INTERVAL = int(os.getenv("FLASH_SALE_FLUSH_INTERVAL", "5"))
+FLASH_SALE_WORKER_TIMEOUT = int(os.getenv("FLASH_SALE_WORKER_TIMEOUT", "60"))
+FLASH_SALE_POOL_SIZE = int(os.getenv("FLASH_SALE_POOL_SIZE", "2"))
+
+# Chiavi in Session.info per le prenotazioni legate alla transazione
+_SESSION_KEY = "flash_sale_reservations"
+_COMMITTED_KEY = "flash_sale_committed"
+
+
+class _Shard:
+    """Porzione di stock in memoria con il suo lock (taken: unità prese dall'ultimo flush)"""
+    __slots__ = ("lock", "remaining", "taken")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = 0
+        self.taken = 0
+
+
+def _lease_sessionmaker() -> sessionmaker:
+    """Sessioni su un pool piccolo e separato da quello delle richieste"""
+    engine = create_engine(DATABASE_URL, pool_size=FLASH_SALE_POOL_SIZE, max_overflow=FLASH_SALE_POOL_SIZE)
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+class FlashSaleStock:
+    """Stock in memoria, a shard, per i prodotti in flash sale"""
+
+    def __init__(self, product_ids, slice_size: int = 50, shards: int = 4, session_factory=None):
+        self.product_ids = frozenset(product_ids)
+        self.slice_size = slice_size
+        self.worker_id = uuid.uuid4().hex
+        self._shards = {product_id: [_Shard() for _ in range(shards)] for product_id in self.product_ids}
+        self._lease_locks = {product_id: threading.Lock() for product_id in self.product_ids}
+        self._stats_lock = threading.Lock()
+        # Transazioni sul registro del worker una alla volta (prelievi e flush)
+        self._ledger_lock = threading.Lock()
+        self._registered = False
+        # Cambia quando lo stock in memoria viene scartato: le prenotazioni
+        # precedenti non tornano in memoria
+        self._generation = 0
+        if session_factory is None and self.product_ids:
+            session_factory = _lease_sessionmaker()
+        self._session = session_factory
+        self._leased = dict.fromkeys(self.product_ids, 0)
+        self._returned = dict.fromkeys(self.product_ids, 0)
+        self._sold = dict.fromkeys(self.product_ids, 0)
+
+    @classmethod
+    def from_env(cls) -> "FlashSaleStock":
+        """Configurazione da FLASH_SALE_PRODUCT_IDS, FLASH_SALE_SLICE_SIZE, FLASH_SALE_SHARDS"""
+        raw_ids = os.getenv("FLASH_SALE_PRODUCT_IDS", "")
+        product_ids = [int(value) for value in raw_ids.split(",") if value.strip()]
+        return cls(
+            product_ids,
+            slice_size=int(os.getenv("FLASH_SALE_SLICE_SIZE", "50")),
+            shards=int(os.getenv("FLASH_SALE_SHARDS", "4"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.product_ids)
+
+    def split(self, requested: dict[int, int]) -> tuple[dict[int, int], dict[int, int]]:
+        """Separa le quantità richieste in (flash sale, normali)"""
+        flash = {pid: qty for pid, qty in requested.items() if pid in self.product_ids}
+        regular = {pid: qty for pid, qty in requested.items() if pid not in self.product_ids}
+        return flash, regular
+
+    # ==================== PRENOTAZIONE ====================
+
+    def reserve(self, requested: dict[int, int]) -> Optional[int]:
+        """
+        Scala le quantità dallo stock in memoria (tutto o niente).
+
+        Restituisce None se la prenotazione riesce, altrimenti l'id del
+        prodotto esaurito (nessuna quantità resta scalata).
+        """
+        taken = {}
+        for product_id in sorted(requested):
+            if not self._take(product_id, requested[product_id]):
+                self.release(taken)
+                return product_id
+            taken[product_id] = requested[product_id]
+        return None
+
+    def release(self, requested: dict[int, int]) -> None:
+        """Rimette in memoria quantità prenotate ma non vendute"""
+        for product_id, quantity in requested.items():
+            shard = self._home_shard(product_id)
+            with shard.lock:
+                shard.remaining += quantity
+
+    def bind_to_transaction(self, db: Session, requested: dict[int, int]) -> None:
+        """
+        Lega una prenotazione alla transazione della sessione: al commit
+        le quantità risultano vendute, altrimenti tornano in memoria.
+        Nel registro la vendita è scritta con l'ordine, nella stessa transazione.
+        """
+        db.info.setdefault(_SESSION_KEY, []).append((self, requested, self._generation))
+        db.add_all(
+            FlashSaleLease(worker_id=self.worker_id, product_id=product_id, quantity=-quantity)
+            for product_id, quantity in requested.items()
+        )
+
+    def _settle(self, requested: dict[int, int], committed: bool, generation: int) -> None:
+        if committed:
+            with self._stats_lock:
+                for product_id, quantity in requested.items():
+                    self._sold[product_id] += quantity
+        elif generation == self._generation:
+            self.release(requested)
+
+    def _home_shard(self, product_id: int) -> _Shard:
+        shards = self._shards[product_id]
+        return shards[threading.get_ident() % len(shards)]
+
+    def _take(self, product_id: int, quantity: int) -> bool:
+        shards = self._shards[product_id]
+        start = threading.get_ident() % len(shards)
+
+        # 1. Shard del thread, poi gli altri: nessun accesso al database
+        for offset in range(len(shards)):
+            shard = shards[(start + offset) % len(shards)]
+            with shard.lock:
+                if shard.remaining >= quantity:
+                    shard.remaining -= quantity
+                    shard.taken += quantity
+                    return True
+
+        # 2. Nessuno shard basta: si preleva una nuova porzione dal database
+        with self._lease_locks[product_id]:
+            leased = self._lease(product_id, max(self.slice_size, quantity))
+            home = shards[start]
+            with home.lock:
+                home.remaining += leased
+                if home.remaining >= quantity:
+                    home.remaining -= quantity
+                    home.taken += quantity
+                    return True
+
+        # 3. Database esaurito: si raccoglie quanto resta negli shard
+        return self._gather(product_id, quantity)
+
+    def _gather(self, product_id: int, quantity: int) -> bool:
+        shards = self._shards[product_id]
+        for shard in shards:
+            shard.lock.acquire()
+        try:
+            if sum(shard.remaining for shard in shards) < quantity:
+                return False
+            for shard in shards:
+                used = min(shard.remaining, quantity)
+                shard.remaining -= used
+                shard.taken += used
+                quantity -= used
+            return True
+        finally:
+            for shard in shards:
+                shard.lock.release()
+
+    # ==================== DATABASE ====================
+
+    def _lease(self, product_id: int, amount: int) -> int:
+        """Preleva fino ad amount unità dalla riga products (transazione breve e separata)"""
+        with self._ledger_lock:
+            db = self._session()
+            try:
+                available = db.execute(
+                    select(Product.available_quantity)
+                    .where(Product.id == product_id, Product.active == True)
+                    .with_for_update()
+                ).scalar_one_or_none()
+                if not available or available <= 0:
+                    db.rollback()
+                    return 0
+                leased = min(amount, available)
+                db.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(available_quantity=Product.available_quantity - leased)
+                )
+                self._heartbeat(db, register=True)
+                db.add(FlashSaleLease(worker_id=self.worker_id, product_id=product_id, quantity=leased))
+                db.commit()
+                self._registered = True
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        with self._stats_lock:
+            self._leased[product_id] += leased
+        return leased
+
+    def _heartbeat(self, db: Session, register: bool = False) -> None:
+        """
+        Aggiorna l'heartbeat del worker nel registro (register: lo crea se manca).
+
+        Se la riga non c'è più ma il worker era registrato, un altro processo lo
+        ha dato per morto e ha già restituito il suo stock: quello in memoria
+        viene scartato.
+        """
+        now = datetime.now(timezone.utc)
+        if self._registered:
+            updated = db.execute(
+                update(FlashSaleWorker)
+                .where(FlashSaleWorker.worker_id == self.worker_id)
+                .values(heartbeat_at=now)
+            ).rowcount
+            if updated:
+                return
+            logger.error("Worker flash sale %s dato per morto: stock in memoria scartato", self.worker_id)
+            self._discard()
+            db.execute(delete(FlashSaleLease).where(FlashSaleLease.worker_id == self.worker_id))
+            self._registered = False
+        if register:
+            db.add(FlashSaleWorker(worker_id=self.worker_id, heartbeat_at=now))
+
+    def _discard(self) -> None:
+        """Azzera lo stock in memoria (già restituito a products da un altro worker)"""
+        self._generation += 1
+        for shards in self._shards.values():
+            for shard in shards:
+                with shard.lock:
+                    shard.remaining = 0
+
+    def _compact(self, db: Session, returned: dict[int, int]) -> dict[int, int]:
+        """
+        Riduce i movimenti del worker a una riga per prodotto, tolte le
+        quantità restituite ora; restituisce i saldi
+        """
+        held = {product_id: -quantity for product_id, quantity in returned.items()}
+        rows = db.execute(
+            delete(FlashSaleLease)
+            .where(FlashSaleLease.worker_id == self.worker_id)
+            .returning(FlashSaleLease.product_id, FlashSaleLease.quantity)
+        ).all()
+        for product_id, quantity in rows:
+            held[product_id] = held.get(product_id, 0) + quantity
+        held = {product_id: quantity for product_id, quantity in held.items() if quantity}
+        db.add_all(
+            FlashSaleLease(worker_id=self.worker_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in held.items()
+        )
+        return held
+
+    def _take_surplus(self, keep_per_shard: Optional[int]) -> dict[int, int]:
+        """Toglie dagli shard lo stock da restituire (per prodotto)"""
+        surplus = {}
+        for product_id, shards in self._shards.items():
+            total = 0
+            for shard in shards:
+                with shard.lock:
+                    keep = min(self.slice_size, shard.taken) if keep_per_shard is None else keep_per_shard
+                    shard.taken = 0
+                    extra = shard.remaining - keep
+                    if extra > 0:
+                        shard.remaining -= extra
+                        total += extra
+            if total:
+                surplus[product_id] = total
+        return surplus
+
+    def flush(self, keep_per_shard: Optional[int] = None, unregister: bool = False) -> int:
+        """
+        Write-behind: restituisce al database lo stock in memoria con un
+        unico UPDATE per tutti i prodotti, aggiorna l'heartbeat del worker e
+        restituisce lo stock dei worker morti (reclaim_dead_workers).
+
+        - keep_per_shard None: ogni shard tiene quanto ha venduto dall'ultimo
+          flush (al massimo una porzione), uno shard inattivo restituisce tutto
+        - unregister: se non resta stock in sospeso il worker esce dal registro
+
+        Lo stock restituito torna disponibile per gli altri worker.
+        """
+        if not self.enabled:
+            return 0
+        with self._ledger_lock:
+            db = self._session()
+            surplus = {}
+            try:
+                self._heartbeat(db)
+                surplus = self._take_surplus(keep_per_shard)
+                if surplus:
+                    returned = case(surplus, value=Product.id)
+                    db.execute(
+                        update(Product)
+                        .where(Product.id.in_(sorted(surplus)))
+                        .values(available_quantity=Product.available_quantity + returned)
+                    )
+                held = self._compact(db, surplus)
+                if unregister and self._registered and not held:
+                    db.execute(delete(FlashSaleWorker).where(FlashSaleWorker.worker_id == self.worker_id))
+                reclaim_dead_workers(db, exclude=self.worker_id)
+                db.commit()
+                if unregister and not held:
+                    self._registered = False
+            except Exception:
+                db.rollback()
+                for product_id, quantity in surplus.items():
+                    self.release({product_id: quantity})
+                raise
+            finally:
+                db.close()
+
+        with self._stats_lock:
+            for product_id, quantity in surplus.items():
+                self._returned[product_id] += quantity
+        return sum(surplus.values())
+
+    def drain(self) -> int:
+        """Restituisce al database tutto lo stock in memoria ed esce dal registro (spegnimento del worker)"""
+        return self.flush(keep_per_shard=0, unregister=True)
+
+    def stats(self) -> dict:
+        """Contatori per prodotto: prelevato, restituito, venduto, in memoria"""
+        with self._stats_lock:
+            return {
+                product_id: {
+                    "leased": self._leased[product_id],
+                    "returned": self._returned[product_id],
+                    "sold": self._sold[product_id],
+                    "in_memory": sum(shard.remaining for shard in self._shards[product_id]),
+                }
+                for product_id in sorted(self.product_ids)
+            }
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(session):
+    if _SESSION_KEY in session.info:
+        session.info[_COMMITTED_KEY] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _settle_reservations(session, transaction):
+    """Fine della transazione principale: prenotazioni vendute o restituite"""
+    if transaction.parent is not None or _SESSION_KEY not in session.info:
+        return
+    reservations = session.info.pop(_SESSION_KEY)
+    committed = session.info.pop(_COMMITTED_KEY, False)
+    for stock, requested, generation in reservations:
+        stock._settle(requested, committed, generation)
+
+
+def reclaim_dead_workers(db: Session, exclude: Optional[str] = None) -> int:
+    """
+    Restituisce a products lo stock dei worker senza heartbeat da più di
+    FLASH_SALE_WORKER_TIMEOUT secondi (processo morto senza drain) e li
+    toglie dal registro. FOR UPDATE SKIP LOCKED: più worker in parallelo
+    non restituiscono due volte lo stesso stock.
+
+    Restituisce le unità restituite; il commit spetta al chiamante.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=FLASH_SALE_WORKER_TIMEOUT)
+    dead = db.execute(
+        select(FlashSaleWorker.worker_id)
+        .where(FlashSaleWorker.heartbeat_at < cutoff, FlashSaleWorker.worker_id != exclude)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not dead:
+        return 0
+
+    held = {}
+    rows = db.execute(
+        delete(FlashSaleLease)
+        .where(FlashSaleLease.worker_id.in_(dead))
+        .returning(FlashSaleLease.product_id, FlashSaleLease.quantity)
+    ).all()
+    for product_id, quantity in rows:
+        held[product_id] = held.get(product_id, 0) + quantity
+    held = {product_id: quantity for product_id, quantity in held.items() if quantity > 0}
+    if held:
+        returned = case(held, value=Product.id)
+        db.execute(
+            update(Product)
+            .where(Product.id.in_(sorted(held)))
+            .values(available_quantity=Product.available_quantity + returned)
+        )
+    db.execute(delete(FlashSaleWorker).where(FlashSaleWorker.worker_id.in_(dead)))
+    logger.warning("Stock flash sale di %d worker morti restituito: %d unità", len(dead), sum(held.values()))
+    return sum(held.values())
+
+
+# Stock flash sale del processo (vuoto se FLASH_SALE_PRODUCT_IDS non è impostata)
+flash_sale_stock = FlashSaleStock.from_env()
+
+
+async def run_flash_sale_flusher(interval: int = FLASH_SALE_FLUSH_INTERVAL) -> None:
+    """Task in-process: flush periodico; allo spegnimento restituisce tutto lo stock"""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(flash_sale_stock.flush)
+            except Exception:
+                logger.exception("Flush stock flash sale fallito")
+    finally:
+        flash_sale_stock.drain()
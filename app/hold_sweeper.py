@@ -0,0 +1,90 @@
+"""
+Sweeper delle prenotazioni stock scadute
+
+Rilascia a blocchi lo stock degli ordini pending non pagati entro ORDER_HOLD_MINUTES.
+Elimina anche le Idempotency-Key scadute (IDEMPOTENCY_KEY_TTL_HOURS) e
+restituisce a products lo stock flash sale dei worker morti senza drain.
+Gira dentro l'API (HOLD_SWEEPER_ENABLED=1) oppure come worker separato:
+
+    python -m app.hold_sweeper --interval 30
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.crud import order as crud_order
+from app.crud import idempotency as crud_idempotency
+from app.crud import token as crud_token
+from app.database import SessionLocal
+from app.flash_sale import reclaim_dead_workers
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("HOLD_SWEEP_INTERVAL", "30"))
+SWEEP_BATCH_SIZE = int(os.getenv("HOLD_SWEEP_BATCH_SIZE", "500"))
+
+
+def sweep_expired_holds(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Rilascia tutte le prenotazioni scadute, un blocco per transazione"""
+    released = 0
+    db = SessionLocal()
+    try:
+        while True:
+            count = crud_order.release_expired_holds(db, batch_size)
+            db.commit()
+            released += count
+            if count < batch_size:
+                break
+        purged = crud_idempotency.purge_expired_keys(db)
+        purged_revocations = crud_token.purge_expired_revocations(db)
+        reclaim_dead_workers(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if released:
+        logger.info("Prenotazioni scadute rilasciate: %d ordini", released)
+    if purged:
+        logger.info("Idempotency-Key scadute eliminate: %d", purged)
+    if purged_revocations:
+        logger.info("Revoche di token scaduti eliminate: %d", purged_revocations)
+    return released
+
+
+async def run_hold_sweeper(interval: int = SWEEP_INTERVAL_SECONDS) -> None:
+    """Task in-process: esegue lo sweep nel threadpool ogni interval secondi"""
+    while True:
+        try:
+            await run_in_threadpool(sweep_expired_holds)
+        except Exception:
+            logger.exception("Sweep prenotazioni fallito")
+        await asyncio.sleep(interval)
+
+
+def main(argv=None):
+    """Entry point del worker separato"""
+    parser = argparse.ArgumentParser(description="Rilascia lo stock degli ordini pending scaduti")
+    parser.add_argument("--interval", type=int, default=SWEEP_INTERVAL_SECONDS, help="Secondi tra due sweep")
+    parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE, help="Ordini per transazione")
+    parser.add_argument("--once", action="store_true", help="Esegue un solo sweep ed esce")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    while True:
+        try:
+            sweep_expired_holds(args.batch_size)
+        except Exception:
+            logger.exception("Sweep prenotazioni fallito")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
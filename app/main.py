@@ -1,20 +1,63 @@
 """
 FastAPI E-commerce Backend
 """
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.database import engine, Base
-from app.api import products, clients, orders
+from app.pagination import NEXT_CURSOR_HEADER
+from app.api import products, categories, clients, orders
+from app.api.products import MISSING_IDS_HEADER
+from app.flash_sale import flash_sale_stock, run_flash_sale_flusher
+from app.hold_sweeper import run_hold_sweeper
+from app.order_number import order_number_generator
+from app.password_hasher import password_hasher
+from app.product_cache import product_cache, start_invalidation_listener
+from app.rate_limit import login_rate_limiter
+from app.token_cache import revocation_cache
 
 # Crea tabelle database
 Base.metadata.create_all(bind=engine)
 
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Avvia e ferma i task in background dell'API"""
+    tasks = []
+    # Sweeper prenotazioni stock in-process (in alternativa: python -m app.hold_sweeper)
+    if os.getenv("HOLD_SWEEPER_ENABLED", "0") == "1":
+        tasks.append(asyncio.create_task(run_hold_sweeper()))
+    # Flash sale: write-behind dello stock in memoria (FLASH_SALE_PRODUCT_IDS)
+    if flash_sale_stock.enabled:
+        tasks.append(asyncio.create_task(run_flash_sale_flusher()))
+    # Cache prodotti: invalidazioni dagli altri worker (LISTEN/NOTIFY, solo PostgreSQL)
+    stop_listener = start_invalidation_listener(engine)
+    # Pool di processi per bcrypt (login e registrazione fuori dal threadpool)
+    password_hasher.start()
+    # Numeri ordine: worker_id del processo (strategia time)
+    order_number_generator.start()
+    yield
+    order_number_generator.shutdown()
+    password_hasher.shutdown()
+    for task in tasks:
+        task.cancel()
+    # Attende la fine dei task (il flusher flash sale restituisce lo stock in memoria)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if stop_listener is not None:
+        stop_listener.set()
+
+
 # Inizializza FastAPI
 app = FastAPI(
     title="E-commerce API",
     description="Backend REST API per e-commerce",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -24,6 +67,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, MISSING_IDS_HEADER, "ETag"],
 )
 
 
@@ -44,14 +88,27 @@ def home():
         "endpoints": {
             "products": {
                 "list": "GET /api/products",
+                "get_many": "GET /api/products?ids=1,5,9",
+                "batch": "POST /api/products/batch",
+                "search": "GET /api/products/search?q=",
                 "get": "GET /api/products/{id}",
                 "create": "POST /api/products",
+                "import": "POST /api/products/import",
                 "update": "PUT /api/products/{id}",
                 "delete": "DELETE /api/products/{id}"
             },
+            "categories": {
+                "list": "GET /api/categories",
+                "get": "GET /api/categories/{id}",
+                "create": "POST /api/categories",
+                "update": "PUT /api/categories/{id}",
+                "delete": "DELETE /api/categories/{id}"
+            },
             "clients": {
                 "register": "POST /api/clients/register",
                 "login": "POST /api/clients/login",
+                "refresh_token": "POST /api/clients/token/refresh",
+                "logout": "POST /api/clients/logout",
                 "list": "GET /api/clients",
                 "get": "GET /api/clients/{id}",
                 "get_by_email": "GET /api/clients/email/{email}",
@@ -61,9 +118,12 @@ def home():
             },
             "orders": {
                 "create": "POST /api/orders",
+                "bulk": "POST /api/orders/bulk",
                 "list": "GET /api/orders",
+                "export": "GET /api/orders/export",
                 "get": "GET /api/orders/{id}",
                 "update_status": "PATCH /api/orders/{id}/status",
+                "update_status_bulk": "PATCH /api/orders/status",
                 "cancel": "DELETE /api/orders/{id}"
             }
         },
@@ -80,7 +140,12 @@ def health_check():
     """
     return {
         "status": "healthy",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "flash_sale": flash_sale_stock.stats(),
+        "product_cache": product_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_revocations": revocation_cache.stats(),
+        "login_rate_limit": login_rate_limiter.stats()
     }
 
 
@@ -89,6 +154,9 @@ def health_check():
 # Products endpoints
 app.include_router(products.router, prefix="/api", tags=["Products"])
 
+# Categories endpoints
+app.include_router(categories.router, prefix="/api", tags=["Categories"])
+
 # Clients endpoints
 app.include_router(clients.router, prefix="/api", tags=["Clients"])
 
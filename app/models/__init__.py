@@ -1,8 +1,13 @@
 """
 Database Models
 """
+from app.models.category import Category
 from app.models.product import Product
 from app.models.client import Client
 from app.models.order import Order, OrderDetail
+from app.models.idempotency import IdempotencyKey
+from app.models.revoked_token import RevokedToken
+from app.models.flash_sale import FlashSaleWorker, FlashSaleLease
+from app.models.order_number_worker import OrderNumberWorker
 
-__all__ = ["Product", "Client", "Order", "OrderDetail"]
\ No newline at end of file
+__all__ = ["Category", "Product", "Client", "Order", "OrderDetail", "IdempotencyKey", "RevokedToken", "FlashSaleWorker", "FlashSaleLease", "OrderNumberWorker"]
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+Category model - rappresenta una categoria di prodotti nel database
+"""
+from sqlalchemy import Column, Integer, String, Boolean, Text
+from sqlalchemy.orm import relationship
+
+from app.database import Base
+
+
+class Category(Base):
+    """
+    Modello Category per la tabella categories nel database.
+    
+    Attributi:
+        id: ID univoco della categoria
+        name: Nome della categoria (univoco)
+        description: Descrizione della categoria
+        active: Se la categoria è attiva/visibile
+        product_count: Numero di prodotti attivi nella categoria
+                       (aggiornato a ogni scrittura sui prodotti, vedi crud.category)
+    """
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, unique=True, index=True)
+    description = Column(Text, nullable=True)
+    active = Column(Boolean, default=True, nullable=False, index=True)
+    product_count = Column(Integer, default=0, server_default="0", nullable=False)
+    
+    # Relazioni
+    products = relationship("Product", back_populates="category")
@@ -2,7 +2,7 @@
 Client model - rappresenta un cliente nel database
 """
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Index, func
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -14,7 +14,7 @@ class Client(Base):
     
     Attributi:
         id: ID univoco del cliente
-        email: Email del cliente (unique)
+        email: Email del cliente, normalizzata in minuscolo (unique su lower(email))
         password_hash: Password hashata
         first_name: Nome
         last_name: Cognome
@@ -32,7 +32,7 @@ class Client(Base):
     __tablename__ = "clients"
     
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), nullable=False, unique=True, index=True)
+    email = Column(String(255), nullable=False)
     password_hash = Column(String(255), nullable=False)
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
@@ -50,4 +50,10 @@ class Client(Base):
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     
     # Relazioni
-    orders = relationship("Order", back_populates="client", cascade="all, delete-orphan")
\ No newline at end of file
+    orders = relationship("Order", back_populates="client", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Unicità e ricerca senza distinzione tra maiuscole e minuscole
+        # (login, registrazione: WHERE lower(email) = ... / ON CONFLICT (lower(email)))
+        Index('idx_clients_email_lower', func.lower(email), unique=True),
+    )
\ No newline at end of file
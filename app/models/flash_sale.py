@@ -0,0 +1,52 @@
+"""
+FlashSale models - registro dello stock flash sale tenuto in memoria dai worker (vedi app.flash_sale)
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime
+
+from app.database import Base
+
+
+class FlashSaleWorker(Base):
+    """
+    Modello FlashSaleWorker per la tabella flash_sale_workers nel database.
+
+    Un worker (processo) che tiene stock flash sale in memoria. Se heartbeat_at
+    resta fermo oltre FLASH_SALE_WORKER_TIMEOUT il worker è considerato morto
+    e il suo stock viene restituito a products.
+
+    Attributi:
+        worker_id: ID casuale del processo
+        heartbeat_at: Ultimo segnale di vita (a ogni flush)
+        created_at: Data del primo prelievo
+    """
+    __tablename__ = "flash_sale_workers"
+
+    worker_id = Column(String(32), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False, index=True)
+
+    # Timestamps
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class FlashSaleLease(Base):
+    """
+    Modello FlashSaleLease per la tabella flash_sale_leases nel database.
+
+    Registro a sola aggiunta: la somma di quantity per worker e prodotto è lo
+    stock che il worker ha tolto da products e non ha ancora venduto né restituito.
+    - quantity > 0: prelievo (stessa transazione dell'UPDATE su products)
+    - quantity < 0: restituzione (flush) o vendita (stessa transazione dell'ordine)
+
+    Attributi:
+        id: ID univoco del movimento
+        worker_id: Worker che tiene lo stock
+        product_id: Prodotto in flash sale
+        quantity: Unità prelevate (positive) o uscite dalla memoria (negative)
+    """
+    __tablename__ = "flash_sale_leases"
+
+    id = Column(Integer, primary_key=True)
+    worker_id = Column(String(32), nullable=False, index=True)
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
@@ -0,0 +1,31 @@
+"""
+IdempotencyKey model - risposte memorizzate per le richieste con Idempotency-Key
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+
+from app.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Modello IdempotencyKey per la tabella idempotency_keys nel database.
+    
+    Attributi:
+        client_id: ID del cliente che ha inviato la richiesta
+        key: Valore dell'header Idempotency-Key
+        request_hash: Hash SHA-256 del body della richiesta
+        status_code: Codice HTTP della risposta memorizzata
+        response_body: Risposta serializzata (byte JSON)
+        created_at: Data della prima richiesta
+    """
+    __tablename__ = "idempotency_keys"
+    
+    client_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
@@ -3,12 +3,22 @@ Order models - rappresentano ordini e dettagli ordini nel database
 """
 from datetime import datetime, timezone
 from decimal import Decimal
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Numeric, ForeignKey, CheckConstraint, Sequence, Index, text
 from sqlalchemy.orm import relationship
 
 from app.database import Base
 
 
+# Numeri ordine allocati a blocchi: ogni nextval riserva ORDER_NUMBER_BLOCK numeri
+ORDER_NUMBER_BLOCK = 1000
+order_number_seq = Sequence(
+    "order_number_seq",
+    start=1,
+    increment=ORDER_NUMBER_BLOCK,
+    metadata=Base.metadata
+)
+
+
 class Order(Base):
     """
     Modello Order per la tabella orders nel database.
@@ -35,6 +45,7 @@ class Order(Base):
         paid_at: Data pagamento
         shipped_at: Data spedizione
         delivered_at: Data consegna
+        hold_expires_at: Scadenza della prenotazione stock (solo ordini pending)
         created_at: Data creazione
         updated_at: Data ultimo aggiornamento
     """
@@ -75,6 +86,9 @@ class Order(Base):
     shipped_at = Column(DateTime, nullable=True)
     delivered_at = Column(DateTime, nullable=True)
     
+    # Prenotazione stock: alla scadenza un ordine ancora pending viene annullato
+    hold_expires_at = Column(DateTime, nullable=True)
+    
     # Timestamps
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
@@ -90,11 +104,19 @@ class Order(Base):
             "status IN ('pending', 'paid', 'processing', 'shipped', 'delivered', 'cancelled', 'refunded')",
             name='orders_status_check'
         ),
+        # Indice parziale: lo sweeper legge solo le prenotazioni attive
+        Index(
+            'idx_orders_hold_expires',
+            'hold_expires_at',
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'")
+        ),
     )
     
     # Relazioni
     client = relationship("Client", back_populates="orders")
-    order_details = relationship("OrderDetail", back_populates="order", cascade="all, delete-orphan")
+    # passive_deletes: i dettagli sono eliminati dal database (ON DELETE CASCADE)
+    order_details = relationship("OrderDetail", back_populates="order", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class OrderDetail(Base):
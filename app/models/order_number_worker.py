@@ -0,0 +1,26 @@
+"""
+OrderNumberWorker model - worker_id assegnati ai processi per i numeri ordine (vedi app.order_number)
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+
+from app.database import Base
+
+
+class OrderNumberWorker(Base):
+    """
+    Modello OrderNumberWorker per la tabella order_number_workers nel database.
+
+    Ogni riga assegna un worker_id (0..999) a un processo finché expires_at
+    non passa: il processo la rinnova periodicamente, uno slot scaduto può
+    essere preso da un altro processo.
+
+    Attributi:
+        worker_id: Numero del worker nei numeri ordine (strategia time)
+        owner: ID casuale del processo che lo usa
+        expires_at: Scadenza dell'assegnazione
+    """
+    __tablename__ = "order_number_workers"
+
+    worker_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String(32), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -2,7 +2,8 @@
 Product model - rappresenta un prodotto nel database
 """
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, DDL, ForeignKey, Index, event, literal_column, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -22,6 +23,7 @@ class Product(Base):
         sku: Codice SKU del prodotto
         active: Se il prodotto è attivo/visibile
         featured: Se il prodotto è in evidenza
+        category_id: ID della categoria
         created_at: Data di creazione
         updated_at: Data ultimo aggiornamento
     """
@@ -36,10 +38,73 @@ class Product(Base):
     sku = Column(String(100), nullable=True, unique=True, index=True)
     active = Column(Boolean, default=True, nullable=False)
     featured = Column(Boolean, default=False, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
     
     # Timestamps
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     
+    # Indici parziali per la lista filtrata (solo prodotti attivi, l'unico caso letto dal catalogo).
+    # Nessun indice su available_quantity/updated_at: cambiano a ogni ordine e
+    # renderebbero più costosi gli UPDATE dello stock
+    __table_args__ = (
+        # Categoria + fascia/ordinamento di prezzo
+        Index(
+            'idx_products_active_category_price',
+            'category_id', 'price', 'id',
+            postgresql_where=text("active"),
+            sqlite_where=text("active")
+        ),
+        # Fascia/ordinamento di prezzo su tutto il catalogo
+        Index(
+            'idx_products_active_price',
+            'price', 'id',
+            postgresql_where=text("active"),
+            sqlite_where=text("active")
+        ),
+        # Prodotti in evidenza (pochi: indice piccolo)
+        Index(
+            'idx_products_active_featured',
+            'price', 'id',
+            postgresql_where=text("active AND featured"),
+            sqlite_where=text("active AND featured")
+        ),
+        # Ordinamento per novità
+        Index(
+            'idx_products_active_created',
+            'created_at', 'id',
+            postgresql_where=text("active"),
+            sqlite_where=text("active")
+        ),
+    )
+    
     # Relazioni
-    order_details = relationship("OrderDetail", back_populates="product")
\ No newline at end of file
+    category = relationship("Category", back_populates="products")
+    order_details = relationship("OrderDetail", back_populates="product")
+
+
+# ==================== RICERCA FULL-TEXT (PostgreSQL) ====================
+
+# Colonna generata: nome con peso A, descrizione con peso B (configurazione 'simple',
+# indipendente dalla lingua). Creata via DDL perché esiste solo su PostgreSQL;
+# per un database esistente vedi script_sql_product_search.txt
+product_search_vector = literal_column("products.search_vector", type_=TSVECTOR)
+
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+        ") STORED"
+    ).execute_if(dialect="postgresql")
+)
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql")
+)
@@ -0,0 +1,36 @@
+"""
+RevokedToken model - revoche dei token di sessione (vedi app.auth)
+"""
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, ForeignKey
+
+from app.database import Base
+
+
+class RevokedToken(Base):
+    """
+    Modello RevokedToken per la tabella revoked_tokens nel database.
+    
+    Ogni riga revoca un singolo token (jti) oppure tutti i token del cliente
+    emessi prima di issued_before (cambio password, eliminazione).
+    
+    Attributi:
+        id: ID univoco della revoca
+        client_id: ID del cliente proprietario dei token
+        jti: ID del token revocato (NULL per le revoche di tutti i token)
+        token_type: Tipo del token revocato (app.auth.ACCESS / REFRESH, NULL con jti NULL)
+        issued_before: Istante (millisecondi epoch) prima del quale i token sono revocati
+        expires_at: Scadenza dell'ultimo token interessato (poi la riga si può eliminare)
+        created_at: Data della revoca
+    """
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id", ondelete="CASCADE"), nullable=False, index=True)
+    jti = Column(String(32), nullable=True, unique=True)
+    token_type = Column(String(1), nullable=True)
+    issued_before = Column(BigInteger, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
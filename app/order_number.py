@@ -0,0 +1,228 @@
+"""
+Generatori di numeri ordine - univoci tra processi e worker, senza round trip per ordine
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine, insert_on_conflict
+from app.models.order import ORDER_NUMBER_BLOCK, order_number_seq
+from app.models.order_number_worker import OrderNumberWorker
+
+logger = logging.getLogger(__name__)
+
+ORDER_NUMBER_PREFIX = "ORD"
+ORDER_WORKER_LEASE_SECONDS = int(os.getenv("ORDER_WORKER_LEASE_SECONDS", "300"))
+
+
+class OrderNumberGenerator(ABC):
+    """Interfaccia dei generatori di numeri ordine"""
+
+    def start(self) -> None:
+        """Preparazione all'avvio del processo (default: niente)"""
+
+    def shutdown(self) -> None:
+        """Rilascio delle risorse allo spegnimento (default: niente)"""
+
+    @abstractmethod
+    def next(self, db: Session) -> str:
+        """Nuovo numero ordine univoco"""
+
+
+class SequenceBlockGenerator(OrderNumberGenerator):
+    """
+    Numeri da una sequence PostgreSQL allocata a blocchi.
+
+    Ogni nextval (INCREMENT BY ORDER_NUMBER_BLOCK) riserva un intero blocco al
+    processo: si va sul database una volta ogni ORDER_NUMBER_BLOCK ordini.
+    Formato: ORD-YYYYmmdd-000012345
+    """
+
+    def __init__(self, block_size: int = ORDER_NUMBER_BLOCK):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next_value = 0
+        self._block_end = 0
+
+    def next(self, db: Session) -> str:
+        with self._lock:
+            if self._next_value >= self._block_end:
+                self._next_value = db.execute(select(order_number_seq.next_value())).scalar_one()
+                self._block_end = self._next_value + self.block_size
+            value = self._next_value
+            self._next_value += 1
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        return f"{ORDER_NUMBER_PREFIX}-{day}-{value:09d}"
+
+
+class TimeCounterGenerator(OrderNumberGenerator):
+    """
+    Numeri tempo + worker + contatore, senza accesso al database per ordine.
+
+    Il worker_id (0..999) è uno slot della tabella order_number_workers preso
+    dal processo all'avvio (start) con INSERT ... ON CONFLICT DO UPDATE solo
+    se libero o scaduto: due processi vivi non hanno mai lo stesso worker_id,
+    anche con uvicorn --workers (stesso ambiente). Un thread rinnova lo slot
+    ogni lease/3 secondi; se il rinnovo non riesce entro la scadenza il
+    processo smette di usarlo e ne prende un altro.
+    Fino a 10000 ordini al secondo per worker.
+    Formato: ORD-YYYYmmddHHMMSS-WWW-CCCC
+    """
+
+    MAX_PER_SECOND = 10000
+    WORKER_SLOTS = 1000
+
+    def __init__(self, lease: int = ORDER_WORKER_LEASE_SECONDS):
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self.worker_id: Optional[int] = None
+        # Istante (monotonic) oltre il quale lo slot può essere di un altro processo
+        self._valid_until = 0.0
+        self._lock = threading.Lock()
+        self._slot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+        self._second = 0
+        self._counter = 0
+
+    def start(self) -> None:
+        """Prende lo slot e avvia il thread di rinnovo"""
+        self._worker_id()
+        if self._renewer is None:
+            self._stop.clear()
+            self._renewer = threading.Thread(target=self._renew_loop, name="order-number-worker", daemon=True)
+            self._renewer.start()
+
+    def shutdown(self) -> None:
+        """Ferma il rinnovo e libera lo slot"""
+        self._stop.set()
+        with self._slot_lock:
+            if self.worker_id is None:
+                return
+            db = SessionLocal()
+            try:
+                db.execute(
+                    delete(OrderNumberWorker)
+                    .where(OrderNumberWorker.worker_id == self.worker_id, OrderNumberWorker.owner == self.owner)
+                )
+                db.commit()
+            finally:
+                db.close()
+            self.worker_id = None
+
+    def next(self, db: Session) -> str:
+        worker_id = self._worker_id()
+        with self._lock:
+            now = int(time.time())
+            if now > self._second:
+                self._second = now
+                self._counter = 0
+            elif self._counter >= self.MAX_PER_SECOND:
+                # Contatore esaurito: si prende in prestito il secondo successivo
+                self._second += 1
+                self._counter = 0
+            second, counter = self._second, self._counter
+            self._counter += 1
+        timestamp = datetime.fromtimestamp(second, timezone.utc).strftime("%Y%m%d%H%M%S")
+        return f"{ORDER_NUMBER_PREFIX}-{timestamp}-{worker_id:03d}-{counter:04d}"
+
+    # ==================== SLOT ====================
+
+    def _worker_id(self) -> int:
+        """worker_id valido; lo prende (transazione separata) se manca o se è scaduto"""
+        worker_id = self.worker_id
+        if worker_id is not None and time.monotonic() < self._valid_until:
+            return worker_id
+        with self._slot_lock:
+            if self.worker_id is None or time.monotonic() >= self._valid_until:
+                self._claim()
+            return self.worker_id
+
+    def _claim(self) -> None:
+        """Primo slot libero o scaduto, in ordine casuale (chiamata con _slot_lock)"""
+        db = SessionLocal()
+        try:
+            for slot in random.sample(range(self.WORKER_SLOTS), self.WORKER_SLOTS):
+                started = time.monotonic()
+                now = datetime.now(timezone.utc)
+                expires_at = now + timedelta(seconds=self.lease)
+                stmt = insert_on_conflict(db, OrderNumberWorker).values(
+                    worker_id=slot, owner=self.owner, expires_at=expires_at
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[OrderNumberWorker.worker_id],
+                    set_={"owner": self.owner, "expires_at": expires_at},
+                    where=(OrderNumberWorker.expires_at < now) | (OrderNumberWorker.owner == self.owner)
+                ).returning(OrderNumberWorker.worker_id)
+                claimed = db.execute(stmt).scalar_one_or_none()
+                db.commit()
+                if claimed is not None:
+                    if self.worker_id is not None and self.worker_id != slot:
+                        logger.warning("worker_id %d scaduto, numeri ordine con worker_id %d", self.worker_id, slot)
+                    self.worker_id = slot
+                    self._valid_until = started + self.lease
+                    return
+        finally:
+            db.close()
+        raise RuntimeError("Nessun worker_id libero per i numeri ordine")
+
+    def _renew(self) -> None:
+        with self._slot_lock:
+            if self.worker_id is None:
+                return
+            started = time.monotonic()
+            db = SessionLocal()
+            try:
+                renewed = db.execute(
+                    update(OrderNumberWorker)
+                    .where(OrderNumberWorker.worker_id == self.worker_id, OrderNumberWorker.owner == self.owner)
+                    .values(expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease))
+                ).rowcount
+                db.commit()
+            finally:
+                db.close()
+            if renewed:
+                self._valid_until = started + self.lease
+            else:
+                # Slot scaduto e preso da un altro processo
+                self._claim()
+
+    def _renew_loop(self) -> None:
+        while not self._stop.wait(self.lease / 3):
+            try:
+                self._renew()
+            except Exception:
+                logger.exception("Rinnovo worker_id dei numeri ordine fallito")
+
+
+def create_generator(strategy: str, supports_sequences: bool) -> OrderNumberGenerator:
+    """
+    Crea il generatore configurato
+
+    - "sequence": sequence a blocchi (default se il database supporta le sequence)
+    - "time": tempo + worker + contatore (default altrimenti, es. SQLite),
+      worker_id assegnato dal database a ogni processo
+    """
+    if not strategy:
+        strategy = "sequence" if supports_sequences else "time"
+    if strategy == "sequence":
+        return SequenceBlockGenerator()
+    if strategy == "time":
+        return TimeCounterGenerator()
+    raise ValueError(f"Strategia numeri ordine sconosciuta: {strategy}")
+
+
+# Generatore condiviso dal processo (ORDER_NUMBER_STRATEGY per forzare la strategia)
+order_number_generator = create_generator(
+    os.getenv("ORDER_NUMBER_STRATEGY", ""),
+    engine.dialect.supports_sequences
+)
@@ -0,0 +1,51 @@
+"""
+Paginazione keyset - cursori opachi per le liste
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+
+# Header in cui viene restituito il cursore della pagina successiva
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Codifica la chiave di ordinamento dell'ultima riga in un cursore opaco"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decodifica un cursore; solleva 400 se non è valido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list):
+            raise ValueError(cursor)
+        return values
+    except (ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def decode_id_cursor(cursor: str) -> int:
+    """Decodifica un cursore basato sulla sola chiave primaria"""
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values[0]
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    """Espone il cursore della pagina successiva (assente sull'ultima pagina)"""
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,136 @@
+"""
+Hash delle password - pool di processi dedicato a bcrypt
+
+bcrypt costa ~250ms di CPU per chiamata: eseguito nel threadpool di Starlette
+un'ondata di login occupa tutti i thread e blocca anche le letture del
+catalogo. Qui hash e verifica girano in un pool di processi separato di
+dimensione fissa (BCRYPT_WORKERS), con una coda di ammissione limitata
+(BCRYPT_MAX_PENDING): oltre quella soglia le richieste vengono rifiutate
+subito (PasswordHasherBusy -> 503) invece di accodarsi senza limite.
+
+Le funzioni hash_password / verify_password restano sincrone e senza
+dipendenze dall'app: sono quelle eseguite nei processi del pool e possono
+essere usate direttamente da script e CLI.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 8)))
+
+
+# ==================== BCRYPT ====================
+
+def hash_password(password: str) -> str:
+    """Hash della password usando bcrypt direttamente"""
+    password_bytes = password.encode('utf-8')
+    salt = bcrypt.gensalt()
+    hashed = bcrypt.hashpw(password_bytes, salt)
+    return hashed.decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifica password usando bcrypt direttamente"""
+    password_bytes = plain_password.encode('utf-8')
+    hashed_bytes = hashed_password.encode('utf-8')
+    return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+
+# ==================== POOL ====================
+
+class PasswordHasherBusy(Exception):
+    """Coda di ammissione piena: riprovare più tardi"""
+
+
+class PasswordHasher:
+    """
+    Pool di processi per bcrypt con coda di ammissione limitata.
+
+    - workers: processi del pool (chiamate bcrypt in parallelo)
+    - max_pending: chiamate ammesse contemporaneamente (in esecuzione + in coda)
+    """
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max(max_pending, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def start(self) -> ProcessPoolExecutor:
+        """Crea il pool se serve (spawn: i worker non ereditano thread e connessioni dell'API)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def hash(self, password: str) -> str:
+        """Hash della password nel pool"""
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verifica della password nel pool"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, function, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        try:
+            result = await asyncio.wrap_future(self.start().submit(function, *args))
+        except asyncio.CancelledError:
+            self._finish(cancelled=True)
+            raise
+        except BaseException:
+            self._finish(failed=True)
+            raise
+        self._finish()
+        return result
+
+    def _finish(self, failed: bool = False, cancelled: bool = False) -> None:
+        """Libera il posto in coda; completed conta solo le chiamate riuscite"""
+        with self._lock:
+            self._pending -= 1
+            if cancelled:
+                self.cancelled += 1
+            elif failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "rejected": self.rejected
+            }
+
+
+# Pool del processo API (avviato nel lifespan di app.main)
+password_hasher = PasswordHasher()
@@ -0,0 +1,262 @@
+"""
+Cache prodotti - read-through in memoria per GET /api/products e /api/products/{id}
+
+Ogni worker tiene in memoria le risposte (ProductResponse) del dettaglio e
+delle pagine della lista, con TTL e limite LRU. Le scritture su products
+invalidano solo le voci interessate e lo comunicano agli altri worker con
+NOTIFY sul canale PRODUCT_CACHE_CHANNEL (PostgreSQL): la notifica parte al
+commit della transazione, quindi nessun worker la riceve prima che la
+modifica sia visibile.
+
+La quantità disponibile cambia a ogni ordine senza invalidare la cache:
+resta al più PRODUCT_CACHE_TTL secondi indietro, mentre la verifica dello
+stock al checkout legge sempre il database.
+"""
+import logging
+import os
+import select
+import threading
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.category_cache import category_snapshot
+from app.schemas.product import ProductResponse
+from app.token_cache import revocation_cache
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "30"))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_CHANNEL = "product_cache"
+# Payload delle notifiche che invalidano lo snapshot delle categorie / tutta la cache / le revoche dei token
+CATEGORIES_PAYLOAD = "categories"
+CLEAR_PAYLOAD = "*"
+TOKENS_PAYLOAD = "tokens"
+
+
+class ProductCache:
+    """
+    Dettagli e pagine della lista prodotti in memoria.
+
+    Una pagina è indicizzata per parametri di paginazione e filtri e conserva
+    gli id restituiti: nella lista semplice (per ID, senza filtri) una modifica
+    invalida solo le pagine che la contengono (o, se cambia la visibilità del
+    prodotto, quelle che può spostare). Le pagine filtrate o ordinate per
+    altri campi sono invalidate da ogni modifica.
+    """
+
+    def __init__(self, maxsize: int = PRODUCT_CACHE_SIZE, ttl: Optional[float] = PRODUCT_CACHE_TTL):
+        self.details = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.pages = LRUCache(maxsize=max(1, maxsize // 10), ttl=ttl)
+        # Pagine: chiave -> (prodotti, after_id, limit, ids), ids None se filtrata.
+        # I dati per l'invalidazione stanno nella voce: escono dalla cache con
+        # lei (LRU, scadenza), nessun indice separato da ripulire
+        self._lock = threading.Lock()
+        # Incrementato a ogni invalidazione: un caricamento iniziato prima non viene salvato
+        self._generation = 0
+
+    # ==================== LETTURA ====================
+
+    def get_product(self, product_id: int, load: Callable[[], Optional[object]]) -> Optional[ProductResponse]:
+        """Dettaglio dalla cache; in caso di miss lo carica con load()"""
+        cached = self.details.get(product_id)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        product = load()
+        if product is None:
+            return None
+        response = ProductResponse.model_validate(product)
+        with self._lock:
+            if generation == self._generation:
+                self.details.set(product_id, response)
+        return response
+
+    def get_many(self, product_ids: list[int], load: Callable[[list[int]], list]) -> dict[int, ProductResponse]:
+        """
+        Dettagli di più prodotti: quelli in cache senza query, gli altri con
+        un solo load(ids mancanti). Restituisce {id: prodotto} (assenti se non esistono)
+        """
+        found = {}
+        missing = []
+        for product_id in product_ids:
+            cached = self.details.get(product_id)
+            if cached is not None:
+                found[product_id] = cached
+            else:
+                missing.append(product_id)
+        if not missing:
+            return found
+        generation = self._generation
+        loaded = [ProductResponse.model_validate(product) for product in load(missing)]
+        with self._lock:
+            if generation == self._generation:
+                for response in loaded:
+                    self.details.set(response.id, response)
+        found.update((response.id, response) for response in loaded)
+        return found
+
+    def get_products(
+        self,
+        key: tuple,
+        load: Callable[[], list],
+        limit: int,
+        after_id: Optional[int] = None,
+        id_ordered: bool = True
+    ) -> list[ProductResponse]:
+        """
+        Pagina della lista dalla cache; key identifica pagina e filtri.
+        id_ordered: lista semplice per ID, invalidata in modo preciso
+        """
+        cached = self.pages.get(key)
+        if cached is not None:
+            return cached[0]
+        generation = self._generation
+        responses = [ProductResponse.model_validate(product) for product in load()]
+        ids = tuple(response.id for response in responses) if id_ordered else None
+        with self._lock:
+            if generation == self._generation:
+                self.pages.set(key, (responses, after_id, limit, ids))
+                # I prodotti della pagina riempiono anche la cache del dettaglio
+                for response in responses:
+                    self.details.set(response.id, response)
+        return responses
+
+    # ==================== INVALIDAZIONE ====================
+
+    def invalidate(self, product_id: int, visibility_changed: bool = False) -> None:
+        """
+        Invalida il dettaglio e le pagine interessate da una modifica.
+
+        - visibility_changed=False: solo le pagine che contengono il prodotto
+        - visibility_changed=True (creato, eliminato, riattivato): anche le
+          pagine in cui il prodotto entra o da cui sposta gli altri
+        """
+        with self._lock:
+            self._generation += 1
+            self.details.pop(product_id)
+
+            def stale(key, page) -> bool:
+                _, after_id, limit, ids = page
+                if ids is None or product_id in ids:
+                    return True
+                if visibility_changed and (after_id is None or product_id > after_id):
+                    # Il prodotto cade nella pagina o prima di essa (paginazione offset)
+                    return len(ids) < limit or product_id <= ids[-1]
+                return False
+
+            self.pages.pop_matching(stale)
+
+    def clear(self) -> None:
+        """Invalida tutto (es. notifiche perse durante una riconnessione)"""
+        with self._lock:
+            self._generation += 1
+            self.pages.clear()
+            self.details.clear()
+
+    def stats(self) -> dict:
+        return {"details": self.details.stats(), "pages": self.pages.stats()}
+
+
+# Cache del processo
+product_cache = ProductCache()
+
+
+# ==================== BROADCAST ====================
+
+def _notify(db: Session, payload: str) -> None:
+    """
+    Accoda una notifica agli altri worker nella transazione corrente
+    (PostgreSQL la consegna solo al commit). No-op sugli altri database.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": PRODUCT_CACHE_CHANNEL, "payload": payload}
+    )
+
+
+def notify_invalidation(db: Session, product_id: int, visibility_changed: bool = False) -> None:
+    """Notifica agli altri worker la modifica di un prodotto"""
+    _notify(db, f"{product_id}:{int(visibility_changed)}")
+
+
+def notify_cleared(db: Session) -> None:
+    """Notifica agli altri worker di svuotare la cache (scritture in blocco)"""
+    _notify(db, CLEAR_PAYLOAD)
+
+
+def notify_categories_changed(db: Session) -> None:
+    """Notifica agli altri worker la modifica di categorie o conteggi prodotti"""
+    _notify(db, CATEGORIES_PAYLOAD)
+
+
+def notify_tokens_revoked(db: Session) -> None:
+    """Notifica agli altri worker una revoca di token (app.token_cache)"""
+    _notify(db, TOKENS_PAYLOAD)
+
+
+def _apply_notification(payload: str) -> None:
+    if payload == CATEGORIES_PAYLOAD:
+        category_snapshot.invalidate()
+        return
+    if payload == TOKENS_PAYLOAD:
+        revocation_cache.invalidate()
+        return
+    if payload == CLEAR_PAYLOAD:
+        product_cache.clear()
+        return
+    product_id, visibility_changed = payload.split(":")
+    product_cache.invalidate(int(product_id), visibility_changed == "1")
+
+
+def listen_for_invalidations(engine, stop: threading.Event, poll_seconds: float = 5.0) -> None:
+    """
+    LISTEN sul canale della cache con una connessione dedicata (thread separato).
+    Se la connessione cade cache, snapshot categorie e revoche dei token vengono
+    svuotati: le notifiche nel frattempo sono perse.
+    """
+    while not stop.is_set():
+        connection = None
+        try:
+            connection = engine.raw_connection()
+            driver = connection.driver_connection
+            driver.autocommit = True
+            with driver.cursor() as cursor:
+                cursor.execute(f"LISTEN {PRODUCT_CACHE_CHANNEL}")
+            product_cache.clear()
+            category_snapshot.invalidate()
+            revocation_cache.invalidate()
+            while not stop.is_set():
+                if select.select([driver], [], [], poll_seconds) == ([], [], []):
+                    continue
+                driver.poll()
+                while driver.notifies:
+                    _apply_notification(driver.notifies.pop(0).payload)
+        except Exception:
+            logger.exception("LISTEN cache prodotti interrotto, nuovo tentativo")
+            product_cache.clear()
+            category_snapshot.invalidate()
+            revocation_cache.invalidate()
+            stop.wait(poll_seconds)
+        finally:
+            if connection is not None:
+                connection.invalidate()
+
+
+def start_invalidation_listener(engine) -> Optional[threading.Event]:
+    """Avvia il listener se il database è PostgreSQL; restituisce l'evento per fermarlo"""
+    if engine.dialect.name != "postgresql":
+        return None
+    stop = threading.Event()
+    threading.Thread(
+        target=listen_for_invalidations,
+        args=(engine, stop),
+        name="product-cache-listener",
+        daemon=True
+    ).start()
+    return stop
@@ -0,0 +1,158 @@
+"""
+Import prodotti in blocco (CSV / NDJSON) - usato dall'API e da riga di comando
+
+Il file viene letto in streaming: ogni riga è validata con ProductCreate e
+salvata con upsert su sku in transazioni da IMPORT_BATCH_SIZE righe, quindi la
+memoria usata non dipende dalla dimensione del catalogo.
+
+    python -m app.product_import catalogo.csv
+    python -m app.product_import catalogo.ndjson --format ndjson --batch-size 2000
+"""
+import argparse
+import codecs
+import csv
+import json
+import sys
+from typing import Callable, Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+
+from app.crud import product as crud_product
+from app.database import SessionLocal
+from app.schemas.product import ProductCreate, ProductImportError, ProductImportResponse
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Righe per transazione (una INSERT ... ON CONFLICT multi-riga ciascuna)
+IMPORT_BATCH_SIZE = 1000
+
+# Errori riportati nella risposta (gli altri vengono solo contati)
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Righe di testo (con il terminatore) da blocchi di byte UTF-8, anche spezzati a metà carattere"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(lines: Iterable[str], format: str) -> Iterator[tuple[int, object]]:
+    """
+    (riga del file, record grezzo): dict per CSV (campi vuoti omessi),
+    stringa JSON per NDJSON
+    """
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # line_num: ultima riga letta (i campi tra virgolette possono andare a capo)
+            yield reader.line_num, {key: value for key, value in record.items() if key and value not in ("", None)}
+    elif format == "ndjson":
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                yield number, line
+    else:
+        raise ValueError(f"Formato import non supportato: {format}")
+
+
+def _validate(raw) -> ProductCreate:
+    if isinstance(raw, str):
+        return ProductCreate.model_validate_json(raw)
+    return ProductCreate.model_validate(raw)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Errori di validazione in una riga leggibile"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'riga'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+def import_products(
+    db,
+    chunks: Iterable[bytes],
+    format: str = "csv",
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[int, int, int, int], None]] = None
+) -> ProductImportResponse:
+    """
+    Importa un catalogo letto a blocchi di byte.
+
+    progress(righe lette, creati, aggiornati, scartati) viene chiamata dopo ogni transazione.
+    """
+    created = updated = failed = read = 0
+    errors: list[ProductImportError] = []
+    batch: list[tuple[int, ProductCreate]] = []
+
+    def report(batch_errors: list[ProductImportError]):
+        nonlocal failed
+        failed += len(batch_errors)
+        errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    def flush():
+        nonlocal created, updated
+        batch_created, batch_updated, batch_errors = crud_product.upsert_products(db, batch)
+        created += batch_created
+        updated += batch_updated
+        report(batch_errors)
+        batch.clear()
+        if progress:
+            progress(read, created, updated, failed)
+
+    for line, raw in iter_records(iter_lines(chunks), format):
+        read += 1
+        try:
+            batch.append((line, _validate(raw)))
+        except ValidationError as e:
+            sku = raw.get("sku") if isinstance(raw, dict) else None
+            report([ProductImportError(line=line, sku=sku, error=_format_validation_error(e))])
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    elif progress:
+        progress(read, created, updated, failed)
+
+    return ProductImportResponse(created=created, updated=updated, failed=failed, errors=errors)
+
+
+def main(argv=None):
+    """Entry point da riga di comando"""
+    parser = argparse.ArgumentParser(description="Importa o aggiorna (per sku) prodotti da CSV o NDJSON")
+    parser.add_argument("file", help="File da importare ('-' per stdin)")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: dall'estensione del file")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Righe per transazione")
+    args = parser.parse_args(argv)
+
+    format = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+
+    def progress(read, created, updated, failed):
+        print(f"\rRighe {read:,}  creati {created:,}  aggiornati {updated:,}  scartati {failed:,}", end="", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        result = import_products(db, iter(lambda: source.read(1 << 20), b""), format, args.batch_size, progress)
+    finally:
+        db.close()
+        if source is not sys.stdin.buffer:
+            source.close()
+
+    print(file=sys.stderr)
+    for error in result.errors:
+        print(json.dumps(error.model_dump(), ensure_ascii=False))
+    if result.failed > len(result.errors):
+        print(f"... altre {result.failed - len(result.errors)} righe scartate", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Rate limit del login - token bucket per email e per IP
+
+Ogni tentativo di login costa una verifica bcrypt (vedi app.password_hasher):
+un attacco di credential stuffing si trasforma direttamente in consumo di CPU.
+Il limitatore respinge le richieste in eccesso (429) prima di qualsiasi query
+o hash, con due bucket per tentativo: uno per l'account (email al login,
+id cliente al cambio password) e uno per l'IP.
+
+I bucket vivono in un backend intercambiabile (RateLimitBackend):
+- LocalRateLimitBackend: in memoria, per processo, a shard con lock propri e
+  dimensione limitata (LRU) - ogni worker applica i limiti per conto suo
+- un backend condiviso (es. Redis) permette limiti comuni a tutti i worker:
+  RATE_LIMIT_BACKEND=modulo:classe, la classe implementa take()
+"""
+import importlib
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+LOGIN_RATE_EMAIL_BURST = int(os.getenv("LOGIN_RATE_EMAIL_BURST", "5"))
+LOGIN_RATE_EMAIL_PER_MINUTE = float(os.getenv("LOGIN_RATE_EMAIL_PER_MINUTE", "5"))
+LOGIN_RATE_IP_BURST = int(os.getenv("LOGIN_RATE_IP_BURST", "20"))
+LOGIN_RATE_IP_PER_MINUTE = float(os.getenv("LOGIN_RATE_IP_PER_MINUTE", "30"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+# ==================== BACKEND ====================
+
+class RateLimitBackend(ABC):
+    """Interfaccia dei backend: un bucket per chiave, consumato atomicamente"""
+
+    @abstractmethod
+    def take(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> float:
+        """
+        Consuma cost gettoni dal bucket di key (capacity gettoni al massimo,
+        ricaricati di refill_per_second al secondo).
+        Restituisce 0 se consentito, altrimenti i secondi da attendere.
+        """
+
+    def stats(self) -> dict:
+        return {}
+
+
+class _Shard:
+    """Bucket di una parte delle chiavi con il loro lock"""
+    __slots__ = ("lock", "buckets", "evictions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.evictions = 0
+        # chiave -> [gettoni, istante dell'ultimo aggiornamento], dal meno recente
+        self.buckets: OrderedDict = OrderedDict()
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """
+    Bucket in memoria del processo.
+
+    - max_keys: chiavi tenute in memoria (le meno recenti vengono dimenticate:
+      il loro bucket riparte pieno)
+    - shards: lock indipendenti, le richieste su chiavi diverse raramente si attendono
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, shards: int = 16):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_per_shard = max(1, max_keys // shards)
+
+    def take(self, key: str, capacity: int, refill_per_second: float, cost: float = 1.0) -> float:
+        shard = self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+        now = time.monotonic()
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                bucket = shard.buckets[key] = [float(capacity), now]
+                if len(shard.buckets) > self._max_per_shard:
+                    shard.buckets.popitem(last=False)
+                    shard.evictions += 1
+            else:
+                shard.buckets.move_to_end(key)
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / refill_per_second
+
+    def stats(self) -> dict:
+        return {
+            "backend": "local",
+            "keys": sum(len(shard.buckets) for shard in self._shards),
+            "evictions": sum(shard.evictions for shard in self._shards)
+        }
+
+
+def load_backend(path: Optional[str]) -> RateLimitBackend:
+    """Backend da "modulo:classe" (RATE_LIMIT_BACKEND), altrimenti quello locale"""
+    if not path:
+        return LocalRateLimitBackend()
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# ==================== LOGIN ====================
+
+class LoginRateLimiter:
+    """Limiti dei tentativi di verifica della password per account e per IP, con contatori"""
+
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+        self.rejected_client = 0
+
+    def check(self, email: str, ip: Optional[str]) -> float:
+        """Login: 0 se il tentativo è consentito, altrimenti i secondi da attendere"""
+        return self._check(f"login:email:{email.strip().lower()}", ip, "rejected_email")
+
+    def check_client(self, client_id: int, ip: Optional[str]) -> float:
+        """Cambio password (vecchia password di un cliente): come check()"""
+        return self._check(f"login:client:{client_id}", ip, "rejected_client")
+
+    def _check(self, account_key: str, ip: Optional[str], rejected_counter: str) -> float:
+        if ip:
+            retry_after = self.backend.take(f"login:ip:{ip}", LOGIN_RATE_IP_BURST, LOGIN_RATE_IP_PER_MINUTE / 60)
+            if retry_after:
+                self._count("rejected_ip")
+                return retry_after
+        retry_after = self.backend.take(account_key, LOGIN_RATE_EMAIL_BURST, LOGIN_RATE_EMAIL_PER_MINUTE / 60)
+        self._count(rejected_counter if retry_after else "allowed")
+        return retry_after
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "allowed": self.allowed,
+                "rejected_ip": self.rejected_ip,
+                "rejected_email": self.rejected_email,
+                "rejected_client": self.rejected_client
+            }
+        return {**counters, **self.backend.stats()}
+
+
+# Limitatore del processo
+login_rate_limiter = LoginRateLimiter(load_backend(os.getenv("RATE_LIMIT_BACKEND")))
@@ -5,7 +5,17 @@ from app.schemas.product import (
     ProductBase,
     ProductCreate,
     ProductUpdate,
-    ProductResponse
+    ProductResponse,
+    ProductFilter,
+    ProductBatchRequest,
+    ProductImportError,
+    ProductImportResponse
+)
+from app.schemas.category import (
+    CategoryBase,
+    CategoryCreate,
+    CategoryUpdate,
+    CategoryResponse
 )
 from app.schemas.client import (  
     ClientBase,
@@ -13,7 +23,14 @@ from app.schemas.client import (
     ClientUpdate,
     ClientResponse,
     ClientLogin,
-    ClientChangePassword
+    ClientChangePassword,
+    TokenRefresh,
+    ClientLogout,
+    TokenResponse,
+    ClientLoginResponse,
+    ClientImport,
+    ClientImportError,
+    ClientImportResponse
 )
 from app.schemas.order import (
     OrderItemCreate,
@@ -21,7 +38,11 @@ from app.schemas.order import (
     OrderCreate,
     OrderResponse,
     OrderListResponse,
-    OrderStatusUpdate
+    OrderStatusUpdate,
+    OrderBulkStatusUpdate,
+    OrderBulkStatusResponse,
+    BulkOrderResult,
+    BulkOrderResponse
 )
 
 __all__ = [
@@ -29,16 +50,35 @@ __all__ = [
     "ProductCreate",
     "ProductUpdate",
     "ProductResponse",
+    "ProductFilter",
+    "ProductBatchRequest",
+    "ProductImportError",
+    "ProductImportResponse",
+    "CategoryBase",
+    "CategoryCreate",
+    "CategoryUpdate",
+    "CategoryResponse",
     "ClientBase",
     "ClientCreate",
     "ClientUpdate",
     "ClientResponse",
     "ClientLogin",
     "ClientChangePassword",
+    "TokenRefresh",
+    "ClientLogout",
+    "TokenResponse",
+    "ClientLoginResponse",
+    "ClientImport",
+    "ClientImportError",
+    "ClientImportResponse",
     "OrderItemCreate",
     "OrderItemResponse",
     "OrderCreate",
     "OrderResponse",
     "OrderListResponse",
-    "OrderStatusUpdate"
+    "OrderStatusUpdate",
+    "OrderBulkStatusUpdate",
+    "OrderBulkStatusResponse",
+    "BulkOrderResult",
+    "BulkOrderResponse"
 ]
\ No newline at end of file
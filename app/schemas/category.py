@@ -0,0 +1,32 @@
+"""
+Category Schemas - Validazione dati per Category
+"""
+from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class CategoryBase(BaseModel):
+    """Campi base della categoria"""
+    name: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = None
+    active: bool = True
+
+
+class CategoryCreate(CategoryBase):
+    """Per creare una categoria nuova"""
+    pass
+
+
+class CategoryUpdate(BaseModel):
+    """Per aggiornare una categoria (tutti i campi opzionali)"""
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = None
+    active: Optional[bool] = None
+
+
+class CategoryResponse(CategoryBase):
+    """Risposta API - include il numero di prodotti attivi"""
+    id: int
+    product_count: int
+    
+    model_config = ConfigDict(from_attributes=True)
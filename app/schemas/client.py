@@ -2,13 +2,22 @@
 Client Schemas - Validazione dati per Client
 """
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, EmailStr, ConfigDict, Field
+from typing import Annotated, Optional
+from pydantic import AfterValidator, BaseModel, EmailStr, ConfigDict, Field, model_validator
+
+
+def normalize_email(email: str) -> str:
+    """Email in forma canonica: senza spazi, tutta minuscola"""
+    return email.strip().lower()
+
+
+# Email validata e normalizzata (come viene salvata e cercata)
+NormalizedEmail = Annotated[EmailStr, AfterValidator(normalize_email)]
 
 
 class ClientBase(BaseModel):
     """Campi base del cliente"""
-    email: EmailStr
+    email: NormalizedEmail
     first_name: str = Field(..., min_length=1, max_length=100)
     last_name: str = Field(..., min_length=1, max_length=100)
     phone: Optional[str] = Field(None, max_length=20)
@@ -26,7 +35,7 @@ class ClientCreate(ClientBase):
 
 class ClientUpdate(BaseModel):
     """Per aggiornare un cliente (tutti i campi opzionali)"""
-    email: Optional[EmailStr] = None
+    email: Optional[NormalizedEmail] = None
     first_name: Optional[str] = Field(None, min_length=1, max_length=100)
     last_name: Optional[str] = Field(None, min_length=1, max_length=100)
     phone: Optional[str] = Field(None, max_length=20)
@@ -39,6 +48,19 @@ class ClientUpdate(BaseModel):
     email_verified: Optional[bool] = None
 
 
+class ClientImport(ClientBase):
+    """Riga dell'import clienti in blocco: password in chiaro o hash bcrypt del vecchio sistema"""
+    password: Optional[str] = Field(None, min_length=6, max_length=100)
+    password_hash: Optional[str] = Field(None, pattern=r"^\$2[aby]?\$\d{2}\$[./A-Za-z0-9]{53}$")
+    
+    @model_validator(mode="after")
+    def check_password(self):
+        """Valida che ci sia esattamente una tra password e password_hash"""
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("indicare password oppure password_hash")
+        return self
+
+
 class ClientChangePassword(BaseModel):
     """Per cambiare password"""
     old_password: str = Field(..., min_length=6, max_length=100)
@@ -58,5 +80,42 @@ class ClientResponse(ClientBase):
 
 class ClientLogin(BaseModel):
     """Per login"""
-    email: EmailStr
-    password: str
\ No newline at end of file
+    email: NormalizedEmail
+    password: str
+
+
+class TokenRefresh(BaseModel):
+    """Per ottenere una nuova coppia di token"""
+    refresh_token: str = Field(..., max_length=200)
+
+
+class ClientLogout(BaseModel):
+    """Per il logout (il refresh token, se indicato, viene revocato insieme all'access token)"""
+    refresh_token: Optional[str] = Field(None, max_length=200)
+
+
+class TokenResponse(BaseModel):
+    """Token di sessione (vedi app.auth)"""
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+
+class ClientLoginResponse(ClientResponse, TokenResponse):
+    """Risposta del login: dati del cliente e token di sessione"""
+    pass
+
+
+class ClientImportError(BaseModel):
+    """Riga scartata dall'import clienti"""
+    line: int  # Riga del file (CSV: 1 è l'intestazione) o dell'NDJSON
+    email: Optional[str] = None
+    error: str
+
+
+class ClientImportResponse(BaseModel):
+    """Esito dell'import clienti in blocco"""
+    created: int
+    failed: int
+    errors: list[ClientImportError]  # Al più MAX_REPORTED_ERRORS righe
@@ -70,6 +70,7 @@ class OrderResponse(BaseModel):
     paid_at: Optional[datetime]
     shipped_at: Optional[datetime]
     delivered_at: Optional[datetime]
+    hold_expires_at: Optional[datetime] = None  # Entro quando pagare un ordine pending
     created_at: datetime
     updated_at: datetime
     items: List[OrderItemResponse] = []  # Lista prodotti nell'ordine
@@ -100,6 +101,40 @@ class OrderStatusUpdate(BaseModel):
     )
 
 
+class OrderBulkStatusUpdate(BaseModel):
+    """Schema per aggiornare lo stato di molti ordini insieme (admin)"""
+    order_ids: List[int] = Field(..., min_length=1, max_length=10000, description="ID degli ordini")
+    status: str = Field(
+        ..., 
+        pattern="^(pending|paid|processing|shipped|delivered|cancelled|refunded)$",
+        description="Nuovo stato degli ordini"
+    )
+
+
+class OrderBulkStatusResponse(BaseModel):
+    """Esito dell'aggiornamento di stato in blocco"""
+    status: str
+    updated: List[int]  # Ordini passati al nuovo stato
+    skipped: List[int]  # Ordini inesistenti o con transizione non ammessa
+
+
+# ============== BULK (import ordini) ==============
+class BulkOrderResult(BaseModel):
+    """Esito di un singolo ordine importato in blocco"""
+    index: int  # Posizione dell'ordine nel payload (o riga NDJSON)
+    success: bool
+    order_id: Optional[int] = None
+    order_number: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkOrderResponse(BaseModel):
+    """Risposta dell'import ordini in blocco"""
+    created: int
+    failed: int
+    results: List[BulkOrderResult]
+
+
 # ============== EXAMPLE PAYLOADS ==============
 class OrderCreateExample:
     """Esempio di payload per creare un ordine"""
@@ -3,7 +3,7 @@ Product Schemas - Validazione dati per Product
 """
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ProductBase(BaseModel):
@@ -16,6 +16,7 @@ class ProductBase(BaseModel):
     sku: Optional[str] = None
     active: bool = True
     featured: bool = False
+    category_id: Optional[int] = None
 
 
 class ProductCreate(ProductBase):
@@ -33,6 +34,7 @@ class ProductUpdate(BaseModel):
     sku: Optional[str] = None
     active: Optional[bool] = None
     featured: Optional[bool] = None
+    category_id: Optional[int] = None
 
 
 class ProductResponse(ProductBase):
@@ -41,4 +43,46 @@ class ProductResponse(ProductBase):
     created_at: datetime
     updated_at: datetime
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ProductFilter(BaseModel):
+    """Filtri e ordinamento della lista prodotti (query string di GET /products)"""
+    min_price: Optional[float] = Field(None, ge=0, description="Prezzo minimo")
+    max_price: Optional[float] = Field(None, ge=0, description="Prezzo massimo")
+    featured: Optional[bool] = Field(None, description="Solo prodotti in evidenza (o non in evidenza)")
+    category_id: Optional[int] = Field(None, description="ID della categoria")
+    in_stock: Optional[bool] = Field(None, description="Solo prodotti disponibili (o esauriti)")
+    sort: str = Field(
+        "id",
+        pattern="^-?(id|price|name|created_at)$",
+        description="Campo di ordinamento, con '-' per l'ordine decrescente"
+    )
+    
+    # Immutabile: usato come chiave della cache prodotti
+    model_config = ConfigDict(frozen=True)
+    
+    @property
+    def is_default(self) -> bool:
+        """True se la lista è quella semplice (tutti i prodotti attivi per ID)"""
+        return self == ProductFilter()
+
+
+class ProductBatchRequest(BaseModel):
+    """ID dei prodotti da leggere insieme (carrello, righe ordine)"""
+    ids: list[int] = Field(..., min_length=1, max_length=1000)
+
+
+class ProductImportError(BaseModel):
+    """Riga scartata dall'import prodotti"""
+    line: int  # Riga del file (CSV: 1 è l'intestazione) o dell'NDJSON
+    sku: Optional[str] = None
+    error: str
+
+
+class ProductImportResponse(BaseModel):
+    """Esito dell'import prodotti in blocco"""
+    created: int
+    updated: int
+    failed: int
+    errors: list[ProductImportError]  # Al più MAX_REPORTED_ERRORS righe
@@ -0,0 +1,216 @@
+"""
+Ricerca prodotti in memoria - indice invertito per SQLite e sviluppo
+
+Su PostgreSQL la ricerca usa la colonna tsvector products.search_vector con
+indice GIN (vedi app.models.product). Questo motore la sostituisce sugli
+altri database: stesso contratto (tutti i termini devono comparire, risultati
+ordinati per rilevanza), con in più la tolleranza agli errori di battitura.
+
+- Prefisso: "lapt" trova "laptop"
+- Errori di battitura: termini a distanza di edit 1 (2 dagli 8 caratteri;
+  lo scambio di due lettere vicine conta 1), cercati con un indice di
+  cancellazioni (nessuna scansione del vocabolario)
+- Rilevanza: tf per campo (nome pesa più della descrizione) x idf del termine
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Iterable, Optional
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Peso di un termine per campo e penalità delle corrispondenze non esatte
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_PENALTY = 0.7
+TYPO_PENALTY = 0.5
+
+# Lunghezza minima per prefisso e errori di battitura (evita esplosioni su "a", "ab")
+MIN_PREFIX_LENGTH = 2
+MIN_TYPO_LENGTH = 4
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Minuscolo, senza accenti, solo parole"""
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(char for char in normalized if not unicodedata.combining(char))
+    return _TOKEN_RE.findall(stripped)
+
+
+def _max_typos(term: str) -> int:
+    if len(term) < MIN_TYPO_LENGTH:
+        return 0
+    return 2 if len(term) >= 8 else 1
+
+
+def _deletes(term: str, distance: int) -> set[str]:
+    """Varianti del termine con fino a distance caratteri cancellati"""
+    variants = {term}
+    frontier = {term}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        variants |= frontier
+    return variants
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Distanza di edit con scambio di lettere adiacenti (OSA), interrotta appena supera limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class ProductSearchIndex:
+    """Indice invertito dei prodotti attivi: termine -> {product_id: peso}"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._documents: dict[int, dict[str, float]] = {}
+        self._sorted_terms: Optional[list[str]] = []
+        self._deletes: dict[str, set[str]] = defaultdict(set)
+        self.loaded = False
+
+    # ==================== INDICIZZAZIONE ====================
+
+    def add(self, product_id: int, name: Optional[str], description: Optional[str]) -> None:
+        """Indicizza (o reindicizza) un prodotto"""
+        weights: dict[str, float] = defaultdict(float)
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+        with self._lock:
+            self.remove(product_id)
+            self._documents[product_id] = weights
+            for term, weight in weights.items():
+                if term not in self._postings:
+                    self._add_term(term)
+                self._postings[term][product_id] = weight
+
+    def remove(self, product_id: int) -> None:
+        """Toglie un prodotto dall'indice"""
+        with self._lock:
+            for term in self._documents.pop(product_id, {}):
+                postings = self._postings[term]
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._remove_term(term)
+
+    def rebuild(self, products: Iterable) -> None:
+        """Ricostruisce l'indice da righe con id, name, description"""
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            self._deletes.clear()
+            self._sorted_terms = []
+            for product in products:
+                self.add(product.id, product.name, product.description)
+            self.loaded = True
+
+    def _add_term(self, term: str) -> None:
+        self._sorted_terms = None    # riordinato alla prossima ricerca
+        for variant in _deletes(term, _max_typos(term)):
+            self._deletes[variant].add(term)
+
+    def _remove_term(self, term: str) -> None:
+        self._sorted_terms = None
+        for variant in _deletes(term, _max_typos(term)):
+            terms = self._deletes.get(variant)
+            if terms:
+                terms.discard(term)
+                if not terms:
+                    del self._deletes[variant]
+
+    # ==================== RICERCA ====================
+
+    def search(self, query: str, skip: int = 0, limit: int = 20) -> list[int]:
+        """
+        Id dei prodotti che contengono tutti i termini di query (esatti,
+        per prefisso o con errori di battitura), dal più rilevante
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._documents)
+            scores: Optional[dict[int, float]] = None
+            for term in dict.fromkeys(terms):
+                term_scores = self._match(term, total)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+        top = heapq.nsmallest(skip + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in top[skip:]]
+
+    def _match(self, term: str, total: int) -> dict[int, float]:
+        """Punteggio per prodotto delle varianti di un termine (il migliore per prodotto)"""
+        scores: dict[int, float] = {}
+        for candidate, penalty in self._candidates(term):
+            postings = self._postings[candidate]
+            idf = math.log(1 + total / len(postings))
+            for product_id, weight in postings.items():
+                score = weight * idf * penalty
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def _candidates(self, term: str) -> Iterable[tuple[str, float]]:
+        found = False
+        if term in self._postings:
+            found = True
+            yield term, 1.0
+        if len(term) >= MIN_PREFIX_LENGTH:
+            terms = self._terms()
+            position = bisect_left(terms, term)
+            while position < len(terms) and terms[position].startswith(term):
+                if terms[position] != term:
+                    found = True
+                    yield terms[position], PREFIX_PENALTY
+                position += 1
+        if found:
+            return
+        # Nessuna corrispondenza esatta o per prefisso: errori di battitura
+        distance = _max_typos(term)
+        seen = set()
+        for variant in _deletes(term, distance):
+            for candidate in self._deletes.get(variant, ()):
+                if candidate not in seen:
+                    seen.add(candidate)
+                    if _edit_distance(term, candidate, distance) <= distance:
+                        yield candidate, TYPO_PENALTY
+
+    def _terms(self) -> list[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        return self._sorted_terms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"products": len(self._documents), "terms": len(self._postings), "loaded": self.loaded}
+
+
+# Indice del processo (caricato alla prima ricerca, vedi crud.product.search_products)
+product_search_index = ProductSearchIndex()
@@ -0,0 +1,60 @@
+"""
+Serializzazione veloce degli ordini - da righe ORM a byte JSON in un solo passaggio
+"""
+from datetime import datetime, timezone
+
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+from app.schemas.order import OrderResponse
+
+# Campi di OrderResponse letti direttamente dalla riga Order
+ORDER_FIELDS = tuple(name for name in OrderResponse.model_fields if name != "items")
+
+
+class JSONBytesResponse(Response):
+    """Risposta con contenuto JSON già serializzato (nessuna validazione response_model)"""
+    media_type = "application/json"
+
+
+def _naive_utc(value):
+    """
+    Datetime come li restituisce il database (UTC senza fuso): gli oggetti
+    appena creati in memoria hanno tzinfo, quelli riletti no
+    """
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _item_values(detail) -> dict:
+    """Campi di OrderItemResponse per un dettaglio ordine (con product caricato)"""
+    return {
+        "id": detail.id,
+        "product_id": detail.product_id,
+        "product_name": detail.product.name,
+        "quantity": detail.quantity,
+        "unit_price": detail.unit_price,
+        "subtotal": detail.subtotal
+    }
+
+
+def serialize_order(order, details=None) -> bytes:
+    """
+    Ordine e dettagli in byte JSON, identici alla serializzazione di OrderResponse.
+
+    Oggetti ORM letti dal database o appena inseriti (create_order): niente
+    modelli intermedi né validazione, solo dict serializzati dall'encoder di
+    pydantic-core. Datetime sempre in UTC senza fuso, come nel database:
+    creazione, lettura e replay Idempotency-Key producono gli stessi byte.
+    """
+    if details is None:
+        details = order.order_details
+    values = {name: _naive_utc(getattr(order, name)) for name in ORDER_FIELDS}
+    values["items"] = [_item_values(detail) for detail in details]
+    return to_json(values)
+
+
+def order_response(order, details=None, status_code: int = 200) -> JSONBytesResponse:
+    """Risposta HTTP per un ordine"""
+    return JSONBytesResponse(content=serialize_order(order, details), status_code=status_code)
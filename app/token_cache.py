@@ -0,0 +1,88 @@
+"""
+Revoche dei token in memoria - verifica dei token senza query
+
+Le revoche non ancora scadute (tabella revoked_tokens, vedi app.crud.token)
+sono poche: ogni worker ne tiene una copia. Le revoche fatte dal worker
+vengono aggiunte subito in memoria; quelle degli altri worker (NOTIFY, vedi
+app.product_cache) fanno ricaricare la copia alla verifica successiva.
+"""
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+REVOCATION_CACHE_TTL = float(os.getenv("AUTH_REVOCATION_CACHE_TTL", "60"))
+
+
+class RevocationCache:
+    """
+    Copia in memoria delle revoche: jti revocati e, per cliente, l'istante
+    (millisecondi epoch, come issued_at dei token) prima del quale tutti i suoi token sono revocati
+    """
+
+    def __init__(self, ttl: Optional[float] = REVOCATION_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # (jti revocati, {client_id: istante}), sostituita in blocco
+        self._revocations: Optional[tuple[frozenset[str], dict[int, int]]] = None
+        self._loaded_at = 0.0
+        # Incrementato a ogni invalidazione: un caricamento iniziato prima non viene salvato
+        self._generation = 0
+
+    def _fresh(self) -> Optional[tuple[frozenset[str], dict[int, int]]]:
+        revocations = self._revocations
+        if revocations is None:
+            return None
+        if self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl:
+            return None
+        return revocations
+
+    def is_revoked(self, client_id: int, jti: str, issued_at: int, load: Callable[[], tuple[set, dict]]) -> bool:
+        """
+        True se il token è revocato; se la copia non è valida la ricarica
+        con load() -> (jti revocati, {client_id: istante}), un thread alla volta
+        """
+        revocations = self._fresh()
+        if revocations is None:
+            with self._reload_lock:
+                revocations = self._fresh()
+                if revocations is None:
+                    generation = self._generation
+                    jtis, cutoffs = load()
+                    revocations = (frozenset(jtis), cutoffs)
+                    with self._lock:
+                        if generation == self._generation:
+                            self._revocations = revocations
+                            self._loaded_at = time.monotonic()
+        jtis, cutoffs = revocations
+        return jti in jtis or issued_at < cutoffs.get(client_id, 0)
+
+    def add(self, jti: Optional[str] = None, client_id: Optional[int] = None, issued_before: Optional[int] = None) -> None:
+        """Aggiunge in memoria una revoca già salvata nel database"""
+        with self._lock:
+            # Un caricamento in corso può non includerla
+            self._generation += 1
+            if self._revocations is None:
+                return
+            jtis, cutoffs = self._revocations
+            if jti is not None:
+                jtis = jtis | {jti}
+            if client_id is not None and issued_before is not None:
+                cutoffs = {**cutoffs, client_id: max(issued_before, cutoffs.get(client_id, 0))}
+            self._revocations = (jtis, cutoffs)
+
+    def invalidate(self) -> None:
+        """La prossima verifica ricarica le revoche dal database"""
+        with self._lock:
+            self._generation += 1
+            self._revocations = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            jtis, cutoffs = self._revocations or ((), {})
+            return {"loaded": self._revocations is not None, "tokens": len(jtis), "clients": len(cutoffs)}
+
+
+# Revoche del processo
+revocation_cache = RevocationCache()
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark serializzazione ordini (non richiede database)
+
+Confronta la costruzione manuale di OrderResponse + validazione response_model
+di FastAPI con app.serializers.serialize_order.
+
+    python -m benchmarks.bench_order_serializer --items 200
+"""
+import argparse
+import json
+import os
+import timeit
+from datetime import datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.schemas.order import OrderItemResponse, OrderResponse  # noqa: E402
+from app.serializers import serialize_order  # noqa: E402
+
+
+def make_order(items: int):
+    """Ordine finto con la stessa forma delle righe ORM"""
+    now = datetime.now(timezone.utc)
+    details = [
+        SimpleNamespace(
+            id=i,
+            product_id=i,
+            product=SimpleNamespace(name=f"Prodotto {i}"),
+            quantity=2,
+            unit_price=Decimal("19.90"),
+            subtotal=Decimal("39.80"),
+        )
+        for i in range(items)
+    ]
+    return SimpleNamespace(
+        id=1, order_number="ORD-20250101-000000001", client_id=1, status="pending",
+        total=Decimal("100.00"), subtotal=Decimal("95.00"), shipping_cost=Decimal("5.00"),
+        tax=Decimal("0.00"), discount=Decimal("0.00"), discount_code=None,
+        shipping_address="Via Roma 123", shipping_city="Roma", shipping_postal_code="00100",
+        shipping_state="RM", shipping_country="Italy", notes=None, paid=False,
+        paid_at=None, shipped_at=None, delivered_at=None, created_at=now, updated_at=now,
+        order_details=details,
+    )
+
+
+_response_adapter = TypeAdapter(OrderResponse)
+
+
+def legacy(order) -> bytes:
+    """Percorso precedente: OrderResponse validato a mano, poi rivalidato e codificato da FastAPI"""
+    items = [
+        OrderItemResponse(
+            id=d.id, product_id=d.product_id, product_name=d.product.name,
+            quantity=d.quantity, unit_price=d.unit_price, subtotal=d.subtotal,
+        )
+        for d in order.order_details
+    ]
+    fields = {name: getattr(order, name) for name in OrderResponse.model_fields if name != "items"}
+    response = OrderResponse(**fields, items=items)
+    validated = _response_adapter.validate_python(response, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    order = make_order(args.items)
+    # Stesso contenuto JSON nei due percorsi
+    assert json.loads(legacy(order)) == json.loads(serialize_order(order))
+    for name, fn in (("legacy", legacy), ("serialize_order", serialize_order)):
+        seconds = min(timeit.repeat(lambda: fn(order), number=args.number, repeat=5))
+        print(f"{name:16s} {seconds / args.number * 1e6:10.1f} us/ordine ({args.items} righe)")
+
+
+if __name__ == "__main__":
+    main()
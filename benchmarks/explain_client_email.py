@@ -0,0 +1,70 @@
+"""
+Verifica con EXPLAIN la ricerca clienti per email (richiede PostgreSQL in DATABASE_URL)
+
+Inserisce molti clienti in una transazione, esegue ANALYZE e controlla che
+la ricerca per email di login e registrazione usi idx_clients_email_lower
+e nessun Seq Scan su clients. Alla fine la transazione viene annullata:
+il database non viene modificato.
+
+    python -m benchmarks.explain_client_email --clients 10000000
+"""
+import argparse
+import json
+
+from sqlalchemy import text
+
+from app.crud import client as crud_client
+from app.database import Base, SessionLocal, engine
+from benchmarks.explain_product_filters import plan_nodes
+
+EXPECTED_INDEX = "idx_clients_email_lower"
+
+SEED_SQL = """
+INSERT INTO clients (email, password_hash, first_name, last_name, country, active, email_verified, created_at, updated_at)
+SELECT
+    'benchmark' || g || '@example.it',
+    'x',
+    'Nome ' || g,
+    'Cognome ' || g,
+    'Italy',
+    true,
+    false,
+    now(),
+    now()
+FROM generate_series(1, :clients) AS g
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000000)
+    args = parser.parse_args()
+
+    assert engine.dialect.name == "postgresql", "Il benchmark richiede PostgreSQL"
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        db.execute(text(SEED_SQL), {"clients": args.clients})
+        db.execute(text("ANALYZE clients"))
+
+        for email in ("benchmark1@example.it", f"BenchMark{args.clients // 2}@Example.IT", "assente@example.it"):
+            query = crud_client.client_by_email_query(db, email).limit(1)
+            sql = query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar_one()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = list(plan_nodes(plan[0]["Plan"]))
+            indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+            seq_scans = [node for node in nodes if node["Node Type"] == "Seq Scan"]
+
+            print(f"{email:42s} {plan[0]['Execution Time']:8.3f} ms  {', '.join(sorted(indexes)) or '-'}")
+            assert not seq_scans, f"{email}: Seq Scan su clients"
+            assert EXPECTED_INDEX in indexes, f"{email}: indice {EXPECTED_INDEX} non usato"
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Verifica con EXPLAIN gli indici della lista prodotti filtrata (richiede PostgreSQL in DATABASE_URL)
+
+Inserisce un catalogo grande in una transazione, esegue ANALYZE e controlla
+che ogni combinazione di filtri/ordinamento di GET /api/products usi l'indice
+atteso e nessun Seq Scan su products. Alla fine la transazione viene annullata:
+il database non viene modificato.
+
+    python -m benchmarks.explain_product_filters --products 1000000
+"""
+import argparse
+import json
+
+from sqlalchemy import text
+
+from app.crud import product as crud_product
+from app.database import Base, SessionLocal, engine
+from app.models.category import Category
+from app.schemas.product import ProductFilter
+
+# (descrizione, filtri, keyset (after_id, after_value), indice atteso);
+# category_id è l'indice della categoria tra quelle create dal benchmark
+CASES = [
+    ("lista per ID", ProductFilter(), None, "products_pkey"),
+    ("categoria per prezzo", ProductFilter(category_id=7, sort="price"), None, "idx_products_active_category_price"),
+    ("categoria, fascia di prezzo, disponibili", ProductFilter(category_id=7, min_price=50, max_price=80, in_stock=True), None, "idx_products_active_category_price"),
+    ("fascia di prezzo per prezzo", ProductFilter(min_price=100, max_price=120, sort="price"), None, "idx_products_active_price"),
+    ("prezzo decrescente, pagina successiva", ProductFilter(sort="-price"), (5000, 250.0), "idx_products_active_price"),
+    ("in evidenza", ProductFilter(featured=True, sort="price"), None, "idx_products_active_featured"),
+    ("novità", ProductFilter(sort="-created_at"), None, "idx_products_active_created"),
+]
+
+SEED_SQL = """
+INSERT INTO products (name, price, available_quantity, active, featured, category_id, created_at, updated_at)
+SELECT
+    'Benchmark ' || g,
+    round((random() * 500)::numeric, 2),
+    (random() * 20)::int,
+    random() < 0.9,
+    random() < 0.01,
+    (CAST(:category_ids AS integer[]))[1 + g % 50],
+    now() - g * interval '1 second',
+    now()
+FROM generate_series(1, :products) AS g
+"""
+
+
+def plan_nodes(node: dict):
+    """Tutti i nodi di un piano EXPLAIN (FORMAT JSON)"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    assert engine.dialect.name == "postgresql", "Il benchmark richiede PostgreSQL"
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        categories = [Category(name=f"Benchmark {index}") for index in range(50)]
+        db.add_all(categories)
+        db.flush()
+        category_ids = [category.id for category in categories]
+        db.execute(text(SEED_SQL), {"products": args.products, "category_ids": category_ids})
+        db.execute(text("ANALYZE products"))
+
+        for description, filters, keyset, expected_index in CASES:
+            if filters.category_id is not None:
+                filters = filters.model_copy(update={"category_id": category_ids[filters.category_id]})
+            after_id, after_value = keyset or (None, None)
+            query = crud_product.products_query(db, filters, after_id, after_value).limit(args.limit)
+            sql = query.statement.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar_one()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = list(plan_nodes(plan[0]["Plan"]))
+            indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+            seq_scans = [node for node in nodes if node["Node Type"] == "Seq Scan"]
+
+            print(f"{description:42s} {plan[0]['Execution Time']:8.2f} ms  {', '.join(sorted(indexes)) or '-'}")
+            assert not seq_scans, f"{description}: Seq Scan su products"
+            assert expected_index in indexes, f"{description}: indice {expected_index} non usato"
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Benchmark di contesa su un prodotto "caldo" (richiede PostgreSQL in DATABASE_URL)
+
+Più thread prenotano lo stesso prodotto finché non è esaurito, prima con il
+percorso normale (riga products bloccata a ogni checkout) poi in flash sale
+(con il flush periodico che gira in parallelo). Alla fine verifica che non sia
+stato venduto più dello stock iniziale e che tutto lo stock non venduto sia
+tornato nel database.
+
+Infine simula un worker morto senza drain (SIGKILL): il suo stock deve tornare
+in products con reclaim_dead_workers.
+
+    python -m benchmarks.flash_sale_contention --stock 20000 --threads 15
+
+Ogni thread tiene una connessione del pool delle richieste (5 + 10 di
+default): con 15 thread il pool è pieno e i prelievi devono usare le
+connessioni dedicate della flash sale.
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app.crud import order as crud_order
+from app.database import Base, SessionLocal, engine
+from app.flash_sale import FLASH_SALE_WORKER_TIMEOUT, FlashSaleStock, reclaim_dead_workers
+from app.models.flash_sale import FlashSaleWorker
+from app.models.product import Product
+from app.schemas.order import OrderItemCreate
+
+
+def create_product(stock: int) -> int:
+    db = SessionLocal()
+    try:
+        product = Product(name="Flash sale benchmark", price=1.0, available_quantity=stock)
+        db.add(product)
+        db.commit()
+        return product.id
+    finally:
+        db.close()
+
+
+def available(product_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(Product, product_id).available_quantity
+    finally:
+        db.close()
+
+
+def run(product_id: int, threads: int, quantity: int, stock: FlashSaleStock) -> tuple[int, float]:
+    """Checkout concorrenti fino a esaurimento; restituisce (ordini riusciti, secondi)"""
+    sold = []
+    done = threading.Event()
+    items = [OrderItemCreate(product_id=product_id, quantity=quantity)]
+
+    def worker():
+        count = 0
+        db = SessionLocal()
+        try:
+            while True:
+                try:
+                    crud_order.reserve_stock(db, items)
+                    db.commit()
+                    count += 1
+                except crud_order.StockReservationError:
+                    db.rollback()
+                    break
+        finally:
+            db.close()
+            sold.append(count)
+
+    def flusher():
+        # Flush frequente: restituzioni e prelievi si alternano durante la vendita
+        while not done.wait(0.05):
+            stock.flush()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    background = threading.Thread(target=flusher)
+    if stock.enabled:
+        background.start()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    if stock.enabled:
+        background.join()
+    return sum(sold), elapsed
+
+
+def simulate_crash(stock: int, slice_size: int) -> None:
+    """Worker che preleva, vende e muore senza drain; un altro worker ne recupera lo stock"""
+    product_id = create_product(stock)
+    dead = FlashSaleStock([product_id], slice_size=slice_size)
+    crud_order.flash_sale_stock = dead
+    items = [OrderItemCreate(product_id=product_id, quantity=1)]
+    db = SessionLocal()
+    try:
+        for _ in range(slice_size // 2):
+            crud_order.reserve_stock(db, items)
+            db.commit()
+        # prenotazione in corso al momento della morte: mai confermata
+        crud_order.reserve_stock(db, items)
+    finally:
+        db.rollback()
+        db.close()
+    sold = slice_size // 2
+    lost = available(product_id)
+
+    db = SessionLocal()
+    try:
+        heartbeat = datetime.now(timezone.utc) - timedelta(seconds=FLASH_SALE_WORKER_TIMEOUT + 1)
+        db.execute(update(FlashSaleWorker).where(FlashSaleWorker.worker_id == dead.worker_id).values(heartbeat_at=heartbeat))
+        reclaimed = reclaim_dead_workers(db)
+        db.commit()
+    finally:
+        db.close()
+    remaining = available(product_id)
+
+    print(f"crash      {stock - sold - lost:7d} unità in memoria perse, {reclaimed} recuperate")
+    assert remaining == stock - sold, f"stock perso dopo il recupero: {stock - sold - remaining}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stock", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=15)
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--slice-size", type=int, default=100)
+    args = parser.parse_args()
+
+    assert engine.dialect.name == "postgresql", "Il benchmark richiede PostgreSQL"
+    Base.metadata.create_all(bind=engine)
+
+    for mode in ("normale", "flash sale"):
+        product_id = create_product(args.stock)
+        stock = FlashSaleStock([product_id] if mode == "flash sale" else [], slice_size=args.slice_size)
+        crud_order.flash_sale_stock = stock
+
+        orders, seconds = run(product_id, args.threads, args.quantity, stock)
+        units = orders * args.quantity
+        stock.drain()
+        remaining = available(product_id)
+
+        print(f"{mode:10s} {orders:7d} ordini in {seconds:6.2f}s ({orders / seconds:8.0f} ordini/s)")
+        assert units <= args.stock, "overselling"
+        assert remaining == args.stock - units, f"stock perso: {args.stock - units - remaining}"
+        assert remaining < args.quantity, "stock residuo non venduto"
+
+    simulate_crash(args.slice_size * 2, args.slice_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Configurazione dei test: database SQLite temporaneo e TestClient dell'API
+
+Le variabili d'ambiente vanno impostate prima di importare app (engine,
+chiave dei token e limiti sono letti all'import).
+"""
+import os
+import shutil
+import tempfile
+import uuid
+
+_db_dir = tempfile.mkdtemp(prefix="ecommerce-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["AUTH_SECRET_KEY"] = "test-secret-key"
+os.environ["ADMIN_API_KEY"] = "test-admin-key"
+os.environ["BCRYPT_WORKERS"] = "1"
+os.environ["LOGIN_RATE_IP_BURST"] = "1000"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def api():
+    """TestClient con lifespan (pool bcrypt, worker_id dei numeri ordine)"""
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def account(api):
+    """Cliente registrato: email, password e id"""
+    email = f"test-{uuid.uuid4().hex[:12]}@example.it"
+    password = "password-iniziale"
+    response = api.post("/api/clients/register", json={
+        "email": email,
+        "password": password,
+        "first_name": "Mario",
+        "last_name": "Rossi"
+    })
+    assert response.status_code == 201, response.text
+    return {"email": email, "password": password, "id": response.json()["id"]}
+
+
+@pytest.fixture
+def tokens(api, account):
+    """Access e refresh token dal login del cliente"""
+    response = api.post("/api/clients/login", json={"email": account["email"], "password": account["password"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def product(api):
+    """Prodotto attivo con stock"""
+    response = api.post("/api/products", json={
+        "name": f"Prodotto {uuid.uuid4().hex[:8]}",
+        "price": 19.9,
+        "available_quantity": 100
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
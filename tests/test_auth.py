@@ -0,0 +1,136 @@
+"""
+Test dei token di sessione (app.auth) e delle revoche: refresh, logout, cambio password
+"""
+import time
+
+import pytest
+
+from app.auth import (
+    ACCESS,
+    REFRESH,
+    ACCESS_TOKEN_TTL,
+    InvalidToken,
+    create_token,
+    decode_token,
+    is_token_revoked,
+    revoke_all_tokens
+)
+from app.crud import token as crud_token
+from app.database import SessionLocal
+
+
+def _auth(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+# ==================== decode_token ====================
+
+def test_decode_token_valid():
+    token, claims = create_token(42, ACCESS)
+    assert decode_token(token, ACCESS) == claims
+
+
+def test_decode_token_tampered_signature():
+    token, _ = create_token(42, ACCESS)
+    payload, _, signature = token.rpartition(".")
+    tampered = signature[:-1] + ("A" if signature[-1] != "A" else "B")
+    with pytest.raises(InvalidToken):
+        decode_token(f"{payload}.{tampered}", ACCESS)
+
+
+def test_decode_token_tampered_payload():
+    token, claims = create_token(42, ACCESS)
+    with pytest.raises(InvalidToken):
+        decode_token(token.replace(f".{claims.client_id}.", ".43.", 1), ACCESS)
+
+
+def test_decode_token_wrong_type():
+    refresh_token, _ = create_token(42, REFRESH)
+    with pytest.raises(InvalidToken):
+        decode_token(refresh_token, ACCESS)
+    access_token, _ = create_token(42, ACCESS)
+    with pytest.raises(InvalidToken):
+        decode_token(access_token, REFRESH)
+
+
+def test_decode_token_expired():
+    token, _ = create_token(42, ACCESS, now=time.time() - ACCESS_TOKEN_TTL - 1)
+    with pytest.raises(InvalidToken):
+        decode_token(token, ACCESS)
+
+
+@pytest.mark.parametrize("token", ["", "abc", "a.b.c", "a.1.2.3.jti.firma"])
+def test_decode_token_malformed(token):
+    with pytest.raises(InvalidToken):
+        decode_token(token, ACCESS)
+
+
+# ==================== API ====================
+
+def test_access_token_required(api, tokens):
+    assert api.get("/api/orders/").status_code == 401
+    assert api.get("/api/orders/", headers=_auth(tokens["access_token"])).status_code == 200
+
+
+def test_refresh_token_single_use(api, tokens):
+    response = api.post("/api/clients/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    assert api.get("/api/orders/", headers=_auth(response.json()["access_token"])).status_code == 200
+
+    # Riuso dello stesso refresh token: 401
+    response = api.post("/api/clients/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_refresh_rejects_access_token(api, tokens):
+    response = api.post("/api/clients/token/refresh", json={"refresh_token": tokens["access_token"]})
+    assert response.status_code == 401
+
+
+def test_logout_revokes_tokens(api, tokens):
+    response = api.post(
+        "/api/clients/logout",
+        json={"refresh_token": tokens["refresh_token"]},
+        headers=_auth(tokens["access_token"])
+    )
+    assert response.status_code == 204
+
+    assert api.get("/api/orders/", headers=_auth(tokens["access_token"])).status_code == 401
+    response = api.post("/api/clients/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_change_password_revokes_tokens(api, account, tokens):
+    assert api.get("/api/orders/", headers=_auth(tokens["access_token"])).status_code == 200
+
+    # Subito dopo il login, di norma nello stesso secondo
+    response = api.post(f"/api/clients/{account['id']}/change-password", json={
+        "old_password": account["password"],
+        "new_password": "password-nuova"
+    })
+    assert response.status_code == 200
+
+    assert api.get("/api/orders/", headers=_auth(tokens["access_token"])).status_code == 401
+    response = api.post("/api/clients/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+    # Login con la vecchia password rifiutato, con la nuova accettato
+    credentials = {"email": account["email"], "password": account["password"]}
+    assert api.post("/api/clients/login", json=credentials).status_code == 401
+    credentials["password"] = "password-nuova"
+    response = api.post("/api/clients/login", json=credentials)
+    assert response.status_code == 200
+    assert api.get("/api/orders/", headers=_auth(response.json()["access_token"])).status_code == 200
+
+
+def test_revoke_all_tokens_same_second(account):
+    db = SessionLocal()
+    try:
+        for _ in range(20):
+            _, access = create_token(account["id"], ACCESS)
+            _, refresh = create_token(account["id"], REFRESH)
+            revoke_all_tokens(db, account["id"])
+            assert is_token_revoked(access)
+            assert crud_token.is_revoked(db, refresh.client_id, refresh.jti, refresh.issued_at)
+    finally:
+        db.close()
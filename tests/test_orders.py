@@ -0,0 +1,167 @@
+"""
+Test degli endpoint ordini: formato delle risposte, Idempotency-Key, export del back-office
+"""
+import csv
+import io
+import uuid
+
+import pytest
+
+from app.api.orders import IDEMPOTENT_REPLAY_HEADER
+from app.crud import idempotency as crud_idempotency
+from app.auth import create_token
+
+ADMIN_HEADERS = {"X-Admin-Key": "test-admin-key"}
+
+
+def _auth(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def _order_body(product_id: int, quantity: int = 1) -> dict:
+    return {
+        "items": [{"product_id": product_id, "quantity": quantity}],
+        "shipping_address": "Via Roma 1",
+        "shipping_city": "Roma",
+        "shipping_postal_code": "00100"
+    }
+
+
+# ==================== RISPOSTE ====================
+
+def test_created_order_matches_stored_order(api, tokens, product):
+    headers = _auth(tokens["access_token"])
+    created = api.post("/api/orders/", json=_order_body(product["id"]), headers=headers)
+    assert created.status_code == 201
+    order = created.json()
+    assert not order["created_at"].endswith("Z") and "+" not in order["created_at"]
+
+    stored = api.get(f"/api/orders/{order['id']}", headers=headers)
+    assert stored.status_code == 200
+    assert stored.content == created.content
+
+
+def test_idempotent_order_matches_stored_order(api, tokens, product):
+    headers = {**_auth(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+    created = api.post("/api/orders/", json=_order_body(product["id"]), headers=headers)
+    assert created.status_code == 201
+
+    stored = api.get(f"/api/orders/{created.json()['id']}", headers=_auth(tokens["access_token"]))
+    assert stored.content == created.content
+
+
+# ==================== IDEMPOTENCY-KEY ====================
+
+def _available(api, product_id: int) -> int:
+    return api.get(f"/api/products/{product_id}").json()["available_quantity"]
+
+
+def _order_count(api, headers: dict) -> int:
+    return len(api.get("/api/orders/", params={"limit": 100}, headers=headers).json())
+
+
+@pytest.fixture(params=["memoria", "database"])
+def replay_source(request):
+    """Replay dalla copia in memoria oppure (cache svuotata) dal database"""
+    def prepare():
+        if request.param == "database":
+            crud_idempotency.response_cache.clear()
+    return prepare
+
+
+def test_idempotency_replay_returns_identical_bytes(api, tokens, product, replay_source):
+    headers = {**_auth(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+    body = _order_body(product["id"], 2)
+
+    first = api.post("/api/orders/", json=body, headers=headers)
+    assert first.status_code == 201
+    assert IDEMPOTENT_REPLAY_HEADER not in first.headers
+
+    replay_source()
+    replay = api.post("/api/orders/", json=body, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers[IDEMPOTENT_REPLAY_HEADER] == "true"
+    assert replay.content == first.content
+
+    # Un solo ordine, stock scalato una volta
+    assert _order_count(api, _auth(tokens["access_token"])) == 1
+    assert _available(api, product["id"]) == product["available_quantity"] - 2
+
+
+def test_idempotency_key_with_different_body(api, tokens, product, replay_source):
+    headers = {**_auth(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+    assert api.post("/api/orders/", json=_order_body(product["id"], 1), headers=headers).status_code == 201
+
+    replay_source()
+    response = api.post("/api/orders/", json=_order_body(product["id"], 3), headers=headers)
+    assert response.status_code == 422
+    assert _order_count(api, _auth(tokens["access_token"])) == 1
+    assert _available(api, product["id"]) == product["available_quantity"] - 1
+
+
+def test_idempotency_key_released_after_failure(api, tokens, product):
+    headers = {**_auth(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+    body = _order_body(product["id"], product["available_quantity"] + 1)
+
+    # Stock insufficiente: nessun ordine, la chiave non resta occupata
+    response = api.post("/api/orders/", json=body, headers=headers)
+    assert response.status_code == 400
+    assert IDEMPOTENT_REPLAY_HEADER not in response.headers
+
+    # Stesso payload dopo il riassortimento: eseguito davvero
+    api.put(f"/api/products/{product['id']}", json={"available_quantity": product["available_quantity"] + 10})
+    response = api.post("/api/orders/", json=body, headers=headers)
+    assert response.status_code == 201
+    assert IDEMPOTENT_REPLAY_HEADER not in response.headers
+
+
+def test_idempotency_key_released_after_failure_with_different_body(api, tokens, product):
+    headers = {**_auth(tokens["access_token"]), "Idempotency-Key": uuid.uuid4().hex}
+
+    # Prodotto inesistente: 404, la chiave può essere riusata con un payload corretto
+    response = api.post("/api/orders/", json=_order_body(999999), headers=headers)
+    assert response.status_code == 404
+    response = api.post("/api/orders/", json=_order_body(product["id"]), headers=headers)
+    assert response.status_code == 201
+    assert IDEMPOTENT_REPLAY_HEADER not in response.headers
+
+
+def test_idempotency_key_is_per_client(api, tokens, account, product):
+    key = uuid.uuid4().hex
+    body = _order_body(product["id"])
+    first = api.post("/api/orders/", json=body, headers={**_auth(tokens["access_token"]), "Idempotency-Key": key})
+    assert first.status_code == 201
+
+    other = api.post("/api/clients/register", json={
+        "email": f"test-{uuid.uuid4().hex[:12]}@example.it",
+        "password": "password-altro",
+        "first_name": "Luigi",
+        "last_name": "Bianchi"
+    }).json()
+    other_token, _ = create_token(other["id"])
+    second = api.post("/api/orders/", json=body, headers={**_auth(other_token), "Idempotency-Key": key})
+    assert second.status_code == 201
+    assert IDEMPOTENT_REPLAY_HEADER not in second.headers
+    assert second.json()["id"] != first.json()["id"]
+
+
+# ==================== EXPORT ====================
+
+def test_export_requires_admin_key(api, tokens):
+    assert api.get("/api/orders/export").status_code == 401
+    assert api.get("/api/orders/export", headers={"X-Admin-Key": "sbagliata"}).status_code == 401
+    # Il token di un cliente non basta: l'export contiene gli ordini di tutti
+    assert api.get("/api/orders/export", headers=_auth(tokens["access_token"])).status_code == 401
+
+
+def test_export_with_admin_key(api):
+    response = api.get("/api/orders/export", params={"format": "csv"}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    header = next(csv.reader(io.StringIO(response.text)))
+    assert "order_number" in header
+
+
+def test_export_disabled_without_admin_key(api, monkeypatch):
+    monkeypatch.setattr("app.auth.ADMIN_API_KEY", None)
+    assert api.get("/api/orders/export", headers=ADMIN_HEADERS).status_code == 403
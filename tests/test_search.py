@@ -0,0 +1,213 @@
+"""
+Test del motore di ricerca in memoria (app.search)
+"""
+import pytest
+
+from app.search import ProductSearchIndex, _deletes, _edit_distance, tokenize
+
+
+@pytest.fixture
+def index():
+    index = ProductSearchIndex()
+    index.add(1, "Tastiera meccanica", "Tastiera da gaming con switch blu")
+    index.add(2, "Monitor 27 pollici", "Monitor per ufficio e gaming")
+    index.add(3, "Cuffie wireless", "Cuffie con microfono")
+    index.add(4, "Mouse wireless", "Mouse ergonomico per ufficio")
+    return index
+
+
+# ==================== FUNZIONI DI BASE ====================
+
+def test_tokenize():
+    assert tokenize("Caffè  Espresso, 250g!") == ["caffe", "espresso", "250g"]
+    assert tokenize(None) == []
+    assert tokenize("") == []
+
+
+def test_deletes():
+    assert _deletes("abc", 0) == {"abc"}
+    assert _deletes("abc", 1) == {"abc", "bc", "ac", "ab"}
+    assert _deletes("abc", 2) == {"abc", "bc", "ac", "ab", "a", "b", "c"}
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("monitor", "monitor", 0),
+    ("monitor", "monitr", 1),       # cancellazione
+    ("monitor", "monittor", 1),     # inserimento
+    ("monitor", "monitpr", 1),      # sostituzione
+    ("monitor", "mointor", 1),      # scambio di lettere adiacenti
+    ("tastiera", "tsatiear", 2),    # due scambi
+    ("tastiera", "taztiqra", 2),    # due sostituzioni
+])
+def test_edit_distance(a, b, distance):
+    assert _edit_distance(a, b, 2) == distance
+    assert _edit_distance(b, a, 2) == distance
+
+
+def test_edit_distance_stops_over_limit():
+    assert _edit_distance("monitor", "cuffie", 1) == 2
+    assert _edit_distance("monitor", "monitorxyz", 2) == 3
+
+
+# ==================== CORRISPONDENZE ====================
+
+def test_exact_match(index):
+    assert index.search("monitor") == [2]
+    assert index.search("WIRELESS") == [3, 4]
+    assert index.search("tastièra") == [1]
+
+
+def test_prefix_match(index):
+    assert index.search("tast") == [1]
+    assert index.search("mo") == [2, 4]
+    # Prefissi di un carattere non considerati
+    assert index.search("m") == []
+
+
+def test_exact_match_ranks_above_prefix():
+    index = ProductSearchIndex()
+    index.add(1, "Portatile", None)
+    index.add(2, "Porta", None)
+    assert index.search("porta") == [2, 1]
+
+
+def test_typo_match(index):
+    assert index.search("monitr") == [2]       # cancellazione
+    assert index.search("mointor") == [2]      # scambio
+    assert index.search("tsatiera") == [1]     # scambio
+    assert index.search("cufie") == [3]        # cancellazione
+
+
+def test_typo_threshold():
+    index = ProductSearchIndex()
+    index.add(1, "Monitor", None)       # 7 caratteri
+    index.add(2, "Tastiera", None)      # 8 caratteri
+    index.add(3, "Sedia", None)         # 5 caratteri
+
+    # Sotto gli 8 caratteri: un solo errore
+    assert index.search("monitpr") == [1]
+    assert index.search("mbnitkr") == []
+    # Dagli 8 caratteri: fino a due errori, non tre
+    assert index.search("taztiqra") == [2]
+    assert index.search("tsatiear") == [2]
+    assert index.search("taztiqrx") == []
+    assert index.search("sdia") == [3]
+    # Sotto i 4 caratteri nessun errore ammesso
+    index.add(4, "Hub USB", None)
+    assert index.search("usb") == [4]
+    assert index.search("usd") == []
+    assert index.search("hbu") == []
+
+
+def test_typo_only_without_exact_or_prefix_match():
+    index = ProductSearchIndex()
+    index.add(1, "Cavo", None)
+    index.add(2, "Cava", None)
+    assert index.search("cavo") == [1]
+    assert index.search("cavx") == [1, 2]
+
+
+# ==================== TUTTI I TERMINI ====================
+
+def test_all_terms_required(index):
+    assert index.search("mouse wireless") == [4]
+    assert index.search("wireless microfono") == [3]
+    assert index.search("monitor wireless") == []
+    assert index.search("gaming") == [1, 2]
+    assert index.search("gaming ufficio") == [2]
+
+
+def test_repeated_terms_count_once(index):
+    assert index.search("monitor monitor") == index.search("monitor")
+
+
+def test_empty_query(index):
+    assert index.search("") == []
+    assert index.search("  ,;  ") == []
+
+
+# ==================== RILEVANZA E PAGINAZIONE ====================
+
+def test_name_weighs_more_than_description():
+    index = ProductSearchIndex()
+    index.add(1, "Supporto", "Per monitor")
+    index.add(2, "Monitor", "Schermo")
+    assert index.search("monitor") == [2, 1]
+
+
+def test_rare_terms_weigh_more():
+    index = ProductSearchIndex()
+    index.add(1, "Cavo", "Rame")
+    index.add(2, "Cavo", "Oro")
+    index.add(3, "Cavo", "Rame")
+    index.add(4, "Rame", "Cavo")
+    # "oro" compare in un solo prodotto: idf più alto di "rame"
+    scores_rame = index._match("rame", 4)
+    scores_oro = index._match("oro", 4)
+    assert scores_oro[2] > scores_rame[1]
+
+
+def test_skip_and_limit():
+    index = ProductSearchIndex()
+    for product_id in range(1, 11):
+        index.add(product_id, "Cavo USB", None)
+    assert index.search("cavo", limit=3) == [1, 2, 3]
+    assert index.search("cavo", skip=3, limit=3) == [4, 5, 6]
+    assert index.search("cavo", skip=9, limit=3) == [10]
+    assert index.search("cavo", skip=10, limit=3) == []
+    assert index.search("cavo", limit=0) == []
+
+
+# ==================== AGGIORNAMENTI ====================
+
+def test_add_updates_sorted_terms(index):
+    assert index.search("webc") == []
+    index.add(5, "Webcam HD", None)
+    assert index.search("webc") == [5]
+
+
+def test_reindex_replaces_terms(index):
+    index.add(2, "Schermo 27 pollici", None)
+    assert index.search("monitor") == []
+    assert index.search("monitr") == []
+    assert index.search("scherm") == [2]
+    assert index.search("gaming") == [1]
+
+
+def test_remove(index):
+    index.remove(3)
+    assert index.search("cuffie") == []
+    assert index.search("cufie") == []
+    assert index.search("wireless") == [4]
+    # Prodotto non indicizzato: nessun errore
+    index.remove(99)
+
+
+def test_remove_all_leaves_empty_index(index):
+    for product_id in (1, 2, 3, 4):
+        index.remove(product_id)
+    assert index._postings == {}
+    assert index._deletes == {}
+    assert index._terms() == []
+    assert index.stats() == {"products": 0, "terms": 0, "loaded": False}
+
+
+def test_shared_term_survives_partial_remove(index):
+    index.remove(4)
+    assert index.search("wireless") == [3]
+    assert index.search("wirelss") == [3]
+    assert index.search("ufficio") == [2]
+
+
+def test_rebuild():
+    class Row:
+        def __init__(self, id, name, description):
+            self.id, self.name, self.description = id, name, description
+
+    index = ProductSearchIndex()
+    index.add(1, "Vecchio", None)
+    index.rebuild([Row(2, "Lampada", "Da tavolo"), Row(3, "Lampadario", None)])
+    assert index.loaded
+    assert index.search("vecchio") == []
+    assert index.search("lampada") == [2, 3]
+    assert index.stats() == {"products": 2, "terms": 4, "loaded": True}